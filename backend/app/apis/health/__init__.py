@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
-from app.libs.database import db_manager
+from app.libs.contact_storage import contact_storage
 import time
 import psutil
 import asyncio
@@ -42,7 +42,7 @@ class HealthService:
     """Service for health monitoring and system diagnostics."""
     
     def __init__(self):
-        self.db = db_manager
+        self.db = contact_storage
         self.start_time = app_start_time
     
     async def check_database_health(self) -> DatabaseHealth:
@@ -50,31 +50,26 @@ class HealthService:
         try:
             start_time = time.time()
             
-            async with self.db.get_connection() as conn:
-                # Test basic connectivity
-                await conn.fetchval("SELECT 1")
-                
-                # Check if contacts table exists and is accessible
-                table_check = await conn.fetchval(
-                    "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'contacts'"
-                )
-                
-                if table_check == 0:
-                    return DatabaseHealth(
-                        status="warning",
-                        error="contacts table not found"
-                    )
-                
-                # Test query performance with a simple count
-                contact_count = await conn.fetchval("SELECT COUNT(*) FROM contacts")
-                
-                latency = (time.time() - start_time) * 1000  # Convert to milliseconds
-                
+            # Test basic connectivity
+            await self.db.ping()
+            
+            # Check if contacts table exists and is accessible; the count
+            # doubles as a simple query performance probe
+            contact_count = await self.db.count_contacts()
+            
+            if contact_count is None:
                 return DatabaseHealth(
-                    status="healthy",
-                    latency_ms=round(latency, 2),
-                    connection_pool_size=self.db.pool.get_size() if hasattr(self.db, 'pool') else None
+                    status="warning",
+                    error="contacts table not found"
                 )
+            
+            latency = (time.time() - start_time) * 1000  # Convert to milliseconds
+            
+            return DatabaseHealth(
+                status="healthy",
+                latency_ms=round(latency, 2),
+                connection_pool_size=self.db.pool_size()
+            )
                 
         except Exception as e:
             return DatabaseHealth(
@@ -1,186 +1,124 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import Optional, List, Set
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Optional, List
 from app.libs.models import (
     ContactIdentifyRequest, 
-    ContactIdentifyResponse, 
-    Contact, 
-    ContactCreate, 
-    ContactUpdate,
-    LinkPrecedence
+    ContactIdentifyResponse
 )
 from app.libs.database import db_manager
+from app.libs.contact_reconciliation import ContactReconciliationService
+from app.libs.contact_storage import contact_storage
+from app.libs.identity_index import IDENTITY_INDEX_ENABLED, identity_index
+from app.libs.identity_lookup import LOOKUP_CACHE_TTL_SECONDS, lookup_cache
+from app.libs.read_replica import read_pool
+from app.libs.contact_keys import normalize_email, normalize_phone, normalize_request
+from app.libs.contact_import import ImportConflict, ImportFormatError, import_contacts
+from app.libs.contact_compactor import CONTACT_COMPACTION_INTERVAL_SECONDS, run_periodic_compaction
+from app.libs.idempotency import IdempotencyCache, IdempotencyKeyConflict, PostgresIdempotencyStore
+from app.libs.db_metrics import InstrumentedRoute, route_metrics
+from app.libs.identity_events import event_broker, format_ndjson, format_sse, stream_events
 import asyncio
+import hashlib
+import json
+import os
 
-router = APIRouter(prefix="/api/v1")
+# Every route reports its storage calls in a Server-Timing header and in route_metrics
+router = APIRouter(prefix="/api/v1", route_class=InstrumentedRoute)
 
+# Upper bound on items accepted by POST /identify/batch
+MAX_BATCH_SIZE = 5000
 
-class ContactReconciliationService:
-    """Service class for handling contact identity reconciliation logic."""
-    
-    def __init__(self):
-        self.db = db_manager
-    
-    async def reconcile_contact_identity(self, request: ContactIdentifyRequest) -> ContactIdentifyResponse:
-        """
-        Core reconciliation logic for contact identity management.
-        
-        Process:
-        1. Find existing contacts by email or phone
-        2. If no matches found, create new primary contact
-        3. If matches found, determine primary contact and link others as secondary
-        4. Handle edge cases and maintain data consistency
-        """
-        try:
-            # Find all existing contacts that match either email or phone
-            existing_contacts = await self.db.find_contacts_by_email_or_phone(
-                request.email, request.phone_number
-            )
-            
-            if not existing_contacts:
-                # Case 1: No existing contacts - create new primary contact
-                return await self._create_new_primary_contact(request)
-            
-            # Case 2: Existing contacts found - need to reconcile
-            return await self._reconcile_existing_contacts(request, existing_contacts)
-            
-        except Exception as e:
-            print(f"Error in contact reconciliation: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Internal server error during contact reconciliation"
-            ) from e
-    
-    async def _create_new_primary_contact(self, request: ContactIdentifyRequest) -> ContactIdentifyResponse:
-        """Create a new primary contact when no matches are found."""
-        new_contact = await self.db.create_contact(
-            ContactCreate(
-                email=request.email,
-                phone_number=request.phone_number
-            )
-        )
-        
-        return ContactIdentifyResponse(
-            primary_contact_id=new_contact.id,
-            emails=[request.email] if request.email else [],
-            phone_numbers=[request.phone_number] if request.phone_number else [],
-            secondary_contact_ids=[]
-        )
-    
-    async def _reconcile_existing_contacts(self, request: ContactIdentifyRequest, 
-                                         existing_contacts: List[Contact]) -> ContactIdentifyResponse:
-        """Reconcile identity when existing contacts are found."""
-        # Separate primary and secondary contacts
-        secondary_contacts = [c for c in existing_contacts if c.link_precedence == LinkPrecedence.SECONDARY]
-        
-        # Get all related contacts through their primary links
-        # Use contact IDs to avoid hashability issues, then get full contacts
-        all_related_contact_ids = set(c.id for c in existing_contacts)
-        
-        # For each secondary contact, get its primary and all related contacts
-        for secondary in secondary_contacts:
-            if secondary.linked_id:
-                hierarchy = await self.db.get_contact_hierarchy(secondary.linked_id)
-                if hierarchy.get('primary_contact'):
-                    all_related_contact_ids.add(hierarchy['primary_contact'].id)
-                    all_related_contact_ids.update(c.id for c in hierarchy.get('secondary_contacts', []))
-        
-        # Get full contact objects for all related IDs
-        all_related_contacts = []
-        for contact_id in all_related_contact_ids:
-            contact = await self.db.get_contact_by_id(contact_id)
-            if contact:
-                all_related_contacts.append(contact)
-        
-        # Sort by creation date to determine precedence
-        all_related_contacts = sorted(all_related_contacts, key=lambda x: x.created_at)
-        
-        # Determine the primary contact (oldest primary, or oldest overall if no primaries)
-        primary_contact = None
-        for contact in all_related_contacts:
-            if contact.link_precedence == LinkPrecedence.PRIMARY:
-                primary_contact = contact
-                break
-        
-        if not primary_contact:
-            # If no primary found, make the oldest contact primary
-            primary_contact = all_related_contacts[0]
-        
-        # Check if we need to create a new contact for the new information
-        needs_new_contact = True
-        for contact in all_related_contacts:
-            if (contact.email == request.email and 
-                contact.phone_number == request.phone_number):
-                needs_new_contact = False
-                break
-        
-        if needs_new_contact:
-            # Create new secondary contact linked to primary
-            new_contact = await self.db.create_contact(
-                ContactCreate(
-                    email=request.email,
-                    phone_number=request.phone_number
-                )
-            )
-            
-            # Convert the new contact to secondary and link to primary
-            await self.db.update_contact(
-                new_contact.id,
-                ContactUpdate(
-                    linked_id=primary_contact.id,
-                    link_precedence=LinkPrecedence.SECONDARY
-                )
-            )
-            
-            all_related_contacts.append(new_contact)
-        
-        # Ensure all non-primary contacts are properly linked as secondary
-        for contact in all_related_contacts:
-            if contact.id != primary_contact.id and contact.link_precedence != LinkPrecedence.SECONDARY:
-                await self.db.update_contact(
-                    contact.id,
-                    ContactUpdate(
-                        linked_id=primary_contact.id,
-                        link_precedence=LinkPrecedence.SECONDARY
-                    )
-                )
-        
-        # If there are multiple primary contacts, convert older ones to secondary
-        primary_contacts_in_group = [c for c in all_related_contacts 
-                                   if c.link_precedence == LinkPrecedence.PRIMARY]
-        
-        if len(primary_contacts_in_group) > 1:
-            # Keep the oldest as primary, convert others to secondary
-            primary_contacts_sorted = sorted(primary_contacts_in_group, key=lambda x: x.created_at)
-            actual_primary = primary_contacts_sorted[0]
-            
-            for contact in primary_contacts_sorted[1:]:
-                await self.db.update_contact(
-                    contact.id,
-                    ContactUpdate(
-                        linked_id=actual_primary.id,
-                        link_precedence=LinkPrecedence.SECONDARY
-                    )
-                )
-            
-            primary_contact = actual_primary
-        
-        # Get the final hierarchy to build response
-        hierarchy = await self.db.get_contact_hierarchy(primary_contact.id)
-        
-        return ContactIdentifyResponse(
-            primary_contact_id=hierarchy['primary_contact'].id,
-            emails=hierarchy['all_emails'],
-            phone_numbers=hierarchy['all_phone_numbers'],
-            secondary_contact_ids=hierarchy['secondary_contact_ids']
-        )
+# Idempotency-Key handling for POST /identify; set IDEMPOTENCY_STORE=postgres
+# to share stored responses between workers
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_STORE = os.environ.get("IDEMPOTENCY_STORE", "memory")
 
 
 # Initialize the service
 reconciliation_service = ContactReconciliationService()
 
+idempotency_cache = IdempotencyCache(
+    max_entries=IDEMPOTENCY_CACHE_SIZE,
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+    store=PostgresIdempotencyStore(db_manager) if IDEMPOTENCY_STORE == "postgres" else None,
+    encode=lambda response: response.model_dump_json(),
+    decode=ContactIdentifyResponse.model_validate_json
+)
+
+
+def _request_fingerprint(request: ContactIdentifyRequest) -> str:
+    """Stable digest of the request body, used to reject reused idempotency keys."""
+    payload = json.dumps({"email": request.email, "phone_number": request.phone_number}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Background hierarchy compaction task, started when an interval is configured
+compaction_task: Optional[asyncio.Task] = None
+
+
+@router.on_event("startup")
+async def start_contact_compaction():
+    """Periodically flatten multi-hop and orphaned links in the background."""
+    global compaction_task
+    # Compaction runs Postgres-specific SQL; the other backends never build deep chains
+    if CONTACT_COMPACTION_INTERVAL_SECONDS > 0 and contact_storage.name == "postgres":
+        compaction_task = asyncio.create_task(run_periodic_compaction())
+
+
+@router.on_event("shutdown")
+async def stop_contact_compaction():
+    if compaction_task:
+        compaction_task.cancel()
+
+
+@router.on_event("shutdown")
+async def close_read_pool():
+    """Close the read replica pool, if lookups ever opened it."""
+    try:
+        await read_pool.close()
+    except Exception as e:
+        print(f"Read replica pool close failed: {str(e)}")
+
+
+@router.on_event("startup")
+async def create_idempotency_table():
+    """Create the shared idempotency table when the Postgres store is enabled."""
+    if idempotency_cache.store:
+        try:
+            await idempotency_cache.store.create_table()
+        except Exception as e:
+            print(f"Idempotency table setup failed: {str(e)}")
+
+
+@router.on_event("startup")
+async def create_event_outbox():
+    """Create the identity event outbox table when the backend needs one."""
+    try:
+        await contact_storage.create_event_outbox()
+    except Exception as e:
+        print(f"Identity event outbox setup failed: {str(e)}")
+
+
+@router.on_event("startup")
+async def load_identity_index():
+    """Warm the optional in-process identity index from contact storage."""
+    if not IDENTITY_INDEX_ENABLED:
+        return
+    
+    try:
+        await identity_index.load(contact_storage)
+        print(f"Identity index loaded: {identity_index.stats()}")
+    except Exception as e:
+        # Identify keeps working from the database when the index is unavailable
+        print(f"Identity index load failed: {str(e)}")
+
 
 @router.post("/identify", response_model=ContactIdentifyResponse)
-async def identify_contact(request: ContactIdentifyRequest) -> ContactIdentifyResponse:
+async def identify_contact(
+    request: ContactIdentifyRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255)
+) -> ContactIdentifyResponse:
     """
     Identify and reconcile contact information.
     
@@ -190,15 +128,22 @@ async def identify_contact(request: ContactIdentifyRequest) -> ContactIdentifyRe
     - Maintaining a primary-secondary relationship hierarchy
     - Ensuring data consistency across all operations
     
+    Clients may send an Idempotency-Key header. Retries with the same key
+    replay the stored response instead of reconciling again, and a duplicate
+    arriving while the first is still running waits for its result.
+    
     Args:
         request: ContactIdentifyRequest containing email and/or phone number
+        idempotency_key: Optional client-chosen key identifying this logical request
     
     Returns:
         ContactIdentifyResponse with consolidated contact information
     
     Raises:
-        HTTPException: For validation errors or internal server errors
+        HTTPException: For validation errors, reused idempotency keys or internal server errors
     """
+    request = normalize_request(request)
+    
     # Validate that at least one contact method is provided
     if not request.email and not request.phone_number:
         raise HTTPException(
@@ -210,10 +155,22 @@ async def identify_contact(request: ContactIdentifyRequest) -> ContactIdentifyRe
     print(f"Processing identity reconciliation for email: {request.email}, phone: {request.phone_number}")
     
     try:
-        result = await reconciliation_service.reconcile_contact_identity(request)
+        if idempotency_key:
+            result = await idempotency_cache.run(
+                f"identify:{idempotency_key}",
+                _request_fingerprint(request),
+                lambda: reconciliation_service.reconcile_contact_identity(request)
+            )
+        else:
+            result = await reconciliation_service.reconcile_contact_identity(request)
         print(f"Successfully processed identity reconciliation. Primary ID: {result.primary_contact_id}")
         return result
         
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        ) from e
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
@@ -225,6 +182,215 @@ async def identify_contact(request: ContactIdentifyRequest) -> ContactIdentifyRe
         ) from e
 
 
+@router.get("/identify/lookup", response_model=ContactIdentifyResponse)
+async def lookup_contact(
+    response: Response,
+    email: Optional[str] = Query(None, description="Email to look up"),
+    phone_number: Optional[str] = Query(None, description="Phone number to look up")
+) -> ContactIdentifyResponse:
+    """
+    Look up the consolidated identity for an email and/or phone number.
+    
+    Unlike POST /identify this never creates or links contacts. Results come
+    from a cluster cache or a read replica and may lag writes by a few seconds.
+    
+    Args:
+        email: Optional email to look up
+        phone_number: Optional phone number to look up
+    
+    Returns:
+        ContactIdentifyResponse for the matching cluster
+    
+    Raises:
+        HTTPException: 400 without lookup keys, 404 when nothing matches
+    """
+    if not normalize_email(email) and not normalize_phone(phone_number):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one contact method (email or phone number) must be provided"
+        )
+    
+    try:
+        result = await reconciliation_service.lookup_identity(email, phone_number)
+    except Exception as e:
+        print(f"Unexpected error in identify lookup endpoint: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred during contact lookup"
+        ) from e
+    
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No contact found for the given email or phone number"
+        )
+    
+    response.headers["Cache-Control"] = f"private, max-age={int(LOOKUP_CACHE_TTL_SECONDS)}"
+    return result
+
+
+@router.post("/identify/batch", response_model=List[ContactIdentifyResponse])
+async def identify_contacts_batch(requests: List[ContactIdentifyRequest]) -> List[ContactIdentifyResponse]:
+    """
+    Identify and reconcile a batch of contacts in one call.
+    
+    Requests that share an email or phone number are reconciled together;
+    each gets the response it would have got sent on its own, in input
+    order, rather than the cluster after the whole batch. The batch is written with a handful of bulk
+    statements per lock group; large batches are split into several groups,
+    each committed in its own transaction, so that they do not block
+    unrelated identify calls. Requests connected only through existing
+    contacts may land in different groups; a request then also sees writes
+    of an earlier-run group that come later in the batch.
+    
+    Args:
+        requests: List of ContactIdentifyRequest, each with email and/or phone number
+    
+    Returns:
+        List of ContactIdentifyResponse in the same order as the input
+    
+    Raises:
+        HTTPException: For validation errors or internal server errors
+    """
+    if not requests:
+        return []
+    
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch size cannot exceed {MAX_BATCH_SIZE} items"
+        )
+    
+    requests = [normalize_request(r) for r in requests]
+    invalid = [i for i, r in enumerate(requests) if not r.email and not r.phone_number]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At least one contact method (email or phone number) must be provided (items: {invalid[:10]})"
+        )
+    
+    print(f"Processing batch identity reconciliation for {len(requests)} items")
+    
+    try:
+        results = await reconciliation_service.reconcile_batch(requests)
+        print(f"Successfully processed batch identity reconciliation for {len(results)} items")
+        return results
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Unexpected error in batch identify endpoint: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred during batch contact identification"
+        ) from e
+
+
+@router.post("/identify/import")
+async def import_contacts_stream(
+    http_request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Body format: ndjson or csv")
+):
+    """
+    Bulk import historical contacts from a streamed NDJSON or CSV body.
+    
+    Records need email and/or phone_number and may carry created_at. Clusters
+    are computed in a staging table loaded with COPY, in a single transaction, giving
+    the same end state as replaying the records through /identify in
+    created_at order. Intended for identities not yet in the table.
+    Only available on the Postgres storage backend.
+    
+    Returns:
+        dict: Counts of read, skipped, duplicate and imported records
+    
+    Raises:
+        HTTPException: 400 for malformed input, 409 when records match existing contacts,
+            501 on other storage backends
+    """
+    if contact_storage.name != "postgres":
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"Bulk import is not supported by the {contact_storage.name} storage backend"
+        )
+    
+    try:
+        result = await import_contacts(http_request.stream(), format)
+    except ImportFormatError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+    except ImportConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        ) from e
+    except Exception as e:
+        print(f"Unexpected error in contact import: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred during contact import"
+        ) from e
+    
+    print(f"Contact import finished: {result}")
+    
+    # Imported clusters bypass reconciliation, so rebuild the in-process index
+    if IDENTITY_INDEX_ENABLED:
+        await load_identity_index()
+    
+    return result
+
+
+@router.get("/identify/events")
+async def identify_events(
+    after: int = Query(0, ge=0, description="Resume after this offset"),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="Stream format: ndjson or sse"),
+    follow: bool = Query(True, description="Keep the stream open for new events"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Stream identity cluster change events in commit order.
+    
+    Events are contact_created, secondary_linked and primaries_merged, each
+    with a monotonically increasing offset. Consumers store the last offset
+    they processed and reconnect with ``after`` (or, for SSE, the standard
+    Last-Event-ID header) to resume without gaps or full-table polling.
+    Idle streams receive heartbeats: empty lines for NDJSON, comments for SSE.
+    
+    Args:
+        after: Offset of the last event already processed
+        format: ndjson (chunked JSON lines) or sse (text/event-stream)
+        follow: When false, the stream ends once it has caught up
+        last_event_id: SSE reconnect header; takes precedence over ``after``
+    
+    Returns:
+        StreamingResponse of events
+    
+    Raises:
+        HTTPException: 400 for an invalid Last-Event-ID
+    """
+    if last_event_id:
+        try:
+            after = int(last_event_id)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Last-Event-ID must be an event offset"
+            ) from e
+    
+    formatter = format_sse if format == "sse" else format_ndjson
+    
+    async def body():
+        async for event in stream_events(contact_storage, after=after, follow=follow):
+            yield formatter(event)
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/identify/health")
 async def health_check():
     """
@@ -235,17 +401,37 @@ async def health_check():
     """
     try:
         # Test database connectivity
-        async with db_manager.get_connection() as conn:
-            await conn.fetchval("SELECT 1")
+        await contact_storage.ping()
         
         return {
             "status": "healthy",
             "service": "contact-identification",
-            "database": "connected"
+            "database": "connected",
+            "storage_backend": contact_storage.name,
+            "identity_index": identity_index.stats(),
+            "lookup_cache": lookup_cache.stats(),
+            "read_replica": read_pool.uses_replica,
+            "event_stream": event_broker.stats()
         }
     except Exception as e:
         print(f"Health check failed: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Service unhealthy - database connection failed"
-        ) from e
\ No newline at end of file
+        ) from e
+
+
+@router.get("/identify/metrics")
+async def identify_metrics():
+    """
+    Per-route timing histograms for the identify endpoints.
+    
+    Each route reports total time, time spent in storage calls, time spent
+    waiting for a pooled connection and the number of storage round trips per
+    request. The same numbers for a single request are returned in its
+    Server-Timing header.
+    
+    Returns:
+        dict: Histograms keyed by "METHOD path"
+    """
+    return {"routes": route_metrics.snapshot()}
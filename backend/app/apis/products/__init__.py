@@ -1,9 +1,31 @@
-from fastapi import APIRouter, HTTPException, status, Query
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import AsyncIterator, Callable, List, NamedTuple, Optional, Dict, Any, Sequence, Tuple
 from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
 from enum import Enum
+from app.libs.pagination import InvalidCursor, decode_cursor, encode_cursor, query_fingerprint
+from app.libs.product_import import PRODUCT_IMPORT_CHUNK_SIZE, bulk_upsert
+from app.libs.product_store import ColumnarProductStore
+from app.libs.response_cache import ResponseCache, conditional_json_response
+from app.libs.search_index import InvertedIndex
+import asyncio
+import csv
+import io
+import json
 import math
+import os
+import uuid
+import numpy as np
+
+# "memory" serves the built-in demo catalog; "postgres" loads the products
+# table and keeps it warm in process through LISTEN/NOTIFY
+PRODUCT_REPOSITORY = os.environ.get("PRODUCT_REPOSITORY", "memory")
+PRODUCT_LOAD_BATCH_SIZE = int(os.environ.get("PRODUCT_LOAD_BATCH_SIZE", "5000"))
+PRODUCT_SYNC_RETRY_SECONDS = float(os.environ.get("PRODUCT_SYNC_RETRY_SECONDS", "5"))
+# Products read per step of a streaming export
+PRODUCT_EXPORT_CHUNK_SIZE = int(os.environ.get("PRODUCT_EXPORT_CHUNK_SIZE", "1000"))
 
 # Product models
 class ProductCategory(str, Enum):
@@ -20,6 +42,16 @@ class ProductStatus(str, Enum):
     OUT_OF_STOCK = "out_of_stock"
     DISCONTINUED = "discontinued"
 
+class ProductSort(str, Enum):
+    """Stable sort keys for cursor pagination; ties are broken by id"""
+    ID = "id"
+    PRICE = "price"
+
+class SearchSort(str, Enum):
+    RELEVANCE = "relevance"
+    PRICE = "price"
+    ID = "id"
+
 class Product(BaseModel):
     id: int
     name: str
@@ -49,6 +81,7 @@ class ProductListResponse(BaseModel):
     total_pages: int
     has_next: bool
     has_previous: bool
+    next_cursor: Optional[str] = None
 
 class ProductDetailResponse(BaseModel):
     product: Product
@@ -62,6 +95,18 @@ class ProductV11(Product):
     review_count: int = 0
     image_urls: List[str] = []
 
+class PriceBucket(BaseModel):
+    """Products priced in [min_price, max_price); a missing bound is open"""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    count: int
+
+class ProductFacets(BaseModel):
+    """Counts over all matching products, not just the returned page"""
+    category: Dict[str, int]
+    status: Dict[str, int]
+    price: List[PriceBucket]
+
 class ProductSearchResponse(BaseModel):
     """Search response model for v1.1"""
     products: List[ProductV11]
@@ -70,6 +115,52 @@ class ProductSearchResponse(BaseModel):
     page: int
     page_size: int
     filters_applied: Dict[str, Any] = {}
+    next_cursor: Optional[str] = None
+    facets: Optional[ProductFacets] = None
+
+# Cursor-paginated models for v2
+class ProductPageV2(BaseModel):
+    """Cursor-paginated product list for v2"""
+    products: List[ProductSummary]
+    total_count: int
+    page_size: int
+    sort: ProductSort
+    has_next: bool
+    next_cursor: Optional[str] = None
+
+class ProductSearchPageV2(BaseModel):
+    """Cursor-paginated search results for v2"""
+    products: List[ProductV11]
+    search_query: str
+    total_count: int
+    page_size: int
+    sort: SearchSort
+    has_next: bool
+    next_cursor: Optional[str] = None
+    filters_applied: Dict[str, Any] = {}
+    facets: Optional[ProductFacets] = None
+
+class ProductPayload(NamedTuple):
+    """Response forms of one product, built and encoded once per write"""
+    summary: ProductSummary
+    enriched: ProductV11
+    summary_json: bytes
+    enriched_json: bytes
+
+class ProductPage(NamedTuple):
+    """One keyset page, before conversion to a versioned response model"""
+    products: List[Product]
+    total_count: int
+    page: int
+    next_cursor: Optional[str]
+    facets: Optional[ProductFacets] = None
+
+# Number of related products shown on a product detail page
+RELATED_PRODUCTS_LIMIT = 3
+
+# Default price facet bucket edges in USD
+DEFAULT_PRICE_BUCKETS = (25.0, 50.0, 100.0, 250.0, 500.0)
+MAX_PRICE_BUCKETS = 20
 
 # API versioning routers
 router_v1 = APIRouter(prefix="/api/v1")
@@ -79,8 +170,150 @@ router_v2 = APIRouter(prefix="/api/v2")
 class ProductService:
     """Service for managing products across different API versions."""
     
-    def __init__(self):
-        self.mock_products = self._generate_mock_products()
+    def __init__(self, seed_mock_products: bool = True):
+        # Columnar storage with category/status bitmaps and a price index:
+        # filters resolve by index intersection, models are only touched for
+        # the rows on the returned page
+        self.store = ColumnarProductStore(categories=list(ProductCategory), statuses=list(ProductStatus))
+        # Name matches rank above description matches; SKU parts are searchable too
+        self.search_index = InvertedIndex(field_weights={"name": 2.0, "sku": 1.5, "description": 1.0})
+        # category -> summaries of its first RELATED_PRODUCTS_LIMIT + 1 products
+        # (one spare so a product can be excluded from its own list). Rebuilt
+        # lazily once a write touches those products or the category's order.
+        self.related: Dict[ProductCategory, List[ProductSummary]] = {}
+        # product id -> summary/v1.1 forms and their JSON, so reads neither
+        # validate nor encode individual products
+        self.payloads: Dict[int, ProductPayload] = {}
+        # Bumped on every write; the epoch tells versions of different
+        # processes (and restarts) apart
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        # Optional Postgres repository; until the in-process catalog is warm
+        # (and whenever its change feed drops) v1 reads go to the database
+        self.repository = None
+        self.warm = True
+        self.sync_task: Optional[asyncio.Task] = None
+        if seed_mock_products:
+            for product in self._generate_mock_products():
+                self.upsert_product(product)
+    
+    @property
+    def catalog_version(self) -> str:
+        """Identifies the catalog contents served by this process."""
+        return f"{self.epoch}.{self.version}"
+    
+    @property
+    def mock_products(self) -> List[Product]:
+        """All products in insertion order."""
+        return list(self.store)
+    
+    @staticmethod
+    def _payload(p: Product) -> ProductPayload:
+        """Precompute the list and v1.1 forms of an already validated product."""
+        summary = ProductSummary.model_construct(
+            id=p.id,
+            name=p.name,
+            price=p.price,
+            category=p.category,
+            status=p.status,
+            stock_quantity=p.stock_quantity
+        )
+        enriched = ProductV11.model_construct(
+            **dict(p),
+            tags=[p.category.value, "popular"] if p.stock_quantity > 200 else [p.category.value],
+            rating=4.5 if p.price > 100 else 4.0,
+            review_count=int(p.stock_quantity / 10),
+            image_urls=[f"https://example.com/images/{p.sku.lower()}.jpg"]
+        )
+        return ProductPayload(
+            summary=summary,
+            enriched=enriched,
+            summary_json=summary.model_dump_json().encode(),
+            enriched_json=enriched.model_dump_json().encode()
+        )
+    
+    def summaries(self, products: List[Product]) -> List[ProductSummary]:
+        payloads = self.payloads
+        return [payloads[p.id].summary for p in products]
+    
+    def enriched(self, products: List[Product]) -> List[ProductV11]:
+        payloads = self.payloads
+        return [payloads[p.id].enriched for p in products]
+    
+    def encode_response(self, response: BaseModel) -> bytes:
+        """JSON of a list/search response, splicing in the products' pre-encoded forms.
+        
+        Only the envelope is encoded; ``products`` must be the response's
+        first field and hold summaries or v1.1 forms from ``self.payloads``.
+        """
+        envelope = response.model_copy(update={"products": []}).model_dump_json().encode()
+        prefix = b'{"products":[]'
+        if not envelope.startswith(prefix):
+            raise ValueError(f"{type(response).__name__} does not start with a products field")
+        payloads = self.payloads
+        fragments = [
+            payloads[p.id].enriched_json if isinstance(p, ProductV11) else payloads[p.id].summary_json
+            for p in response.products
+        ]
+        return b'{"products":[' + b",".join(fragments) + b"]" + envelope[len(prefix):]
+    
+    def _index_product(self, product: Product) -> None:
+        self.search_index.add(product.id, {
+            "name": product.name,
+            "description": product.description,
+            # Both "WBH-001" style parts and the run-together "wbh001" form
+            "sku": f"{product.sku} {product.sku.replace('-', '')}"
+        })
+    
+    def _invalidate_related(self, category: ProductCategory, product_id: int, appended: bool = False) -> None:
+        """Drop a category's related table if this write can change it.
+        
+        A product appended to a category that already has a full table lands
+        after every cached entry, so the table stays valid.
+        """
+        cached = self.related.get(category)
+        if cached is None:
+            return
+        if appended and len(cached) > RELATED_PRODUCTS_LIMIT:
+            return
+        if appended or any(summary.id == product_id for summary in cached):
+            del self.related[category]
+    
+    def upsert_product(self, product: Product) -> None:
+        """Insert or replace a product and update the store, search index and related tables."""
+        previous = self.store.get(product.id)
+        self.store.upsert(product)
+        self._index_product(product)
+        self.payloads[product.id] = self._payload(product)
+        self.version += 1
+        if previous is None:
+            self._invalidate_related(product.category, product.id, appended=True)
+        elif previous.category != product.category:
+            self._invalidate_related(previous.category, product.id)
+            # The row keeps its place, which may be ahead of the cached entries
+            self.related.pop(product.category, None)
+        else:
+            self._invalidate_related(product.category, product.id)
+    
+    def remove_product(self, product_id: int) -> bool:
+        """Remove a product and its postings; returns False when it did not exist."""
+        product = self.store.get(product_id)
+        if product is None:
+            return False
+        self.store.remove(product_id)
+        self.search_index.remove(product_id)
+        del self.payloads[product_id]
+        self.version += 1
+        self._invalidate_related(product.category, product_id)
+        return True
+    
+    def get_related_products(self, product: Product) -> List[ProductSummary]:
+        """Up to RELATED_PRODUCTS_LIMIT other products from the same category, in catalog order."""
+        cached = self.related.get(product.category)
+        if cached is None:
+            rows = self.store.head(RELATED_PRODUCTS_LIMIT + 1, category=product.category)
+            cached = self.related[product.category] = self.summaries(self.store.products_at(rows))
+        return [summary for summary in cached if summary.id != product.id][:RELATED_PRODUCTS_LIMIT]
     
     def _generate_mock_products(self) -> List[Product]:
         """Generate mock product data for demonstration."""
@@ -219,34 +452,18 @@ class ProductService:
         status: Optional[ProductStatus] = None
     ) -> ProductListResponse:
         """Get paginated list of products with optional filtering."""
-        # Apply filters
-        filtered_products = self.mock_products
-        
-        if category:
-            filtered_products = [p for p in filtered_products if p.category == category]
-        
-        if status:
-            filtered_products = [p for p in filtered_products if p.status == status]
-        
-        # Calculate pagination
-        total_count = len(filtered_products)
+        # Total comes from index cardinality; the page scan stops once it is full
+        total_count = self.store.count(category=category, status=status)
         total_pages = math.ceil(total_count / page_size)
         start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
         
-        paginated_products = filtered_products[start_idx:end_idx]
+        paginated_products = []
+        if start_idx < total_count:
+            rows = self.store.head(page_size, category=category, status=status, offset=start_idx)
+            paginated_products = self.store.products_at(rows)
         
         # Convert to summary format
-        product_summaries = [
-            ProductSummary(
-                id=p.id,
-                name=p.name,
-                price=p.price,
-                category=p.category,
-                status=p.status,
-                stock_quantity=p.stock_quantity
-            ) for p in paginated_products
-        ]
+        product_summaries = self.summaries(paginated_products)
         
         return ProductListResponse(
             products=product_summaries,
@@ -260,7 +477,20 @@ class ProductService:
     
     def get_product_by_id(self, product_id: int) -> Optional[Product]:
         """Get a single product by ID."""
-        return next((p for p in self.mock_products if p.id == product_id), None)
+        return self.store.get(product_id)
+    
+    def get_facets(self, rows: np.ndarray, price_buckets: Sequence[float] = DEFAULT_PRICE_BUCKETS) -> ProductFacets:
+        """Category, status and price bucket counts over matching rows, in one vectorized pass."""
+        counts = self.store.facets(rows, price_buckets)
+        bounds = [None, *price_buckets, None]
+        return ProductFacets(
+            category={category.value: n for category, n in counts["category"].items()},
+            status={product_status.value: n for product_status, n in counts["status"].items()},
+            price=[
+                PriceBucket(min_price=bounds[i], max_price=bounds[i + 1], count=n)
+                for i, n in enumerate(counts["price"])
+            ]
+        )
     
     def search_products(
         self, 
@@ -269,41 +499,31 @@ class ProductService:
         page_size: int = 10,
         category: Optional[ProductCategory] = None,
         min_price: Optional[float] = None,
-        max_price: Optional[float] = None
+        max_price: Optional[float] = None,
+        facets: bool = False,
+        price_buckets: Sequence[float] = DEFAULT_PRICE_BUCKETS
     ) -> ProductSearchResponse:
-        """Search products by name or description (v1.1+ feature)."""
-        # Filter by search query
-        filtered_products = [
-            p for p in self.mock_products 
-            if query.lower() in p.name.lower() or query.lower() in p.description.lower()
-        ]
-        
-        # Apply additional filters
-        if category:
-            filtered_products = [p for p in filtered_products if p.category == category]
+        """Search products by name, description or SKU, best BM25 matches first (v1.1+ feature).
         
-        if min_price is not None:
-            filtered_products = [p for p in filtered_products if p.price >= min_price]
+        Terms are ANDed; ``OR`` separates alternatives. Each term matches the
+        words containing it (see app.libs.search_index). Only products containing
+        the query terms are touched, via the inverted index. With ``facets``,
+        counts over every match come from the same filtered rows.
+        """
+        # Filter by search query, keeping rank order
+        rows = self.store.rows_for([product_id for product_id, _ in self.search_index.search(query)])
         
-        if max_price is not None:
-            filtered_products = [p for p in filtered_products if p.price <= max_price]
+        # Apply additional filters to the hits only, via the bitmaps and price column
+        rows = self.store.restrict(rows, category=category, min_price=min_price, max_price=max_price)
         
         # Calculate pagination
-        total_count = len(filtered_products)
+        total_count = len(rows)
         start_idx = (page - 1) * page_size
         end_idx = start_idx + page_size
-        paginated_products = filtered_products[start_idx:end_idx]
+        paginated_products = self.store.products_at(rows[start_idx:end_idx])
         
         # Convert to enhanced v1.1 format
-        enhanced_products = [
-            ProductV11(
-                **p.dict(),
-                tags=[p.category.value, "popular"] if p.stock_quantity > 200 else [p.category.value],
-                rating=4.5 if p.price > 100 else 4.0,
-                review_count=int(p.stock_quantity / 10),
-                image_urls=[f"https://example.com/images/{p.sku.lower()}.jpg"]
-            ) for p in paginated_products
-        ]
+        enhanced_products = self.enriched(paginated_products)
         
         return ProductSearchResponse(
             products=enhanced_products,
@@ -311,6 +531,328 @@ class ProductService:
             total_count=total_count,
             page=page,
             page_size=page_size,
+            filters_applied={
+                "category": category.value if category else None,
+                "min_price": min_price,
+                "max_price": max_price
+            },
+            facets=self.get_facets(rows, price_buckets) if facets else None
+        )
+    
+    def page_products(
+        self,
+        page_size: int = 10,
+        cursor: Optional[str] = None,
+        sort: ProductSort = ProductSort.ID,
+        category: Optional[ProductCategory] = None,
+        status: Optional[ProductStatus] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> ProductPage:
+        """Get one keyset page of products ordered by ``(sort key, id)`` (v1.1+ feature).
+        
+        The page starts right after the cursor's key, walking the store's
+        sorted index, so any page costs about ``page_size`` rows of work.
+        
+        Raises:
+            InvalidCursor: If the cursor is malformed or from another query
+        """
+        fingerprint = query_fingerprint(
+            view="list", sort=sort, category=category, status=status,
+            min_price=min_price, max_price=max_price
+        )
+        after, page = None, 1
+        if cursor:
+            decoded = decode_cursor(cursor, fingerprint)
+            after, page = decoded.after, decoded.page
+        
+        # One extra row tells whether another page follows
+        rows = self.store.seek(
+            sort.value, page_size + 1, after=after, category=category, status=status,
+            min_price=min_price, max_price=max_price
+        )
+        products = self.store.products_at(rows[:page_size])
+        next_cursor = None
+        if len(rows) > page_size:
+            last = products[-1]
+            key = (last.price, last.id) if sort == ProductSort.PRICE else (last.id, last.id)
+            next_cursor = encode_cursor(sort.value, key, fingerprint, page + 1)
+        
+        total_count = self.store.count(
+            category=category, status=status, min_price=min_price, max_price=max_price
+        )
+        return ProductPage(products, total_count, page, next_cursor)
+    
+    def page_search(
+        self,
+        query: str,
+        page_size: int = 10,
+        cursor: Optional[str] = None,
+        sort: SearchSort = SearchSort.RELEVANCE,
+        category: Optional[ProductCategory] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        facets: bool = False,
+        price_buckets: Sequence[float] = DEFAULT_PRICE_BUCKETS
+    ) -> ProductPage:
+        """Get one keyset page of search results (v1.1+ feature).
+        
+        Hits are ordered by ``(-score, id)``, ``(price, id)`` or ``id``; the
+        page is the first ``page_size`` hits after the cursor's key. Relevance
+        cursors follow the scores at the time of each request, so they are
+        only as stable as the ranking itself.
+        
+        Raises:
+            InvalidCursor: If the cursor is malformed or from another query
+        """
+        fingerprint = query_fingerprint(
+            view="search", q=query, sort=sort, category=category,
+            min_price=min_price, max_price=max_price
+        )
+        after, page = None, 1
+        if cursor:
+            decoded = decode_cursor(cursor, fingerprint)
+            after, page = decoded.after, decoded.page
+        
+        hits = [(product_id, score) for product_id, score in self.search_index.search(query) if product_id in self.store]
+        ids = np.fromiter((product_id for product_id, _ in hits), dtype=np.int64, count=len(hits))
+        rows = self.store.rows_for(ids)
+        keep = self.store.matches(rows, category=category, min_price=min_price, max_price=max_price)
+        rows, ids = rows[keep], ids[keep]
+        total_count = len(rows)
+        # Facets cover every match, so they are taken before the cursor cut
+        facets = self.get_facets(rows, price_buckets) if facets else None
+        
+        if sort == SearchSort.PRICE:
+            keys = self.store.prices[rows]
+        elif sort == SearchSort.ID:
+            keys = ids
+        else:
+            scores = np.fromiter((score for _, score in hits), dtype=np.float64, count=len(hits))
+            keys = -scores[keep]
+        
+        if after is not None:
+            key, last_id = after
+            later = (keys > key) | ((keys == key) & (ids > last_id))
+            rows, ids, keys = rows[later], ids[later], keys[later]
+        
+        order = np.lexsort((ids, keys))[:page_size + 1]
+        products = self.store.products_at(rows[order[:page_size]])
+        next_cursor = None
+        if len(order) > page_size:
+            last = order[page_size - 1]
+            next_cursor = encode_cursor(sort.value, (keys[last].item(), ids[last].item()), fingerprint, page + 1)
+        
+        return ProductPage(products, total_count, page, next_cursor, facets)
+    
+    async def attach_repository(self, repository) -> None:
+        """Back the catalog with a repository; the in-process copy loads and syncs in the background."""
+        self.repository = repository
+        self.warm = False
+        self.sync_task = asyncio.create_task(self._sync_with_repository())
+    
+    async def _sync_with_repository(self) -> None:
+        """Load the catalog, then apply change notifications; reload after any disconnect."""
+        schema_ready = False
+        while True:
+            try:
+                if not schema_ready:
+                    await self.repository.create_schema()
+                    schema_ready = True
+                # Subscribe before loading so changes made during the load are not lost
+                async with self.repository.listen() as changes:
+                    await self._reload()
+                    self.warm = True
+                    print(f"Product catalog warm: {len(self.store)} products")
+                    while True:
+                        changed = {await changes.get()}
+                        while not changes.empty():
+                            changed.add(changes.get_nowait())
+                        if None in changed:
+                            raise ConnectionError("product change listener disconnected")
+                        await self._refresh(changed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.warm = False
+                print(f"Product catalog sync failed, retrying: {str(e)}")
+                await asyncio.sleep(PRODUCT_SYNC_RETRY_SECONDS)
+    
+    async def _reload(self) -> None:
+        """Make the in-process catalog match the repository, touching only products that differ."""
+        seen = set()
+        async for batch in self.repository.iter_products(PRODUCT_LOAD_BATCH_SIZE):
+            for row in batch:
+                product = Product(**row)
+                seen.add(product.id)
+                if self.store.get(product.id) != product:
+                    self.upsert_product(product)
+        for product_id in [p.id for p in self.store if p.id not in seen]:
+            self.remove_product(product_id)
+    
+    async def _refresh(self, product_ids) -> None:
+        """Apply changed products from the repository, touching only those that differ."""
+        rows = await self.repository.get_products(list(product_ids))
+        found = {row["id"]: Product(**row) for row in rows}
+        for product_id in product_ids:
+            if product_id in found:
+                if self.store.get(product_id) != found[product_id]:
+                    self.upsert_product(found[product_id])
+            else:
+                self.remove_product(product_id)
+    
+    @staticmethod
+    def import_row(record: Dict[str, Any]) -> Product:
+        """Validate one bulk import row; timestamps default to now.
+        
+        Prices are rounded to cents the way the repository's NUMERIC(12, 2)
+        column rounds them, so both backends hold the same value.
+        
+        Raises:
+            ValueError: If the row is not a valid product, naming the bad fields
+        """
+        now = datetime.utcnow().isoformat() + "Z"
+        try:
+            product = Product.model_validate({"created_at": now, **record, "updated_at": now})
+        except ValidationError as e:
+            raise ValueError("; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+            )) from e
+        return product.model_copy(update={"price": _round_price(product.price)})
+    
+    async def save_products(self, products: List[Product]) -> None:
+        """Persist products to the repository, or apply them in process without one.
+        
+        With a repository attached the in-process catalog picks the rows up
+        through its change feed, exactly as written (timestamps included),
+        so each row is applied once. The repository writes the whole batch
+        in one statement, so a failure leaves it untouched. Existing products
+        keep their ``created_at`` in either case.
+        """
+        if self.repository is not None:
+            await self.repository.upsert_products([p.model_dump(mode="json") for p in products])
+            return
+        for product in products:
+            previous = self.store.get(product.id)
+            if previous is not None and previous.created_at != product.created_at:
+                product = product.model_copy(update={"created_at": previous.created_at})
+            self.upsert_product(product)
+    
+    async def delete_products(self, product_ids: List[int]) -> None:
+        """Delete products from the repository, or from the in-process catalog without one.
+        
+        Like save_products, a repository-backed catalog applies the deletes
+        once, from its change feed.
+        """
+        if self.repository is not None:
+            await self.repository.delete_products(product_ids)
+            return
+        for product_id in product_ids:
+            self.remove_product(product_id)
+    
+    async def export_products(
+        self,
+        category: Optional[ProductCategory] = None,
+        status: Optional[ProductStatus] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        chunk_size: int = PRODUCT_EXPORT_CHUNK_SIZE
+    ) -> AsyncIterator[List[Product]]:
+        """Every matching product in id order, a chunk at a time.
+        
+        Chunks are keyset reads after the last id returned: seeks on the id
+        index while the catalog is warm, batched queries on the repository
+        otherwise. Products written during an export are seen or not
+        depending on their id, but none is returned twice.
+        """
+        if self.repository is not None and not self.warm:
+            async for rows in self.repository.iter_products(
+                chunk_size,
+                category=category.value if category else None,
+                status=status.value if status else None,
+                min_price=min_price,
+                max_price=max_price
+            ):
+                yield [Product(**row) for row in rows]
+            return
+        
+        after = None
+        while True:
+            rows = self.store.seek(
+                "id", chunk_size, after=after, category=category, status=status,
+                min_price=min_price, max_price=max_price
+            )
+            if not len(rows):
+                return
+            products = self.store.products_at(rows)
+            yield products
+            after = (products[-1].id, products[-1].id)
+    
+    # Read-through queries, used while the in-process catalog is not warm
+    
+    async def query_products(
+        self,
+        page: int = 1,
+        page_size: int = 10,
+        category: Optional[ProductCategory] = None,
+        status: Optional[ProductStatus] = None
+    ) -> ProductListResponse:
+        """Same as get_products, answered by the repository."""
+        rows, total_count = await self.repository.list_products(
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            category=category.value if category else None,
+            status=status.value if status else None
+        )
+        total_pages = math.ceil(total_count / page_size)
+        return ProductListResponse(
+            products=[ProductSummary(**row) for row in rows],
+            total_count=total_count,
+            page=page,
+            page_size=page_size,
+            total_pages=total_pages,
+            has_next=page < total_pages,
+            has_previous=page > 1
+        )
+    
+    async def query_product(self, product_id: int) -> Optional[ProductDetailResponse]:
+        """Product detail with related products, answered by the repository."""
+        row = await self.repository.get_product(product_id)
+        if row is None:
+            return None
+        product = Product(**row)
+        related, _ = await self.repository.list_products(
+            limit=RELATED_PRODUCTS_LIMIT + 1, category=product.category.value
+        )
+        return ProductDetailResponse(
+            product=product,
+            related_products=[ProductSummary(**r) for r in related if r["id"] != product.id][:RELATED_PRODUCTS_LIMIT]
+        )
+    
+    async def query_search(
+        self,
+        query: str,
+        page: int = 1,
+        page_size: int = 10,
+        category: Optional[ProductCategory] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> ProductSearchResponse:
+        """Substring search answered by the repository, in id order rather than by relevance."""
+        rows, total_count = await self.repository.search_products(
+            query,
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            category=category.value if category else None,
+            min_price=min_price,
+            max_price=max_price
+        )
+        return ProductSearchResponse(
+            products=[self._payload(Product(**row)).enriched for row in rows],
+            search_query=query,
+            total_count=total_count,
+            page=page,
+            page_size=page_size,
             filters_applied={
                 "category": category.value if category else None,
                 "min_price": min_price,
@@ -319,7 +861,97 @@ class ProductService:
         )
 
 # Initialize product service
-product_service = ProductService()
+product_service = ProductService(seed_mock_products=PRODUCT_REPOSITORY != "postgres")
+
+# Encoded list/search response bodies, keyed by catalog version and query
+product_response_cache = ResponseCache()
+
+
+def _round_price(price: float) -> float:
+    """Round to cents like a float8 -> NUMERIC(12, 2) cast: 15 significant digits, then half away from zero."""
+    return float(Decimal(f"{price:.15g}").quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+
+def _parse_price_buckets(value: Optional[str]) -> Tuple[float, ...]:
+    """Parse comma-separated, strictly increasing price bucket edges.
+    
+    Raises:
+        HTTPException: 400 if the edges are malformed
+    """
+    if not value:
+        return DEFAULT_PRICE_BUCKETS
+    try:
+        edges = tuple(float(edge) for edge in value.split(","))
+    except ValueError:
+        edges = ()
+    if (not edges or len(edges) > MAX_PRICE_BUCKETS or not all(map(math.isfinite, edges))
+            or any(b <= a for a, b in zip(edges, edges[1:]))):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"price_buckets must be 1-{MAX_PRICE_BUCKETS} increasing numbers separated by commas"
+        )
+    return edges
+
+def _require_warm_catalog() -> None:
+    """Refuse a cursor read while the in-process catalog is not warm.
+    
+    Cursor pages are keyed on the in-process sorted indexes and relevance
+    ranking, which the repository cannot reproduce, so there is nothing
+    to read through to. Refusing here also keeps a stale or partial
+    catalog from being served under an ETag or stored in the body cache.
+    
+    Raises:
+        HTTPException: 503 with Retry-After while the catalog loads or resyncs
+    """
+    if not product_service.warm:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Product catalog is loading; cursor pagination is unavailable, retry shortly",
+            headers={"Retry-After": str(math.ceil(PRODUCT_SYNC_RETRY_SECONDS))}
+        )
+
+def _conditional_response(
+    if_none_match: Optional[str],
+    view: str,
+    params: Dict[str, Any],
+    build: Callable[[], BaseModel]
+) -> Response:
+    """Answer a catalog read with 304, a cached body, or a freshly built one.
+    
+    The ETag depends only on the catalog version and the query, so the
+    first two cases skip model construction and JSON encoding entirely. A
+    miss encodes only the envelope around the products' cached JSON.
+    """
+    etag = product_response_cache.etag(product_service.catalog_version, view, params)
+    return conditional_json_response(
+        if_none_match, etag, product_response_cache,
+        lambda: product_service.encode_response(build())
+    )
+
+class RequestBodyStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator consumes the request body as it goes.
+    
+    The base class also listens for client disconnects on ASGI servers older
+    than spec 2.4, and that listener would swallow the request body messages;
+    here a disconnect surfaces from ``request.stream()`` instead.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+EXPORT_COLUMNS = list(Product.model_fields)
+
+def _export_ndjson(products: List[Product]) -> bytes:
+    return b"".join(p.model_dump_json().encode() + b"\n" for p in products)
+
+def _export_csv(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+def _csv_row(p: Product) -> list:
+    return [p.id, p.name, p.description, p.price, p.category.value, p.status.value,
+            p.stock_quantity, p.sku, p.created_at, p.updated_at]
 
 # V1.0 Product Endpoints
 @router_v1.get("/products", response_model=ProductListResponse)
@@ -327,7 +959,8 @@ async def list_products_v1(
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Items per page"),
     category: Optional[ProductCategory] = Query(None, description="Filter by category"),
-    status: Optional[ProductStatus] = Query(None, description="Filter by status")
+    product_status: Optional[ProductStatus] = Query(None, alias="status", description="Filter by status"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ) -> ProductListResponse:
     """
     Get a paginated list of products (v1.0).
@@ -337,22 +970,38 @@ async def list_products_v1(
     - Category filtering
     - Status filtering
     - Basic product information
+    - ETag revalidation: 304 Not Modified while the catalog is unchanged
     
     Args:
         page: Page number (starts from 1)
         page_size: Number of items per page (1-100)
         category: Optional category filter
-        status: Optional status filter
+        product_status: Optional status filter
+        if_none_match: Optional ETag of a previously fetched response
     
     Returns:
         ProductListResponse: Paginated list of products
     """
     try:
-        return product_service.get_products(
-            page=page,
-            page_size=page_size,
-            category=category,
-            status=status
+        if not product_service.warm:
+            # Catalog still loading or its change feed dropped: read through
+            return await product_service.query_products(
+                page=page,
+                page_size=page_size,
+                category=category,
+                status=product_status
+            )
+        
+        return _conditional_response(
+            if_none_match,
+            "products",
+            {"page": page, "page_size": page_size, "category": category, "status": product_status},
+            lambda: product_service.get_products(
+                page=page,
+                page_size=page_size,
+                category=category,
+                status=product_status
+            )
         )
     except Exception as e:
         print(f"Error in list_products_v1: {str(e)}")
@@ -375,6 +1024,15 @@ async def get_product_v1(product_id: int) -> ProductDetailResponse:
     Raises:
         HTTPException: 404 if product not found
     """
+    if not product_service.warm:
+        detail = await product_service.query_product(product_id)
+        if detail is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with ID {product_id} not found"
+            )
+        return detail
+    
     product = product_service.get_product_by_id(product_id)
     
     if not product:
@@ -383,34 +1041,27 @@ async def get_product_v1(product_id: int) -> ProductDetailResponse:
             detail=f"Product with ID {product_id} not found"
         )
     
-    # Get related products (same category, different products)
-    related = [
-        ProductSummary(
-            id=p.id,
-            name=p.name,
-            price=p.price,
-            category=p.category,
-            status=p.status,
-            stock_quantity=p.stock_quantity
-        )
-        for p in product_service.mock_products
-        if p.category == product.category and p.id != product.id
-    ][:3]  # Limit to 3 related products
-    
+    # Related products (same category, different products) come from the
+    # precomputed per-category table
     return ProductDetailResponse(
         product=product,
-        related_products=related
+        related_products=product_service.get_related_products(product)
     )
 
 # V1.1 Product Endpoints (Enhanced with search)
 @router_v1_1.get("/products/search", response_model=ProductSearchResponse)
 async def search_products_v1_1(
-    q: str = Query(..., min_length=1, description="Search query"),
+    q: str = Query(..., min_length=1, description="Search query; terms are ANDed, OR separates alternatives, a term matches words containing it"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Items per page"),
     category: Optional[ProductCategory] = Query(None, description="Filter by category"),
     min_price: Optional[float] = Query(None, ge=0, description="Minimum price filter"),
-    max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter")
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous next_cursor; replaces page"),
+    sort: Optional[SearchSort] = Query(None, description="Sort for cursor pagination (default relevance)"),
+    facets: bool = Query(False, description="Include category, status and price bucket counts for all matches"),
+    price_buckets: Optional[str] = Query(None, description="Comma-separated price bucket edges, e.g. 25,50,100"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ) -> ProductSearchResponse:
     """
     Search products by name or description with advanced filtering (v1.1).
@@ -420,6 +1071,10 @@ async def search_products_v1_1(
     - Price range filtering
     - Enhanced product information with tags and ratings
     - Image URLs included
+    - Cursor pagination: pass ``sort`` (or a ``cursor``) instead of ``page``
+      and follow ``next_cursor``
+    - ETag revalidation: 304 Not Modified while the catalog is unchanged
+    - Optional facet counts (category, status, price buckets) over all matches
     
     Args:
         q: Search query string
@@ -428,9 +1083,18 @@ async def search_products_v1_1(
         category: Optional category filter
         min_price: Optional minimum price filter
         max_price: Optional maximum price filter
+        cursor: Optional cursor of the page to fetch
+        sort: Optional sort order, which switches to cursor pagination
+        facets: Whether to include facet counts
+        price_buckets: Optional price facet bucket edges
+        if_none_match: Optional ETag of a previously fetched response
     
     Returns:
         ProductSearchResponse: Search results with enhanced product data
+    
+    Raises:
+        HTTPException: 400 if the price range, price buckets or cursor are invalid,
+            503 for cursor pages while the catalog is not warm
     """
     try:
         if min_price is not None and max_price is not None and min_price > max_price:
@@ -438,17 +1102,75 @@ async def search_products_v1_1(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="min_price cannot be greater than max_price"
             )
+        buckets = _parse_price_buckets(price_buckets)
         
-        return product_service.search_products(
-            query=q,
-            page=page,
-            page_size=page_size,
-            category=category,
-            min_price=min_price,
-            max_price=max_price
+        if not product_service.warm and not cursor and not sort:
+            return await product_service.query_search(
+                query=q,
+                page=page,
+                page_size=page_size,
+                category=category,
+                min_price=min_price,
+                max_price=max_price
+            )
+        _require_warm_catalog()
+        
+        def build() -> ProductSearchResponse:
+            if not cursor and not sort:
+                return product_service.search_products(
+                    query=q,
+                    page=page,
+                    page_size=page_size,
+                    category=category,
+                    min_price=min_price,
+                    max_price=max_price,
+                    facets=facets,
+                    price_buckets=buckets
+                )
+            
+            result = product_service.page_search(
+                query=q,
+                page_size=page_size,
+                cursor=cursor,
+                sort=sort or SearchSort.RELEVANCE,
+                category=category,
+                min_price=min_price,
+                max_price=max_price,
+                facets=facets,
+                price_buckets=buckets
+            )
+            return ProductSearchResponse(
+                products=product_service.enriched(result.products),
+                search_query=q,
+                total_count=result.total_count,
+                page=result.page,
+                page_size=page_size,
+                filters_applied={
+                    "category": category.value if category else None,
+                    "min_price": min_price,
+                    "max_price": max_price
+                },
+                next_cursor=result.next_cursor,
+                facets=result.facets
+            )
+        
+        return _conditional_response(
+            if_none_match,
+            "products.search",
+            {
+                "q": q, "page": page, "page_size": page_size, "category": category,
+                "min_price": min_price, "max_price": max_price, "cursor": cursor, "sort": sort,
+                "facets": facets, "price_buckets": buckets
+            },
+            build
         )
     except HTTPException:
         raise
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
     except Exception as e:
         print(f"Error in search_products_v1_1: {str(e)}")
         raise HTTPException(
@@ -461,12 +1183,308 @@ async def list_products_v1_1(
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Items per page"),
     category: Optional[ProductCategory] = Query(None, description="Filter by category"),
-    status: Optional[ProductStatus] = Query(None, description="Filter by status")
+    product_status: Optional[ProductStatus] = Query(None, alias="status", description="Filter by status"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous next_cursor; replaces page"),
+    sort: Optional[ProductSort] = Query(None, description="Sort for cursor pagination (default id)"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ) -> ProductListResponse:
     """
     Get a paginated list of products (v1.1) - same as v1.0 for compatibility.
+    
+    Passing ``sort`` (or a ``cursor``) switches to cursor pagination ordered
+    by ``id`` or ``(price, id)``; follow ``next_cursor`` for the next page.
+    Responses carry an ETag and revalidate like v1.0.
+    
+    Raises:
+        HTTPException: 400 if the cursor is invalid, 503 for cursor pages
+            while the catalog is not warm
     """
-    return await list_products_v1(page, page_size, category, status)
+    if not cursor and not sort:
+        return await list_products_v1(page, page_size, category, product_status, if_none_match)
+    _require_warm_catalog()
+    
+    def build() -> ProductListResponse:
+        result = product_service.page_products(
+            page_size=page_size,
+            cursor=cursor,
+            sort=sort or ProductSort.ID,
+            category=category,
+            status=product_status
+        )
+        return ProductListResponse(
+            products=product_service.summaries(result.products),
+            total_count=result.total_count,
+            page=result.page,
+            page_size=page_size,
+            total_pages=math.ceil(result.total_count / page_size),
+            has_next=result.next_cursor is not None,
+            has_previous=result.page > 1,
+            next_cursor=result.next_cursor
+        )
+    
+    try:
+        return _conditional_response(
+            if_none_match,
+            "products.cursor",
+            {"page_size": page_size, "category": category, "status": product_status, "cursor": cursor, "sort": sort},
+            build
+        )
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+
+# V2 Product Endpoints (cursor pagination only)
+@router_v2.get("/products", response_model=ProductPageV2)
+async def list_products_v2(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous next_cursor"),
+    page_size: int = Query(10, ge=1, le=100, description="Items per page"),
+    sort: ProductSort = Query(ProductSort.ID, description="Sort order; ties are broken by id"),
+    category: Optional[ProductCategory] = Query(None, description="Filter by category"),
+    product_status: Optional[ProductStatus] = Query(None, alias="status", description="Filter by status"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price filter"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+) -> ProductPageV2:
+    """
+    Get a cursor-paginated list of products (v2).
+    
+    Pages are keyed on ``id`` or ``(price, id)``, so every page costs the
+    same and products written between requests do not shift later pages.
+    Responses carry an ETag; ``If-None-Match`` gets 304 while it is current.
+    
+    Args:
+        cursor: Cursor of the page to fetch; omit for the first page
+        page_size: Number of items per page (1-100)
+        sort: Sort order, ``id`` or ``price``
+        category: Optional category filter
+        product_status: Optional status filter
+        min_price: Optional minimum price filter
+        max_price: Optional maximum price filter
+        if_none_match: Optional ETag of a previously fetched response
+    
+    Returns:
+        ProductPageV2: One page of products and the cursor of the next one
+    
+    Raises:
+        HTTPException: 400 if the price range or cursor is invalid, 503 while
+            the catalog is not warm
+    """
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price cannot be greater than max_price"
+        )
+    _require_warm_catalog()
+    
+    def build() -> ProductPageV2:
+        result = product_service.page_products(
+            page_size=page_size,
+            cursor=cursor,
+            sort=sort,
+            category=category,
+            status=product_status,
+            min_price=min_price,
+            max_price=max_price
+        )
+        return ProductPageV2(
+            products=product_service.summaries(result.products),
+            total_count=result.total_count,
+            page_size=page_size,
+            sort=sort,
+            has_next=result.next_cursor is not None,
+            next_cursor=result.next_cursor
+        )
+    
+    try:
+        return _conditional_response(
+            if_none_match,
+            "v2.products",
+            {
+                "cursor": cursor, "page_size": page_size, "sort": sort, "category": category,
+                "status": product_status, "min_price": min_price, "max_price": max_price
+            },
+            build
+        )
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+
+@router_v2.get("/products/search", response_model=ProductSearchPageV2)
+async def search_products_v2(
+    q: str = Query(..., min_length=1, description="Search query; terms are ANDed, OR separates alternatives, a term matches words containing it"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous next_cursor"),
+    page_size: int = Query(10, ge=1, le=100, description="Items per page"),
+    sort: SearchSort = Query(SearchSort.RELEVANCE, description="Sort order; ties are broken by id"),
+    category: Optional[ProductCategory] = Query(None, description="Filter by category"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price filter"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter"),
+    facets: bool = Query(False, description="Include category, status and price bucket counts for all matches"),
+    price_buckets: Optional[str] = Query(None, description="Comma-separated price bucket edges, e.g. 25,50,100"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+) -> ProductSearchPageV2:
+    """
+    Search products with cursor pagination (v2).
+    
+    Args:
+        q: Search query string
+        cursor: Cursor of the page to fetch; omit for the first page
+        page_size: Number of items per page (1-100)
+        sort: Sort order, ``relevance``, ``price`` or ``id``
+        category: Optional category filter
+        min_price: Optional minimum price filter
+        max_price: Optional maximum price filter
+        facets: Whether to include facet counts over all matches
+        price_buckets: Optional price facet bucket edges
+        if_none_match: Optional ETag of a previously fetched response
+    
+    Returns:
+        ProductSearchPageV2: One page of results and the cursor of the next one
+    
+    Raises:
+        HTTPException: 400 if the price range, price buckets or cursor are invalid,
+            503 while the catalog is not warm
+    """
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price cannot be greater than max_price"
+        )
+    buckets = _parse_price_buckets(price_buckets)
+    _require_warm_catalog()
+    
+    def build() -> ProductSearchPageV2:
+        result = product_service.page_search(
+            query=q,
+            page_size=page_size,
+            cursor=cursor,
+            sort=sort,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            facets=facets,
+            price_buckets=buckets
+        )
+        return ProductSearchPageV2(
+            products=product_service.enriched(result.products),
+            search_query=q,
+            total_count=result.total_count,
+            page_size=page_size,
+            sort=sort,
+            has_next=result.next_cursor is not None,
+            next_cursor=result.next_cursor,
+            filters_applied={
+                "category": category.value if category else None,
+                "min_price": min_price,
+                "max_price": max_price
+            },
+            facets=result.facets
+        )
+    
+    try:
+        return _conditional_response(
+            if_none_match,
+            "v2.products.search",
+            {
+                "q": q, "cursor": cursor, "page_size": page_size, "sort": sort, "category": category,
+                "min_price": min_price, "max_price": max_price, "facets": facets, "price_buckets": buckets
+            },
+            build
+        )
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+
+@router_v2.get("/products/export")
+async def export_products_v2(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format: ndjson or csv"),
+    category: Optional[ProductCategory] = Query(None, description="Filter by category"),
+    product_status: Optional[ProductStatus] = Query(None, alias="status", description="Filter by status"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price filter"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter")
+) -> StreamingResponse:
+    """
+    Stream every matching product as NDJSON or CSV, in id order (v2).
+    
+    One request replaces paging through the whole catalog. Products are
+    read and encoded a chunk at a time as the client consumes the body, so
+    memory stays flat however large the catalog.
+    
+    Args:
+        format: ``ndjson`` (one product object per line) or ``csv`` (with a header row)
+        category: Optional category filter
+        product_status: Optional status filter
+        min_price: Optional minimum price filter
+        max_price: Optional maximum price filter
+    
+    Returns:
+        StreamingResponse: The matching products
+    
+    Raises:
+        HTTPException: 400 if the price range is invalid
+    """
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price cannot be greater than max_price"
+        )
+    
+    async def body():
+        if format == "csv":
+            yield _export_csv([EXPORT_COLUMNS])
+        async for products in product_service.export_products(
+            category=category, status=product_status, min_price=min_price, max_price=max_price
+        ):
+            if format == "csv":
+                yield _export_csv(_csv_row(p) for p in products)
+            else:
+                yield _export_ndjson(products)
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
+
+@router_v2.post("/products/bulk")
+async def bulk_upsert_products_v2(
+    http_request: Request,
+    chunk_size: int = Query(PRODUCT_IMPORT_CHUNK_SIZE, ge=1, le=10000, description="Rows validated and applied together")
+) -> RequestBodyStreamingResponse:
+    """
+    Insert or update products from a streamed NDJSON body (v2).
+    
+    Each line is one product object; ``created_at`` and ``updated_at`` are
+    optional. The body is read as it arrives and applied chunk by chunk,
+    each chunk in one repository write, and the catalog's search, price and
+    category indexes are updated product by product (from the change feed
+    when the catalog is backed by Postgres), so memory stays flat for
+    uploads of any size. Invalid rows are skipped and reported; prices are
+    rounded to cents.
+    
+    Args:
+        http_request: Request whose body is the NDJSON stream
+        chunk_size: Rows per chunk (1-10000)
+    
+    Returns:
+        StreamingResponse: NDJSON reports; one ``progress`` line per chunk
+        with counts, throughput and the chunk's rejected lines, then
+        ``done``, or ``error`` if a chunk could not be written
+    """
+    async def body():
+        async for report in bulk_upsert(
+            http_request.stream(), ProductService.import_row, product_service.save_products, chunk_size
+        ):
+            if report["type"] != "progress":
+                print(f"Product bulk upsert finished: {report}")
+            yield json.dumps(report) + "\n"
+    
+    return RequestBodyStreamingResponse(body(), media_type="application/x-ndjson")
 
 # Main router that includes all versioned routers
 router = APIRouter()
@@ -474,4 +1492,22 @@ router = APIRouter()
 # Include all version routers
 router.include_router(router_v1, tags=["products-v1"])
 router.include_router(router_v1_1, tags=["products-v1.1"])
-router.include_router(router_v2, tags=["products-v2"])
\ No newline at end of file
+router.include_router(router_v2, tags=["products-v2"])
+
+
+@router.on_event("startup")
+async def attach_product_repository():
+    """Load the catalog from Postgres when PRODUCT_REPOSITORY=postgres."""
+    if PRODUCT_REPOSITORY != "postgres":
+        return
+    
+    # Deferred so the in-memory catalog works without a database driver
+    from app.libs.product_repository import PostgresProductRepository
+    
+    await product_service.attach_repository(PostgresProductRepository())
+
+
+@router.on_event("shutdown")
+async def stop_product_sync():
+    if product_service.sync_task:
+        product_service.sync_task.cancel()
@@ -0,0 +1,247 @@
+"""Set-based helpers for reading and reconciling whole contact clusters.
+
+A cluster is every live contact reachable from a set of emails or phone
+numbers by following ``linked_id`` in either direction. Keys are matched in
+their normalized form (see app.libs.contact_keys). Storage backends fetch a
+cluster in one call (see app.libs.contact_storage), which replaces the
+per-secondary hierarchy walks and the per-id lookups, so reconciliation
+costs a constant number of round trips no matter how large the cluster is.
+The helpers here are pure planning on top of that and work with any backend.
+
+Usage:
+
+    from app.libs.contact_cluster import build_identify_response, select_primary
+
+    async with contact_storage.transaction() as tx:
+        cluster = await tx.fetch_cluster([email], [phone_number])
+        primary = select_primary(cluster)
+        await tx.relink([(c.id, primary.id) for c in cluster if needs_relink(c, primary.id)])
+        response = build_identify_response(primary, cluster)
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from app.libs.contact_keys import contact_keys
+from app.libs.contact_storage import ContactTransaction, NewContact
+from app.libs.disjoint_set import DisjointSet
+from app.libs.models import Contact, ContactIdentifyRequest, ContactIdentifyResponse, LinkPrecedence
+
+ContactKey = Tuple[Optional[str], Optional[str]]
+
+
+@dataclass
+class ComponentPlan:
+    """Writes needed to reconcile one connected component of a batch.
+
+    ``request_indexes`` are positions in the original batch. When ``primary``
+    is None the component is brand new and the first entry of
+    ``new_contacts`` becomes its primary. ``contacts`` holds the full
+    cluster once the plan has been applied.
+    """
+    request_indexes: List[int]
+    existing: List[Contact]
+    primary: Optional[Contact]
+    new_contacts: List[ContactKey] = field(default_factory=list)
+    relink_ids: List[int] = field(default_factory=list)
+    contacts: List[Contact] = field(default_factory=list)
+
+
+def select_primary(contacts: List[Contact]) -> Contact:
+    """Pick the cluster primary: the oldest primary, or the oldest contact if none is primary."""
+    ordered = sorted(contacts, key=lambda c: (c.created_at, c.id))
+    for contact in ordered:
+        if contact.link_precedence == LinkPrecedence.PRIMARY:
+            return contact
+    return ordered[0]
+
+
+def needs_relink(contact: Contact, primary_id: int) -> bool:
+    """True when a non-primary contact does not point directly at the primary."""
+    return contact.id != primary_id and (
+        contact.link_precedence != LinkPrecedence.SECONDARY or contact.linked_id != primary_id
+    )
+
+
+def build_identify_response(primary: Contact, contacts: List[Contact]) -> ContactIdentifyResponse:
+    """Build the consolidated response from an in-memory cluster, primary values first."""
+    others = sorted((c for c in contacts if c.id != primary.id), key=lambda c: (c.created_at, c.id))
+
+    ordered = [primary, *others]
+    emails = dict.fromkeys(c.email for c in ordered if c.email)
+    phone_numbers = dict.fromkeys(c.phone_number for c in ordered if c.phone_number)
+
+    return ContactIdentifyResponse(
+        primary_contact_id=primary.id,
+        emails=list(emails),
+        phone_numbers=list(phone_numbers),
+        secondary_contact_ids=[c.id for c in others]
+    )
+
+
+def group_components(requests: Sequence[ContactIdentifyRequest],
+                     contacts: Sequence[Contact]) -> List[Tuple[List[int], List[Contact]]]:
+    """Split a batch into connected components of requests and existing contacts.
+
+    Requests join when they share an email or phone, directly or through
+    existing contacts and their ``linked_id`` links. Requests must already be
+    normalized. Components come back in the order of their first request.
+    """
+    ds = DisjointSet()
+    for index, request in enumerate(requests):
+        ds.add(("request", index))
+        if request.email:
+            ds.union(("request", index), ("email", request.email))
+        if request.phone_number:
+            ds.union(("request", index), ("phone", request.phone_number))
+
+    for contact in contacts:
+        ds.add(("contact", contact.id))
+        email, phone_number = contact_keys(contact)
+        if email:
+            ds.union(("contact", contact.id), ("email", email))
+        if phone_number:
+            ds.union(("contact", contact.id), ("phone", phone_number))
+        if contact.linked_id:
+            ds.union(("contact", contact.id), ("contact", contact.linked_id))
+
+    members: Dict[object, List[Contact]] = {}
+    for contact in contacts:
+        members.setdefault(ds.find(("contact", contact.id)), []).append(contact)
+
+    components = []
+    for group in ds.groups(("request", index) for index in range(len(requests))):
+        root = ds.find(group[0])
+        components.append(([index for _, index in group], members.get(root, [])))
+    return components
+
+
+def plan_component(requests: Sequence[ContactIdentifyRequest], request_indexes: List[int],
+                   existing: List[Contact]) -> ComponentPlan:
+    """Work out, in memory, the writes that sequential /identify calls would make.
+
+    Replaying the requests in input order, a new contact is added for every
+    email/phone pair not yet present, and every existing contact not pointing
+    directly at the oldest primary is relinked to it.
+    """
+    primary = select_primary(existing) if existing else None
+    plan = ComponentPlan(request_indexes=request_indexes, existing=existing, primary=primary)
+
+    seen = {contact_keys(c) for c in existing}
+    for index in request_indexes:
+        key = (requests[index].email, requests[index].phone_number)
+        if key not in seen:
+            seen.add(key)
+            plan.new_contacts.append(key)
+
+    if primary:
+        plan.relink_ids = [c.id for c in existing if needs_relink(c, primary.id)]
+    return plan
+
+
+async def apply_component_plans(tx: ContactTransaction, plans: List[ComponentPlan]) -> None:
+    """Apply every plan with at most three bulk writes, filling in each plan's ``contacts``.
+
+    New primaries are inserted first so their ids are known, then all new
+    secondaries, then one relink covering every component, all inside ``tx``.
+    """
+    # Contact keys are unique across components because each one carries an
+    # email or phone owned by that component, so inserted rows map back by key.
+    new_primaries: List[NewContact] = [
+        (*plan.new_contacts[0], None) for plan in plans if plan.primary is None
+    ]
+    inserted: Dict[ContactKey, Contact] = {}
+    if new_primaries:
+        inserted.update((contact_keys(c), c) for c in await tx.insert_contacts(new_primaries))
+
+    secondaries: List[NewContact] = []
+    relinks: List[Tuple[int, int]] = []
+    for plan in plans:
+        if plan.primary is None:
+            plan.primary = inserted[plan.new_contacts[0]]
+            pending = plan.new_contacts[1:]
+        else:
+            pending = plan.new_contacts
+        secondaries.extend((email, phone, plan.primary.id) for email, phone in pending)
+        relinks.extend((contact_id, plan.primary.id) for contact_id in plan.relink_ids)
+
+    if secondaries:
+        inserted.update((contact_keys(c), c) for c in await tx.insert_contacts(secondaries))
+
+    await tx.relink(relinks)
+
+    for plan in plans:
+        plan.contacts = plan.existing + [inserted[key] for key in plan.new_contacts]
+
+
+def replay_responses(requests: Sequence[ContactIdentifyRequest], plan: ComponentPlan) -> List[ContactIdentifyResponse]:
+    """Build the response each request of an applied plan would have got on its own.
+
+    The requests are replayed in input order over the existing contacts and
+    the ones the plan inserted: a request sees the clusters its email and
+    phone reached at that point, and the oldest contact that was a primary
+    when it was written (an existing primary, or a new contact that started
+    its own cluster) leads it. Merges only ever keep the oldest primary, so
+    that is the primary one-by-one calls would have reported. Returns one
+    response per entry of ``plan.request_indexes``.
+    """
+    ds = DisjointSet()
+    # Root -> contacts present in that cluster so far, and the ids that were primaries
+    clusters: Dict[object, List[Contact]] = {}
+    primaries: Set[int] = set()
+
+    def join(a, b) -> None:
+        root_a, root_b = ds.find(a), ds.find(b)
+        if root_a == root_b:
+            return
+        members = clusters.pop(root_a, []) + clusters.pop(root_b, [])
+        root = ds.union(a, b)
+        if members:
+            clusters[root] = members
+
+    def attach(node, email: Optional[str], phone_number: Optional[str]) -> None:
+        ds.add(node)
+        if email:
+            join(node, ("email", email))
+        if phone_number:
+            join(node, ("phone", phone_number))
+
+    def add_contact(contact: Contact) -> None:
+        node = ("contact", contact.id)
+        ds.add(node)
+        clusters.setdefault(ds.find(node), []).append(contact)
+
+    for contact in plan.existing:
+        add_contact(contact)
+        if contact.link_precedence == LinkPrecedence.PRIMARY:
+            primaries.add(contact.id)
+    for contact in plan.existing:
+        attach(("contact", contact.id), *contact_keys(contact))
+        if contact.linked_id:
+            join(("contact", contact.id), ("contact", contact.linked_id))
+
+    inserted = dict(zip(plan.new_contacts, plan.contacts[len(plan.existing):]))
+    responses = []
+    cached: Dict[object, Tuple[int, ContactIdentifyResponse]] = {}
+    for index in plan.request_indexes:
+        request = requests[index]
+        node = ("request", index)
+        attach(node, request.email, request.phone_number)
+        contact = inserted.pop((request.email, request.phone_number), None)
+        if contact is not None:
+            if not clusters.get(ds.find(node)):
+                primaries.add(contact.id)
+            add_contact(contact)
+            join(("contact", contact.id), node)
+
+        root = ds.find(node)
+        cluster = clusters[root]
+        if root in cached and cached[root][0] == len(cluster):
+            responses.append(cached[root][1])
+            continue
+        leaders = [c for c in cluster if c.id in primaries]
+        primary = min(leaders or cluster, key=lambda c: (c.created_at, c.id))
+        response = build_identify_response(primary, cluster)
+        cached[root] = (len(cluster), response)
+        responses.append(response)
+    return responses
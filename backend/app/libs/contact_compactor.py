@@ -0,0 +1,332 @@
+"""Flatten contact hierarchies so every secondary points straight at its root primary.
+
+Earlier merges can leave secondaries whose ``linked_id`` points at another
+secondary, and deletes can leave links to contacts that no longer exist.
+Compaction repairs both in bounded keyset batches, so it can run alongside
+live traffic:
+
+1. Orphans: the live contacts linked to the same missing or deleted
+   contact were one identity, so the oldest of them becomes a primary again
+   (``contact_promoted``) and the rest are re-pointed at it
+   (``secondary_linked``). An orphan with no siblings, or a secondary
+   without a link, becomes a standalone primary.
+2. Chains: a secondary whose parent is itself linked is re-pointed at the
+   root found by walking ``linked_id`` upwards (``secondary_linked``).
+
+Each batch is selected without locks, then written like a reconciliation:
+split into lock groups by email/phone, each group under its key stripes (in
+this worker and across workers) in one transaction that re-checks the rows
+and appends one outbox event per change; siblings of one missing contact
+always share a group. After commit the changed clusters are dropped from
+the identity index and the lookup cache.
+
+Every worker runs the periodic loop, but each run first takes a session
+advisory lock and is skipped while another worker holds it, so the table
+is scanned by one worker at a time.
+
+Run it from the app lifespan (CONTACT_COMPACTION_INTERVAL_SECONDS) or as a
+one-off:
+
+    python -m app.libs.contact_compactor --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+from app.libs.contact_storage.postgres import PostgresContactTransaction
+from app.libs.database import db_manager
+from app.libs.identity_events import CONTACT_PROMOTED, SECONDARY_LINKED, EventBroker, event_broker
+from app.libs.identity_index import IdentityIndex, identity_index
+from app.libs.identity_locks import ADVISORY_LOCK_NAMESPACE, StripedLock, acquire_advisory_locks, identity_locks
+from app.libs.identity_lookup import ClusterLookupCache, lookup_cache
+
+CONTACT_COMPACTION_INTERVAL_SECONDS = float(os.environ.get("CONTACT_COMPACTION_INTERVAL_SECONDS", "0"))
+CONTACT_COMPACTION_BATCH_SIZE = int(os.environ.get("CONTACT_COMPACTION_BATCH_SIZE", "1000"))
+
+# Chains deeper than this (or cycles) are left alone and reported
+MAX_CHAIN_DEPTH = 64
+
+# Held for the length of one run so only one worker compacts at a time
+COMPACTION_LEADER_LOCK_QUERY = "SELECT pg_try_advisory_lock($1, 0)"
+COMPACTION_LEADER_UNLOCK_QUERY = "SELECT pg_advisory_unlock($1, 0)"
+COMPACTION_LOCK_NAMESPACE = ADVISORY_LOCK_NAMESPACE + 2
+
+ORPHAN_CONDITION = """
+c.deleted_at IS NULL
+AND (
+    (c.linked_id IS NOT NULL
+     AND NOT EXISTS (SELECT 1 FROM contacts p WHERE p.id = c.linked_id AND p.deleted_at IS NULL))
+    OR (c.linked_id IS NULL AND c.link_precedence <> 'primary')
+)
+"""
+
+# Orphans are batched by the contact they point at, so all siblings are
+# handled together
+SELECT_ORPHANS_QUERY = f"""
+WITH parents AS (
+    SELECT DISTINCT c.linked_id AS parent_id
+    FROM contacts c
+    WHERE c.linked_id > $1 AND {ORPHAN_CONDITION}
+    ORDER BY parent_id
+    LIMIT $2
+)
+SELECT c.id, c.email_normalized, c.phone_normalized, c.linked_id AS parent_id
+FROM contacts c
+JOIN parents p ON p.parent_id = c.linked_id
+WHERE c.deleted_at IS NULL
+ORDER BY c.linked_id, c.id
+"""
+
+SELECT_UNLINKED_QUERY = """
+SELECT c.id, c.email_normalized, c.phone_normalized, NULL::bigint AS parent_id
+FROM contacts c
+WHERE c.id > $1 AND c.deleted_at IS NULL AND c.linked_id IS NULL AND c.link_precedence <> 'primary'
+ORDER BY c.id
+LIMIT $2
+"""
+
+# Re-checked under the locks. Per missing parent (or per unlinked contact)
+# the oldest orphan is promoted and the others are linked to it; neither
+# update touches the other's rows.
+PROMOTE_ORPHANS_QUERY = f"""
+WITH orphans AS (
+    SELECT c.id, c.linked_id AS parent_id, COALESCE(c.linked_id, -c.id) AS orphan_group, c.created_at
+    FROM contacts c
+    WHERE c.id = ANY($1::bigint[]) AND {ORPHAN_CONDITION}
+), leaders AS (
+    SELECT DISTINCT ON (orphan_group) orphan_group, id
+    FROM orphans
+    ORDER BY orphan_group, created_at, id
+), promoted AS (
+    UPDATE contacts c
+    SET linked_id = NULL, link_precedence = 'primary', updated_at = NOW()
+    FROM leaders l
+    WHERE c.id = l.id
+    RETURNING c.id
+), relinked AS (
+    UPDATE contacts c
+    SET linked_id = l.id, link_precedence = 'secondary', updated_at = NOW()
+    FROM orphans o
+    JOIN leaders l ON l.orphan_group = o.orphan_group
+    WHERE c.id = o.id AND o.id <> l.id
+    RETURNING c.id, l.id AS primary_id
+)
+SELECT p.id, o.parent_id AS previous_linked_id, NULL::bigint AS primary_contact_id
+FROM promoted p JOIN orphans o ON o.id = p.id
+UNION ALL
+SELECT r.id, o.parent_id, r.primary_id
+FROM relinked r JOIN orphans o ON o.id = r.id
+"""
+
+SELECT_CHAINS_QUERY = """
+WITH RECURSIVE batch AS (
+    SELECT c.id, c.linked_id, c.email_normalized, c.phone_normalized
+    FROM contacts c
+    JOIN contacts p ON p.id = c.linked_id
+    WHERE c.deleted_at IS NULL
+      AND c.id > $1
+      AND p.linked_id IS NOT NULL
+    ORDER BY c.id
+    LIMIT $2
+), walk(id, node, depth) AS (
+    SELECT id, linked_id, 1 FROM batch
+    UNION ALL
+    SELECT w.id, p.linked_id, w.depth + 1
+    FROM walk w
+    JOIN contacts p ON p.id = w.node
+    WHERE p.linked_id IS NOT NULL AND w.depth < $3
+), roots AS (
+    SELECT DISTINCT ON (id) id, node AS root_id
+    FROM walk
+    ORDER BY id, depth DESC
+)
+SELECT b.id, b.email_normalized, b.phone_normalized, NULL::bigint AS parent_id, r.root_id
+FROM batch b
+JOIN roots r ON r.id = b.id
+ORDER BY b.id
+"""
+
+# Only re-points rows whose root is still a live primary and which nobody
+# has re-linked since they were selected
+FLATTEN_CHAINS_QUERY = """
+UPDATE contacts c
+SET linked_id = v.root_id, link_precedence = 'secondary', updated_at = NOW()
+FROM unnest($1::bigint[], $2::bigint[]) AS v(id, root_id), contacts old, contacts root
+WHERE c.id = v.id
+  AND old.id = c.id
+  AND root.id = v.root_id
+  AND v.root_id <> c.id
+  AND c.deleted_at IS NULL
+  AND c.linked_id IS DISTINCT FROM v.root_id
+  AND EXISTS (SELECT 1 FROM contacts p WHERE p.id = c.linked_id AND p.linked_id IS NOT NULL)
+  AND root.linked_id IS NULL
+  AND root.deleted_at IS NULL
+RETURNING c.id, old.linked_id AS previous_linked_id, v.root_id
+"""
+
+
+class ContactCompactor:
+    """Runs compaction passes with the same locks and side effects as reconciliation."""
+
+    def __init__(self, db=db_manager, batch_size: int = CONTACT_COMPACTION_BATCH_SIZE,
+                 locks: StripedLock = identity_locks, index: Optional[IdentityIndex] = identity_index,
+                 cache: ClusterLookupCache = lookup_cache, events: EventBroker = event_broker):
+        self.db = db
+        self.batch_size = batch_size
+        self.locks = locks
+        self.index = index
+        self.cache = cache
+        self.events = events
+
+    async def run(self) -> Dict[str, object]:
+        """Run every pass over the whole table and return per-pass totals.
+
+        Secondaries that were scanned but not updated in the chain pass sit on
+        a cycle, on a chain deeper than MAX_CHAIN_DEPTH, or changed meanwhile.
+        """
+        started = time.perf_counter()
+        orphans = await self._run_pass(SELECT_ORPHANS_QUERY, self._promote, cursor="parent_id")
+        unlinked = await self._run_pass(SELECT_UNLINKED_QUERY, self._promote)
+        chains = await self._run_pass(SELECT_CHAINS_QUERY, self._flatten, MAX_CHAIN_DEPTH)
+        return {
+            "orphans": orphans,
+            "unlinked": unlinked,
+            "chains": chains,
+            "unresolved": chains["scanned"] - chains["updated"],
+            "duration_seconds": round(time.perf_counter() - started, 3)
+        }
+
+    async def run_if_leader(self) -> Optional[Dict[str, object]]:
+        """Run unless another worker is compacting; returns None when skipped.
+
+        The leader lock is a session advisory lock, so it lives on one pooled
+        connection held for the whole run and is released if that connection
+        drops.
+        """
+        async with self.db.get_connection() as conn:
+            if not await conn.fetchval(COMPACTION_LEADER_LOCK_QUERY, COMPACTION_LOCK_NAMESPACE):
+                return None
+            try:
+                return await self.run()
+            finally:
+                await conn.fetchval(COMPACTION_LEADER_UNLOCK_QUERY, COMPACTION_LOCK_NAMESPACE)
+
+    async def _run_pass(self, select_query: str, apply, *args, cursor: str = "id") -> Dict[str, int]:
+        """Walk ``select_query`` in keyset batches on the ``cursor`` column and apply each batch."""
+        totals = {"batches": 0, "scanned": 0, "updated": 0}
+        last = 0
+        while True:
+            async with self.db.get_connection() as conn:
+                rows = await conn.fetch(select_query, last, self.batch_size, *args)
+            if not rows:
+                return totals
+            totals["batches"] += 1
+            totals["scanned"] += len(rows)
+            totals["updated"] += await self._apply_batch(rows, apply)
+            last = rows[-1][cursor]
+
+    async def _apply_batch(self, rows: Sequence, apply) -> int:
+        """Write one batch lock group by lock group; returns the number of changed contacts."""
+        updated = 0
+        keys = [(row["email_normalized"], row["phone_normalized"]) for row in rows]
+        # Orphans of one missing contact are regrouped together, whatever their keys
+        for indexes, stripes in self.locks.partition(keys, together=[row["parent_id"] for row in rows]):
+            group = [rows[i] for i in indexes]
+            async with self.locks.acquire(stripes):
+                async with self.db.get_connection() as conn:
+                    async with conn.transaction():
+                        await acquire_advisory_locks(conn, stripes)
+                        tx = PostgresContactTransaction(conn)
+                        touched, events = await apply(conn, group)
+                        await tx.append_events(events)
+
+                # Committed: forget every cluster the changed contacts were or are part of
+                if self.index:
+                    self.index.invalidate(touched)
+                self.cache.invalidate(touched)
+                self.events.publish(events)
+            updated += len(events)
+        return updated
+
+    @staticmethod
+    async def _promote(conn, group: Sequence):
+        changed = await conn.fetch(PROMOTE_ORPHANS_QUERY, [row["id"] for row in group])
+        touched: List[int] = []
+        events = []
+        for row in changed:
+            touched.append(row["id"])
+            if row["previous_linked_id"] is not None:
+                touched.append(row["previous_linked_id"])
+            if row["primary_contact_id"] is None:
+                events.append((CONTACT_PROMOTED, {
+                    "contact_id": row["id"],
+                    "previous_linked_id": row["previous_linked_id"]
+                }))
+            else:
+                touched.append(row["primary_contact_id"])
+                events.append((SECONDARY_LINKED, {
+                    "contact_id": row["id"],
+                    "primary_contact_id": row["primary_contact_id"],
+                    "previous_linked_id": row["previous_linked_id"]
+                }))
+        return touched, events
+
+    @staticmethod
+    async def _flatten(conn, group: Sequence):
+        group = [row for row in group if row["root_id"] is not None]
+        if not group:
+            return [], []
+        changed = await conn.fetch(
+            FLATTEN_CHAINS_QUERY, [row["id"] for row in group], [row["root_id"] for row in group]
+        )
+        touched: List[int] = []
+        events = []
+        for row in changed:
+            touched.extend((row["id"], row["root_id"], row["previous_linked_id"]))
+            events.append((SECONDARY_LINKED, {
+                "contact_id": row["id"],
+                "primary_contact_id": row["root_id"],
+                "previous_linked_id": row["previous_linked_id"]
+            }))
+        return touched, events
+
+
+async def compact_contacts(db=db_manager, batch_size: int = CONTACT_COMPACTION_BATCH_SIZE) -> Dict[str, object]:
+    """Run every compaction pass over the whole table and return per-pass totals."""
+    return await ContactCompactor(db, batch_size).run()
+
+
+async def run_periodic_compaction(interval_seconds: float = CONTACT_COMPACTION_INTERVAL_SECONDS,
+                                  batch_size: int = CONTACT_COMPACTION_BATCH_SIZE) -> None:
+    """Compact forever, sleeping ``interval_seconds`` between runs; cancel to stop.
+
+    A run is skipped while another worker holds the compaction leader lock.
+    """
+    compactor = ContactCompactor(batch_size=batch_size)
+    while True:
+        try:
+            result = await compactor.run_if_leader()
+            if result and (result["orphans"]["updated"] or result["unlinked"]["updated"]
+                           or result["chains"]["updated"] or result["unresolved"]):
+                print(f"Contact compaction: {result}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Contact compaction failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Flatten contact hierarchies to depth one.")
+    parser.add_argument("--batch-size", type=int, default=CONTACT_COMPACTION_BATCH_SIZE,
+                        help="Contacts examined per statement")
+    args = parser.parse_args()
+
+    print(asyncio.run(compact_contacts(batch_size=args.batch_size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""Streaming bulk import of historical contacts with clustering in the database.
+
+Replaying a tenant's history through /identify one request at a time is far
+too slow, so this computes the end state directly:
+
+1. Stream the NDJSON/CSV input once, parse and normalize every record and
+   spool it to a temporary file. A malformed record aborts the import with
+   ImportFormatError before anything is written.
+2. Stream the spool again and COPY it in chunks into a temporary staging
+   table, then, in the same transaction:
+3. Rank the records by created_at, drop records repeating an email/phone
+   pair already seen, and label every record with the earliest record of
+   its cluster by propagating the smallest rank over shared emails and
+   phones (with pointer jumping, so a cluster of n records settles in about
+   log n rounds).
+4. Assign contact ids, link secondaries to their primary, insert
+   everything into contacts and write a ``contact_created`` event per
+   contact to the identity event outbox.
+
+Records are kept in created_at order semantics: the earliest record of a
+cluster becomes its primary, and a record repeating an email/phone pair
+already seen is dropped, exactly as sequential /identify calls would do.
+The import is meant for identities not yet in the table; if any incoming key
+already exists it aborts with ImportConflict instead of guessing a merge.
+
+Python memory is bounded by the chunk size however large the upload; the
+clustering state lives in the staging table and is dropped on commit.
+
+Usage:
+
+    python -m app.libs.contact_import contacts.ndjson --format ndjson
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from app.libs.contact_keys import normalize_email, normalize_phone
+from app.libs.database import db_manager
+from app.libs.db_metrics import timed_db_call
+from app.libs.identity_events import CONTACT_CREATED
+
+IMPORT_CHUNK_SIZE = 10000
+
+CREATE_STAGING_QUERY = """
+CREATE TEMP TABLE contact_import_staging (
+    seq BIGINT PRIMARY KEY,
+    email TEXT,
+    phone_number TEXT,
+    email_normalized TEXT,
+    phone_normalized TEXT,
+    created_at TIMESTAMPTZ,
+    rank BIGINT,
+    label BIGINT,
+    contact_id BIGINT,
+    linked_id BIGINT
+) ON COMMIT DROP
+"""
+
+STAGING_COLUMNS = [
+    "seq", "email", "phone_number", "email_normalized", "phone_normalized", "created_at"
+]
+
+# Records without created_at sort after every dated record, ties by input order
+RANK_QUERY = """
+UPDATE contact_import_staging s
+SET rank = r.rank, label = r.rank
+FROM (
+    SELECT seq, row_number() OVER (ORDER BY created_at IS NULL, created_at, seq) AS rank
+    FROM contact_import_staging
+) r
+WHERE s.seq = r.seq
+"""
+
+DROP_DUPLICATES_QUERY = """
+DELETE FROM contact_import_staging
+WHERE seq IN (
+    SELECT seq
+    FROM (
+        SELECT seq, row_number() OVER (PARTITION BY email_normalized, phone_normalized ORDER BY rank) AS n
+        FROM contact_import_staging
+    ) d
+    WHERE d.n > 1
+)
+"""
+
+CREATE_STAGING_INDEXES_QUERY = """
+CREATE INDEX ON contact_import_staging (rank);
+CREATE INDEX ON contact_import_staging (email_normalized);
+CREATE INDEX ON contact_import_staging (phone_normalized);
+ANALYZE contact_import_staging
+"""
+
+# One round of label propagation: every record takes the smallest label
+# among records sharing its email or phone and the label of the record its
+# label points at. Labels only decrease; a round that changes nothing means
+# each label is the rank of its cluster's earliest record.
+PROPAGATE_LABELS_QUERY = """
+WITH by_email AS (
+    SELECT email_normalized, min(label) AS label
+    FROM contact_import_staging
+    WHERE email_normalized IS NOT NULL
+    GROUP BY email_normalized
+), by_phone AS (
+    SELECT phone_normalized, min(label) AS label
+    FROM contact_import_staging
+    WHERE phone_normalized IS NOT NULL
+    GROUP BY phone_normalized
+), proposed AS (
+    SELECT s.seq, LEAST(s.label, e.label, p.label, j.label) AS label
+    FROM contact_import_staging s
+    LEFT JOIN by_email e ON e.email_normalized = s.email_normalized
+    LEFT JOIN by_phone p ON p.phone_normalized = s.phone_normalized
+    LEFT JOIN contact_import_staging j ON j.rank = s.label
+)
+UPDATE contact_import_staging s
+SET label = proposed.label
+FROM proposed
+WHERE s.seq = proposed.seq AND proposed.label < s.label
+"""
+
+STAGED_COUNTS_QUERY = """
+SELECT count(*) AS imported, count(*) FILTER (WHERE rank = label) AS clusters
+FROM contact_import_staging
+"""
+
+CONFLICT_QUERY = """
+SELECT count(*)
+FROM contact_import_staging s
+WHERE EXISTS (
+    SELECT 1 FROM contacts c
+    WHERE c.deleted_at IS NULL
+      AND (c.email_normalized = s.email_normalized OR c.phone_normalized = s.phone_normalized)
+)
+"""
+
+ASSIGN_IDS_QUERY = """
+UPDATE contact_import_staging
+SET contact_id = nextval(pg_get_serial_sequence('contacts', 'id'))
+"""
+
+LINK_SECONDARIES_QUERY = """
+UPDATE contact_import_staging s
+SET linked_id = p.contact_id
+FROM contact_import_staging p
+WHERE p.rank = s.label AND s.rank <> s.label
+"""
+
+# Primaries go first so every secondary's linked_id already exists. The
+# precedence is a literal so it is coerced to the column type.
+INSERT_PRIMARIES_QUERY = """
+INSERT INTO contacts (id, email, phone_number, email_normalized, phone_normalized,
+                      linked_id, link_precedence, created_at, updated_at)
+SELECT contact_id, email, phone_number, email_normalized, phone_normalized,
+       NULL, 'primary', COALESCE(created_at, NOW()), NOW()
+FROM contact_import_staging
+WHERE linked_id IS NULL
+ORDER BY seq
+"""
+
+INSERT_SECONDARIES_QUERY = """
+INSERT INTO contacts (id, email, phone_number, email_normalized, phone_normalized,
+                      linked_id, link_precedence, created_at, updated_at)
+SELECT contact_id, email, phone_number, email_normalized, phone_normalized,
+       linked_id, 'secondary', COALESCE(created_at, NOW()), NOW()
+FROM contact_import_staging
+WHERE linked_id IS NOT NULL
+ORDER BY seq
+"""
+
+# One contact_created event per imported contact, primaries first, in the
+# shape reconciliation writes
+INSERT_EVENTS_QUERY = """
+INSERT INTO identity_events (event_type, payload)
+SELECT $1, jsonb_build_object(
+    'contact_id', contact_id,
+    'primary_contact_id', COALESCE(linked_id, contact_id),
+    'email', email,
+    'phone_number', phone_number,
+    'link_precedence', CASE WHEN linked_id IS NULL THEN 'primary' ELSE 'secondary' END
+)
+FROM contact_import_staging
+ORDER BY linked_id IS NOT NULL, seq
+"""
+
+# (email, phone_number, created_at) of one parsed record
+ImportRecord = Tuple[Optional[str], Optional[str], Optional[datetime]]
+
+
+class ImportConflict(Exception):
+    """Incoming records share keys with contacts already in the table."""
+
+
+class ImportFormatError(ValueError):
+    """A record could not be parsed."""
+
+
+def _parse_created_at(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _text_field(record: Dict[str, Any], name: str) -> Optional[str]:
+    value = record.get(name)
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise ValueError(f"{name} must be a string")
+    return str(value)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines without buffering more than one line."""
+    pending = b""
+    line_number = 0
+
+    def decode(raw: bytes) -> str:
+        try:
+            return raw.decode("utf-8").rstrip("\r")
+        except UnicodeDecodeError as e:
+            raise ImportFormatError(f"Line {line_number}: not valid UTF-8") from e
+
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield decode(line)
+    if pending:
+        line_number += 1
+        yield decode(pending)
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[ImportRecord]:
+    """Yield ``(email, phone_number, created_at)`` from NDJSON or CSV lines.
+
+    Raises:
+        ImportFormatError: A line is not a JSON object (or CSV row), a field
+            has the wrong type or created_at is not an ISO 8601 timestamp
+    """
+    header: Optional[List[str]] = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            if fmt == "ndjson":
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+            elif header is None:
+                header = [h.strip() for h in next(csv.reader([line]))]
+                continue
+            else:
+                record = dict(zip(header, next(csv.reader([line]))))
+            created_at = _text_field(record, "created_at")
+            yield (_text_field(record, "email"), _text_field(record, "phone_number"),
+                   _parse_created_at(created_at))
+        except (ValueError, StopIteration, csv.Error) as e:
+            raise ImportFormatError(f"Line {line_number}: {e}") from e
+
+
+class ContactImporter:
+    """Runs one import; see the module docstring for the phases."""
+
+    def __init__(self, db=db_manager, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.stats = {"read": 0, "skipped": 0, "duplicates": 0, "imported": 0, "clusters": 0, "rounds": 0}
+
+    async def run(self, records: AsyncIterator[ImportRecord]) -> Dict[str, object]:
+        started = time.perf_counter()
+        with tempfile.TemporaryFile() as spool:
+            # Pass 1: parse, normalize and spool; nothing is kept per record
+            seq = 0
+            async for email, phone_number, created_at in records:
+                self.stats["read"] += 1
+                if not normalize_email(email) and not normalize_phone(phone_number):
+                    self.stats["skipped"] += 1
+                    continue
+                seq += 1
+                spool.write(json.dumps([
+                    seq, email, phone_number, created_at.isoformat() if created_at else None
+                ]).encode() + b"\n")
+            spool.seek(0)
+
+            # Pass 2: stage the records in chunks, then cluster and insert in SQL
+            async with self.db.get_connection() as conn:
+                async with conn.transaction():
+                    await conn.execute(CREATE_STAGING_QUERY)
+                    for chunk in self._staged_chunks(spool):
+                        async with timed_db_call("import_copy"):
+                            await conn.copy_records_to_table(
+                                "contact_import_staging", records=chunk, columns=STAGING_COLUMNS
+                            )
+
+                    for query in (RANK_QUERY, DROP_DUPLICATES_QUERY, CREATE_STAGING_INDEXES_QUERY):
+                        async with timed_db_call("import_rank"):
+                            await conn.execute(query)
+                    while True:
+                        self.stats["rounds"] += 1
+                        async with timed_db_call("import_cluster"):
+                            result = await conn.execute(PROPAGATE_LABELS_QUERY)
+                        if int(result.split()[-1]) == 0:
+                            break
+
+                    async with timed_db_call("import_check"):
+                        counts = await conn.fetchrow(STAGED_COUNTS_QUERY)
+                    async with timed_db_call("import_check"):
+                        conflicts = await conn.fetchval(CONFLICT_QUERY)
+                    self.stats["imported"] = counts["imported"]
+                    self.stats["clusters"] = counts["clusters"]
+                    if conflicts:
+                        raise ImportConflict(
+                            f"{conflicts} incoming records match existing contacts; "
+                            "reconcile them through /identify instead"
+                        )
+                    for query in (ASSIGN_IDS_QUERY, LINK_SECONDARIES_QUERY,
+                                  INSERT_PRIMARIES_QUERY, INSERT_SECONDARIES_QUERY):
+                        async with timed_db_call("import_insert"):
+                            await conn.execute(query)
+                    async with timed_db_call("append_events"):
+                        await conn.execute(INSERT_EVENTS_QUERY, CONTACT_CREATED)
+
+        self.stats["duplicates"] = seq - self.stats["imported"]
+        return {**self.stats, "duration_seconds": round(time.perf_counter() - started, 3)}
+
+    def _staged_chunks(self, spool) -> Iterable[List[tuple]]:
+        chunk: List[tuple] = []
+        for line in spool:
+            seq, email, phone_number, created_at = json.loads(line)
+            chunk.append((seq, email, phone_number, normalize_email(email), normalize_phone(phone_number),
+                          _parse_created_at(created_at)))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+async def import_contacts(chunks: AsyncIterator[bytes], fmt: str = "ndjson", db=db_manager,
+                          chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, object]:
+    """Import a streamed NDJSON/CSV body; returns counts and duration."""
+    if fmt not in ("ndjson", "csv"):
+        raise ImportFormatError(f"Unsupported format: {fmt}")
+    records = iter_records(iter_lines(chunks), fmt)
+    return await ContactImporter(db, chunk_size).run(records)
+
+
+async def _read_file(path: str, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import contacts with offline clustering.")
+    parser.add_argument("path", help="NDJSON or CSV file with email, phone_number and optional created_at")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Rows per COPY")
+    args = parser.parse_args()
+
+    print(asyncio.run(import_contacts(_read_file(args.path), args.format, chunk_size=args.chunk_size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Canonical forms of the email and phone number keys used to match contacts.
+
+Emails are trimmed and lower-cased. Phone numbers are reduced to digits with
+an E.164-style ``+`` prefix when the country is known, either from a leading
+``+``/``00`` or from DEFAULT_PHONE_COUNTRY_CODE. The same functions fill the
+``email_normalized``/``phone_normalized`` columns, so Python and database
+lookups always agree.
+
+Usage:
+
+    from app.libs.contact_keys import normalize_email, normalize_phone
+
+    normalize_email("  Foo@X.com ")     # "foo@x.com"
+    normalize_phone("+1 (555) 010-2030")  # "+15550102030"
+"""
+
+import os
+from typing import Optional, Tuple
+
+from app.libs.models import Contact, ContactIdentifyRequest
+
+# Country calling code applied to numbers given without one, e.g. "1" or "91"
+DEFAULT_PHONE_COUNTRY_CODE = os.environ.get("DEFAULT_PHONE_COUNTRY_CODE", "").lstrip("+")
+
+_DIGITS = frozenset("0123456789")
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email or None
+
+
+def normalize_phone(phone_number: Optional[str]) -> Optional[str]:
+    if not phone_number:
+        return None
+    phone_number = phone_number.strip()
+    international = phone_number.startswith("+")
+    digits = "".join(ch for ch in phone_number if ch in _DIGITS)
+    if not digits:
+        return None
+
+    if not international and digits.startswith("00"):
+        international, digits = True, digits[2:]
+    if international:
+        return f"+{digits}"
+    if DEFAULT_PHONE_COUNTRY_CODE:
+        return f"+{DEFAULT_PHONE_COUNTRY_CODE}{digits.lstrip('0')}"
+    return digits
+
+
+def contact_keys(contact: Contact) -> Tuple[Optional[str], Optional[str]]:
+    """Normalized ``(email, phone_number)`` of a stored contact."""
+    return normalize_email(contact.email), normalize_phone(contact.phone_number)
+
+
+def normalize_request(request: ContactIdentifyRequest) -> ContactIdentifyRequest:
+    """Copy of ``request`` with both keys in canonical form."""
+    return ContactIdentifyRequest(
+        email=normalize_email(request.email),
+        phone_number=normalize_phone(request.phone_number)
+    )
@@ -0,0 +1,115 @@
+"""Schema migration and backfill for normalized contact lookup keys.
+
+Adds ``email_normalized``/``phone_normalized`` to contacts, fills them in
+bounded keyset batches using the same Python normalization as the request
+path, and builds covering partial indexes concurrently so cluster seeding
+becomes an index-only scan.
+
+Run once before deploying code that reads the new columns:
+
+    python -m app.libs.contact_migrations --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict
+
+from app.libs.contact_keys import normalize_email, normalize_phone
+from app.libs.database import db_manager
+
+ADD_COLUMNS_QUERY = """
+ALTER TABLE contacts
+    ADD COLUMN IF NOT EXISTS email_normalized TEXT,
+    ADD COLUMN IF NOT EXISTS phone_normalized TEXT
+"""
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction, so each one is
+# issued as its own statement. INCLUDE lets the cluster seed skip the heap.
+INDEX_QUERIES = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS contacts_email_normalized_idx
+    ON contacts (email_normalized) INCLUDE (id, linked_id)
+    WHERE deleted_at IS NULL
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS contacts_phone_normalized_idx
+    ON contacts (phone_normalized) INCLUDE (id, linked_id)
+    WHERE deleted_at IS NULL
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS contacts_linked_id_idx
+    ON contacts (linked_id) INCLUDE (id)
+    WHERE deleted_at IS NULL
+    """,
+]
+
+BACKFILL_BATCH_QUERY = """
+SELECT id, email, phone_number
+FROM contacts
+WHERE id > $1
+ORDER BY id
+LIMIT $2
+"""
+
+BACKFILL_UPDATE_QUERY = """
+UPDATE contacts AS c
+SET email_normalized = v.email_normalized, phone_normalized = v.phone_normalized
+FROM unnest($1::bigint[], $2::text[], $3::text[]) AS v(id, email_normalized, phone_normalized)
+WHERE c.id = v.id
+  AND (c.email_normalized IS DISTINCT FROM v.email_normalized
+       OR c.phone_normalized IS DISTINCT FROM v.phone_normalized)
+"""
+
+
+async def backfill_normalized_keys(db=db_manager, batch_size: int = 5000) -> Dict[str, int]:
+    """Fill the normalized columns for every contact, one short transaction per batch."""
+    totals = {"batches": 0, "scanned": 0, "updated": 0}
+    last_id = 0
+    while True:
+        async with db.get_connection() as conn:
+            rows = await conn.fetch(BACKFILL_BATCH_QUERY, last_id, batch_size)
+            if not rows:
+                return totals
+            result = await conn.execute(
+                BACKFILL_UPDATE_QUERY,
+                [row["id"] for row in rows],
+                [normalize_email(row["email"]) for row in rows],
+                [normalize_phone(row["phone_number"]) for row in rows]
+            )
+        totals["batches"] += 1
+        totals["scanned"] += len(rows)
+        totals["updated"] += int(result.split()[-1])
+        last_id = rows[-1]["id"]
+
+
+async def migrate_normalized_keys(db=db_manager, batch_size: int = 5000) -> Dict[str, object]:
+    """Add the columns, backfill them and build the covering indexes."""
+    started = time.perf_counter()
+    async with db.get_connection() as conn:
+        await conn.execute(ADD_COLUMNS_QUERY)
+
+    backfill = await backfill_normalized_keys(db, batch_size)
+
+    async with db.get_connection() as conn:
+        for query in INDEX_QUERIES:
+            await conn.execute(query)
+
+    return {"backfill": backfill, "duration_seconds": round(time.perf_counter() - started, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Add and backfill normalized contact lookup keys.")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Contacts updated per transaction")
+    parser.add_argument("--backfill-only", action="store_true",
+                        help="Only re-run the backfill, e.g. after changing DEFAULT_PHONE_COUNTRY_CODE")
+    args = parser.parse_args()
+
+    if args.backfill_only:
+        print(asyncio.run(backfill_normalized_keys(batch_size=args.batch_size)))
+    else:
+        print(asyncio.run(migrate_normalized_keys(batch_size=args.batch_size)))
+
+
+if __name__ == "__main__":
+    main()
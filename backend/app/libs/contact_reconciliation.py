@@ -0,0 +1,307 @@
+"""Contact identity reconciliation: the service behind /identify and /identify/batch.
+
+The service only depends on a ContactStorage and the in-process identity
+structures, each of which can be passed in; by default it uses the shared
+instances the API serves from. Benchmarks and tests build their own with an
+in-memory store.
+
+Usage:
+
+    from app.libs.contact_reconciliation import ContactReconciliationService
+
+    service = ContactReconciliationService(db=InMemoryContactStorage())
+    response = await service.reconcile_contact_identity(request)
+"""
+
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.libs.contact_cluster import (
+    apply_component_plans,
+    build_identify_response,
+    group_components,
+    needs_relink,
+    plan_component,
+    replay_responses,
+    select_primary,
+)
+from app.libs.contact_keys import contact_keys, normalize_email, normalize_phone, normalize_request
+from app.libs.contact_storage import ContactStorage, ContactTransaction, contact_storage
+from app.libs.identity_events import EventBroker, event_broker, reconciliation_events
+from app.libs.identity_index import IDENTITY_INDEX_ENABLED, IdentityIndex, identity_index
+from app.libs.identity_locks import StripedLock, identity_locks
+from app.libs.identity_lookup import ClusterLookupCache
+from app.libs.identity_lookup import lookup_cache as identity_lookup_cache
+from app.libs.models import Contact, ContactIdentifyRequest, ContactIdentifyResponse
+
+
+class ContactReconciliationService:
+    """Service class for handling contact identity reconciliation logic."""
+    
+    def __init__(self, db: Optional[ContactStorage] = None, index: Optional[IdentityIndex] = None,
+                 locks: Optional[StripedLock] = None, lookup_cache: Optional[ClusterLookupCache] = None,
+                 events: Optional[EventBroker] = None):
+        self.db = db if db is not None else contact_storage
+        if index is None and IDENTITY_INDEX_ENABLED:
+            index = identity_index
+        self.index = index
+        self.locks = locks if locks is not None else identity_locks
+        self.lookup_cache = lookup_cache if lookup_cache is not None else identity_lookup_cache
+        self.events = events if events is not None else event_broker
+    
+    async def reconcile_contact_identity(self, request: ContactIdentifyRequest) -> ContactIdentifyResponse:
+        """
+        Core reconciliation logic for contact identity management.
+        
+        Process:
+        1. Load the whole connected cluster for the email/phone in one query
+        2. If no matches found, create new primary contact
+        3. If matches found, determine primary contact and link others as secondary
+        4. Build the response from the in-memory cluster without re-reading it
+        
+        All reads and writes share one connection and one transaction, so a
+        merge is never left half-applied. Requests sharing an email or phone
+        are serialized by striped key locks, so concurrent first sightings of
+        an identity cannot each create a primary. Once the cluster is read,
+        the stripes of all its keys must be held too, so requests reaching
+        one cluster through different keys are serialized as well; when the
+        cluster has keys on stripes not yet held, the transaction starts over
+        holding them. When the identity index is enabled,
+        requests for an already-known email/phone pair skip the database.
+        
+        Email and phone are normalized first, so formatting differences never
+        split an identity into separate clusters. Every change is written to the
+        event outbox in the same transaction.
+        """
+        request = normalize_request(request)
+        
+        if self.index:
+            cached = self.index.lookup(request.email, request.phone_number)
+            if cached:
+                return cached
+        
+        # Serialize requests sharing an email or phone, in this worker and across workers
+        stripes = self.locks.stripes_for([request.email], [request.phone_number])
+        
+        try:
+            while True:
+                async with self.locks.acquire(stripes):
+                    async with self.db.transaction() as tx:
+                        await tx.lock_keys(stripes)
+                        
+                        # Find every contact connected to either the email or the phone,
+                        # including primaries and all of their secondaries
+                        cluster = await tx.fetch_cluster([request.email], [request.phone_number])
+                        
+                        # Stripes are only ever taken in ascending order, so
+                        # missing ones mean releasing everything and retrying
+                        needed = self._cluster_stripes(stripes, cluster)
+                        if needed != stripes:
+                            stripes = needed
+                            continue
+                        
+                        primary, contacts, events = await self._reconcile_locked(tx, request, cluster)
+                    
+                    # Only committed state reaches the caches, still under the key locks
+                    self._record_committed(primary, contacts, events)
+                
+                return build_identify_response(primary, contacts)
+            
+        except Exception as e:
+            print(f"Error in contact reconciliation: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Internal server error during contact reconciliation"
+            ) from e
+    
+    async def _reconcile_locked(self, tx: ContactTransaction, request: ContactIdentifyRequest,
+                                cluster: List[Contact]) -> Tuple[Contact, List[Contact], List[dict]]:
+        """Write one request against its cluster, whose key stripes are all held."""
+        if not cluster:
+            # Case 1: No existing contacts - create new primary contact
+            primary, contacts = await self._create_new_primary_contact(tx, request)
+        else:
+            # Case 2: Existing contacts found - need to reconcile
+            primary, contacts = await self._reconcile_existing_contacts(tx, request, cluster)
+        
+        events = await tx.append_events(
+            reconciliation_events(primary, cluster, contacts[len(cluster):])
+        )
+        return primary, contacts, events
+    
+    def _cluster_stripes(self, stripes: List[int], contacts: List[Contact]) -> List[int]:
+        """``stripes`` plus the stripes of every email and phone in ``contacts``, sorted."""
+        keys = [contact_keys(c) for c in contacts]
+        cluster_stripes = self.locks.stripes_for([email for email, _ in keys], [phone for _, phone in keys])
+        return sorted(set(stripes).union(cluster_stripes))
+    
+    def _record_committed(self, primary: Contact, contacts: List[Contact],
+                          events: Optional[List[dict]] = None) -> None:
+        """Propagate a committed cluster to the in-process index, lookup cache and event consumers."""
+        if self.index:
+            self.index.apply_cluster(primary, contacts)
+        # Any cached cluster whose primary was touched is stale, including
+        # primaries that were just demoted by a merge
+        self.lookup_cache.invalidate(c.id for c in contacts)
+        if events:
+            self.events.publish(events)
+    
+    async def lookup_identity(self, email: Optional[str], phone_number: Optional[str]) -> Optional[ContactIdentifyResponse]:
+        """
+        Resolve the consolidated identity for an email/phone without writing.
+        
+        Served from the cluster cache when possible, otherwise from one cluster
+        read from storage (a replica when the backend has one). Returns None
+        when no contact matches.
+        """
+        email, phone_number = normalize_email(email), normalize_phone(phone_number)
+        cached = self.lookup_cache.get(email, phone_number)
+        if cached:
+            return cached
+        
+        cluster = await self.db.read_cluster([email], [phone_number])
+        
+        if not cluster:
+            return None
+        
+        # Report the cluster as /identify would leave it, without applying merges
+        response = build_identify_response(select_primary(cluster), cluster)
+        self.lookup_cache.put(response)
+        return response
+    
+    async def _create_new_primary_contact(self, tx: ContactTransaction,
+                                          request: ContactIdentifyRequest) -> Tuple[Contact, List[Contact]]:
+        """Create a new primary contact when no matches are found."""
+        [new_contact] = await tx.insert_contacts([(request.email, request.phone_number, None)])
+        return new_contact, [new_contact]
+    
+    async def _reconcile_existing_contacts(self, tx: ContactTransaction, request: ContactIdentifyRequest, 
+                                         cluster: List[Contact]) -> Tuple[Contact, List[Contact]]:
+        """Reconcile identity against an already-loaded contact cluster.
+        
+        Returns the primary and the full cluster after the writes.
+        """
+        # The oldest primary wins; any other primary in the cluster is merged into it
+        primary_contact = select_primary(cluster)
+        all_related_contacts = list(cluster)
+        
+        # Check if we need to create a new contact for the new information
+        needs_new_contact = not any(
+            contact_keys(contact) == (request.email, request.phone_number)
+            for contact in cluster
+        )
+        
+        if needs_new_contact:
+            # Create the new contact directly as a secondary of the primary
+            [new_contact] = await tx.insert_contacts(
+                [(request.email, request.phone_number, primary_contact.id)]
+            )
+            all_related_contacts.append(new_contact)
+        
+        # Point every other contact directly at the primary in one write. This
+        # demotes merged primaries and flattens secondaries left behind by older merges.
+        await tx.relink([
+            (c.id, primary_contact.id) for c in cluster if needs_relink(c, primary_contact.id)
+        ])
+        
+        return primary_contact, all_related_contacts
+    
+    async def reconcile_batch(self, requests: List[ContactIdentifyRequest]) -> List[ContactIdentifyResponse]:
+        """
+        Reconcile a batch of identify requests with a fixed number of queries per lock group.
+        
+        The batch is split into lock groups holding at most
+        IDENTITY_BATCH_MAX_STRIPES key stripes each; requests sharing an email
+        or phone always stay in one group. Groups run one after another, each
+        in its own transaction, so a large batch never holds most of the
+        stripe pool and single requests for unrelated identities keep running.
+        
+        Each response is the cluster as one-by-one calls would have reported
+        it for that request, not the cluster after the whole batch. Packing
+        can run groups out of input order; requests in different groups share
+        no email or phone, so that changes no response within a group. It
+        does mean new contacts in different groups may get ids (and creation
+        times) in a different order than one-by-one calls would give them,
+        and a request connected to another group only through existing
+        contacts sees that group's writes even when they come later in the
+        batch.
+        """
+        requests = [normalize_request(r) for r in requests]
+        responses: List[Optional[ContactIdentifyResponse]] = [None] * len(requests)
+        
+        try:
+            for indexes, stripes in self.locks.partition([(r.email, r.phone_number) for r in requests]):
+                group_responses = await self._reconcile_group([requests[i] for i in indexes], stripes)
+                for index, response in zip(indexes, group_responses):
+                    responses[index] = response
+            return responses
+            
+        except Exception as e:
+            print(f"Error in batch contact reconciliation: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Internal server error during batch contact reconciliation"
+            ) from e
+    
+    async def _reconcile_group(self, requests: List[ContactIdentifyRequest],
+                               stripes: List[int]) -> List[ContactIdentifyResponse]:
+        """
+        Reconcile one lock group of a batch in a single transaction.
+        
+        Process:
+        1. Load every cluster touched by any email/phone in the group in one query
+        2. Group requests and contacts into connected components in memory
+        3. Plan each component as if its requests had been sent one by one
+        4. Apply all inserts and relinks with bulk statements
+        5. Replay each component's requests to build their responses
+        
+        Responses come back in group order. Like single requests, the group
+        starts over holding more stripes when the clusters it read reach keys
+        outside ``stripes``; that can take it past IDENTITY_BATCH_MAX_STRIPES.
+        """
+        while True:
+            async with self.locks.acquire(stripes):
+                async with self.db.transaction() as tx:
+                    await tx.lock_keys(stripes)
+                    
+                    contacts = await tx.fetch_cluster(
+                        [r.email for r in requests],
+                        [r.phone_number for r in requests]
+                    )
+                    
+                    # As for single requests: hold every key of the clusters read, or retry
+                    needed = self._cluster_stripes(stripes, contacts)
+                    if needed != stripes:
+                        stripes = needed
+                        continue
+                    
+                    plans = [
+                        plan_component(requests, request_indexes, existing)
+                        for request_indexes, existing in group_components(requests, contacts)
+                    ]
+                    await apply_component_plans(tx, plans)
+                    
+                    events = await tx.append_events([
+                        event
+                        for plan in plans
+                        for event in reconciliation_events(
+                            plan.primary, plan.existing, plan.contacts[len(plan.existing):]
+                        )
+                    ])
+                
+                for plan in plans:
+                    self._record_committed(plan.primary, plan.contacts)
+                self.events.publish(events)
+            break
+        
+        responses: List[Optional[ContactIdentifyResponse]] = [None] * len(requests)
+        for plan in plans:
+            for index, response in zip(plan.request_indexes, replay_responses(requests, plan)):
+                responses[index] = response
+        return responses
+
+
+__all__ = [
+    "ContactReconciliationService",
+]
@@ -0,0 +1,203 @@
+"""Pluggable storage backends for contacts.
+
+Identify and health talk to a ``ContactStorage`` instead of a concrete
+database. Three backends implement it:
+
+- ``postgres`` (default): wraps ``db_manager`` and its asyncpg pool
+- ``sqlite``: a single-file database, handy for edge deployments
+- ``memory``: hash-indexed, process-local; for tests, benchmarks and load tests
+
+Pick one with CONTACT_STORAGE_BACKEND; SQLite uses CONTACT_STORAGE_SQLITE_PATH.
+
+Besides the classic single-row operations, each backend exposes a
+transaction object with set-based cluster reads and bulk writes, which is
+what reconciliation uses. The shared ``contact_storage`` is wrapped so every
+call is charged to the current request (see app.libs.db_metrics).
+
+Usage:
+
+    from app.libs.contact_storage import contact_storage
+
+    async with contact_storage.transaction() as tx:
+        await tx.lock_keys(stripes)
+        cluster = await tx.fetch_cluster([email], [phone_number])
+"""
+
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.libs.models import Contact, ContactCreate, ContactUpdate
+
+CONTACT_STORAGE_BACKEND = os.environ.get("CONTACT_STORAGE_BACKEND", "postgres")
+CONTACT_STORAGE_SQLITE_PATH = os.environ.get("CONTACT_STORAGE_SQLITE_PATH", "contacts.db")
+
+# (email, phone_number, linked_id); a contact without linked_id is a primary
+NewContact = Tuple[Optional[str], Optional[str], Optional[int]]
+
+# (id, email, phone_number, linked_id, link_precedence, created_at)
+ContactLink = Tuple[int, Optional[str], Optional[str], Optional[int], str, Any]
+
+# (event_type, payload) as produced by reconciliation, before it has an offset
+NewEvent = Tuple[str, Dict[str, Any]]
+
+
+class ContactTransaction(ABC):
+    """Reads and writes that commit or roll back together."""
+
+    @abstractmethod
+    async def lock_keys(self, stripes: List[int]) -> None:
+        """Serialize against other workers reconciling the same key stripes."""
+
+    @abstractmethod
+    async def fetch_cluster(self, emails: Iterable[Optional[str]],
+                            phone_numbers: Iterable[Optional[str]]) -> List[Contact]:
+        """Every contact connected to the given keys, oldest first."""
+
+    @abstractmethod
+    async def insert_contacts(self, rows: Sequence[NewContact]) -> List[Contact]:
+        """Insert contacts; rows with a linked_id become its secondaries.
+
+        The result is not guaranteed to follow the input order.
+        """
+
+    @abstractmethod
+    async def relink(self, links: Sequence[Tuple[int, int]]) -> int:
+        """Make each ``(contact_id, primary_id)`` contact a direct secondary of the primary."""
+
+    @abstractmethod
+    async def append_events(self, events: Sequence[NewEvent]) -> List[Dict[str, Any]]:
+        """Write events to the outbox; they become visible when the transaction commits.
+
+        Returns the stored events (see ``event_record``) in input order. A
+        backend may only number events once they are committed, in which case
+        the returned offsets are None. Either way ``read_events`` hands out
+        offsets in increasing commit order, so readers never skip one.
+        """
+
+
+class ContactStorage(ABC):
+    """Backend-independent contact storage."""
+
+    name: str = ""
+
+    # Single-row operations, matching the db_manager surface
+
+    @abstractmethod
+    async def find_contacts_by_email_or_phone(self, email: Optional[str],
+                                              phone_number: Optional[str]) -> List[Contact]:
+        ...
+
+    @abstractmethod
+    async def create_contact(self, contact: ContactCreate) -> Contact:
+        ...
+
+    @abstractmethod
+    async def update_contact(self, contact_id: int, update: ContactUpdate) -> Optional[Contact]:
+        ...
+
+    @abstractmethod
+    async def get_contact_by_id(self, contact_id: int) -> Optional[Contact]:
+        ...
+
+    @abstractmethod
+    async def get_contact_hierarchy(self, primary_id: int) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def get_connection(self):
+        """Async context manager yielding the backend's native connection."""
+
+    # Set-based operations used by reconciliation
+
+    @abstractmethod
+    def transaction(self):
+        """Async context manager yielding a ContactTransaction."""
+
+    @abstractmethod
+    async def read_cluster(self, emails: Iterable[Optional[str]],
+                           phone_numbers: Iterable[Optional[str]]) -> List[Contact]:
+        """Read-only cluster lookup, possibly served by a replica."""
+
+    @abstractmethod
+    def iter_contact_links(self) -> AsyncIterator[ContactLink]:
+        """Stream every live contact as a ContactLink tuple."""
+
+    # Event outbox
+
+    async def create_event_outbox(self) -> None:
+        """Create the outbox table if the backend needs one."""
+
+    @abstractmethod
+    async def read_events(self, after: int, limit: int) -> List[Dict[str, Any]]:
+        """Committed events with an offset greater than ``after``, oldest first."""
+
+    # Health
+
+    @abstractmethod
+    async def ping(self) -> None:
+        ...
+
+    @abstractmethod
+    async def count_contacts(self) -> Optional[int]:
+        """Number of contacts, or None when the contacts table is missing."""
+
+    def pool_size(self) -> Optional[int]:
+        return None
+
+
+def hierarchy_from_cluster(primary: Optional[Contact], contacts: List[Contact]) -> Dict[str, Any]:
+    """The get_contact_hierarchy result shape, built from an in-memory cluster."""
+    if primary is None:
+        return {}
+    secondaries = sorted((c for c in contacts if c.id != primary.id), key=lambda c: (c.created_at, c.id))
+    ordered = [primary, *secondaries]
+    return {
+        "primary_contact": primary,
+        "secondary_contacts": secondaries,
+        "secondary_contact_ids": [c.id for c in secondaries],
+        "all_emails": list(dict.fromkeys(c.email for c in ordered if c.email)),
+        "all_phone_numbers": list(dict.fromkeys(c.phone_number for c in ordered if c.phone_number))
+    }
+
+
+def event_record(offset: Optional[int], event_type: str, payload: Dict[str, Any], created_at: Any) -> Dict[str, Any]:
+    """The wire shape of an outbox event."""
+    if hasattr(created_at, "isoformat"):
+        created_at = created_at.isoformat()
+    return {"offset": offset, "type": event_type, "created_at": created_at, **payload}
+
+
+def create_contact_storage(backend: str = CONTACT_STORAGE_BACKEND) -> ContactStorage:
+    """Build the configured backend; imports are deferred so unused drivers stay optional."""
+    if backend == "postgres":
+        from app.libs.contact_storage.postgres import PostgresContactStorage
+        return PostgresContactStorage()
+    if backend == "sqlite":
+        from app.libs.contact_storage.sqlite import SQLiteContactStorage
+        return SQLiteContactStorage(CONTACT_STORAGE_SQLITE_PATH)
+    if backend == "memory":
+        from app.libs.contact_storage.memory import InMemoryContactStorage
+        return InMemoryContactStorage()
+    raise ValueError(f"Unknown CONTACT_STORAGE_BACKEND: {backend}")
+
+
+def _instrumented(storage: ContactStorage) -> ContactStorage:
+    from app.libs.contact_storage.instrumented import InstrumentedContactStorage
+    return InstrumentedContactStorage(storage)
+
+
+contact_storage = _instrumented(create_contact_storage())
+
+__all__ = [
+    "CONTACT_STORAGE_BACKEND",
+    "ContactLink",
+    "ContactStorage",
+    "ContactTransaction",
+    "NewContact",
+    "NewEvent",
+    "contact_storage",
+    "create_contact_storage",
+    "event_record",
+    "hierarchy_from_cluster",
+]
@@ -0,0 +1,98 @@
+"""ContactStorage wrapper that charges every call to the current request's RequestDbStats."""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.libs.contact_storage import ContactLink, ContactStorage, ContactTransaction, NewContact, NewEvent
+from app.libs.db_metrics import timed_db_call
+from app.libs.models import Contact, ContactCreate, ContactUpdate
+
+
+class InstrumentedContactTransaction(ContactTransaction):
+    def __init__(self, tx: ContactTransaction):
+        self.tx = tx
+
+    async def lock_keys(self, stripes: List[int]) -> None:
+        async with timed_db_call("lock_keys"):
+            await self.tx.lock_keys(stripes)
+
+    async def fetch_cluster(self, emails, phone_numbers) -> List[Contact]:
+        async with timed_db_call("fetch_cluster"):
+            return await self.tx.fetch_cluster(emails, phone_numbers)
+
+    async def insert_contacts(self, rows: Sequence[NewContact]) -> List[Contact]:
+        async with timed_db_call("insert_contacts"):
+            return await self.tx.insert_contacts(rows)
+
+    async def relink(self, links: Sequence[Tuple[int, int]]) -> int:
+        if not links:
+            return 0
+        async with timed_db_call("relink"):
+            return await self.tx.relink(links)
+
+    async def append_events(self, events: Sequence[NewEvent]) -> List[Dict[str, Any]]:
+        if not events:
+            return []
+        async with timed_db_call("append_events"):
+            return await self.tx.append_events(events)
+
+
+class InstrumentedContactStorage(ContactStorage):
+    """Delegates to ``inner``, timing each call as one round trip."""
+
+    def __init__(self, inner: ContactStorage):
+        self.inner = inner
+        self.name = inner.name
+
+    async def find_contacts_by_email_or_phone(self, email, phone_number) -> List[Contact]:
+        async with timed_db_call("find_contacts"):
+            return await self.inner.find_contacts_by_email_or_phone(email, phone_number)
+
+    async def create_contact(self, contact: ContactCreate) -> Contact:
+        async with timed_db_call("create_contact"):
+            return await self.inner.create_contact(contact)
+
+    async def update_contact(self, contact_id: int, update: ContactUpdate) -> Optional[Contact]:
+        async with timed_db_call("update_contact"):
+            return await self.inner.update_contact(contact_id, update)
+
+    async def get_contact_by_id(self, contact_id: int) -> Optional[Contact]:
+        async with timed_db_call("get_contact_by_id"):
+            return await self.inner.get_contact_by_id(contact_id)
+
+    async def get_contact_hierarchy(self, primary_id: int) -> Dict[str, Any]:
+        async with timed_db_call("get_contact_hierarchy"):
+            return await self.inner.get_contact_hierarchy(primary_id)
+
+    def get_connection(self):
+        return self.inner.get_connection()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[InstrumentedContactTransaction]:
+        async with self.inner.transaction() as tx:
+            yield InstrumentedContactTransaction(tx)
+
+    async def read_cluster(self, emails, phone_numbers) -> List[Contact]:
+        async with timed_db_call("read_cluster"):
+            return await self.inner.read_cluster(emails, phone_numbers)
+
+    def iter_contact_links(self) -> AsyncIterator[ContactLink]:
+        return self.inner.iter_contact_links()
+
+    async def create_event_outbox(self) -> None:
+        await self.inner.create_event_outbox()
+
+    async def read_events(self, after: int, limit: int) -> List[Dict[str, Any]]:
+        async with timed_db_call("read_events"):
+            return await self.inner.read_events(after, limit)
+
+    async def ping(self) -> None:
+        async with timed_db_call("ping"):
+            await self.inner.ping()
+
+    async def count_contacts(self) -> Optional[int]:
+        async with timed_db_call("count_contacts"):
+            return await self.inner.count_contacts()
+
+    def pool_size(self) -> Optional[int]:
+        return self.inner.pool_size()
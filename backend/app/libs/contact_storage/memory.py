@@ -0,0 +1,225 @@
+"""Process-local contact storage with hash indexes on normalized email and phone.
+
+Everything lives in dicts, so it needs no database and serves clusters at
+memory speed. Transactions keep an undo log and roll back on error. It is
+meant for tests, benchmarks, load tests and single-process edge deployments.
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.libs.contact_keys import contact_keys, normalize_email, normalize_phone
+from app.libs.contact_storage import (
+    ContactLink,
+    ContactStorage,
+    ContactTransaction,
+    NewContact,
+    NewEvent,
+    event_record,
+    hierarchy_from_cluster,
+)
+from app.libs.models import Contact, ContactCreate, ContactUpdate, LinkPrecedence
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class InMemoryContactTransaction(ContactTransaction):
+    def __init__(self, store: "InMemoryContactStorage"):
+        self.store = store
+        # Undo log: ("insert", id), ("replace", previous contact) or ("event", None)
+        self.undo: List[Tuple[str, Any]] = []
+
+    async def lock_keys(self, stripes: List[int]) -> None:
+        # Single process: the in-worker stripe locks already serialize these keys
+        return None
+
+    async def fetch_cluster(self, emails, phone_numbers) -> List[Contact]:
+        return self.store.cluster(emails, phone_numbers)
+
+    async def insert_contacts(self, rows: Sequence[NewContact]) -> List[Contact]:
+        inserted = []
+        for email, phone_number, linked_id in rows:
+            contact = self.store.insert(email, phone_number, linked_id)
+            self.undo.append(("insert", contact.id))
+            inserted.append(contact)
+        return inserted
+
+    async def relink(self, links: Sequence[Tuple[int, int]]) -> int:
+        changed = 0
+        for contact_id, primary_id in links:
+            current = self.store.contacts.get(contact_id)
+            if current is None or (current.linked_id == primary_id
+                                   and current.link_precedence == LinkPrecedence.SECONDARY):
+                continue
+            self.undo.append(("replace", current))
+            self.store.replace(current.model_copy(update={
+                "linked_id": primary_id,
+                "link_precedence": LinkPrecedence.SECONDARY,
+                "updated_at": _now()
+            }))
+            changed += 1
+        return changed
+
+    async def append_events(self, events: Sequence[NewEvent]) -> List[Dict[str, Any]]:
+        records = []
+        for event_type, payload in events:
+            records.append(event_record(len(self.store.events) + 1, event_type, payload, _now()))
+            self.store.events.append(records[-1])
+            self.undo.append(("event", None))
+        return records
+
+    def rollback(self) -> None:
+        for action, value in reversed(self.undo):
+            if action == "insert":
+                self.store.remove(value)
+            elif action == "event":
+                self.store.events.pop()
+            else:
+                self.store.replace(value)
+        self.undo.clear()
+
+
+class InMemoryContactStorage(ContactStorage):
+    """Dict-backed contacts with email, phone and child-link hash indexes."""
+
+    name = "memory"
+
+    def __init__(self):
+        self.contacts: Dict[int, Contact] = {}
+        self.by_email: Dict[str, Set[int]] = {}
+        self.by_phone: Dict[str, Set[int]] = {}
+        self.children: Dict[int, Set[int]] = {}
+        self.next_id = 1
+        # Outbox; the event at index i has offset i + 1
+        self.events: List[Dict[str, Any]] = []
+
+    # Index maintenance
+
+    def _index(self, contact: Contact) -> None:
+        email, phone_number = contact_keys(contact)
+        if email:
+            self.by_email.setdefault(email, set()).add(contact.id)
+        if phone_number:
+            self.by_phone.setdefault(phone_number, set()).add(contact.id)
+        if contact.linked_id:
+            self.children.setdefault(contact.linked_id, set()).add(contact.id)
+
+    def _unindex(self, contact: Contact) -> None:
+        email, phone_number = contact_keys(contact)
+        for index, key in ((self.by_email, email), (self.by_phone, phone_number), (self.children, contact.linked_id)):
+            ids = index.get(key) if key else None
+            if ids:
+                ids.discard(contact.id)
+                if not ids:
+                    del index[key]
+
+    def insert(self, email: Optional[str], phone_number: Optional[str],
+               linked_id: Optional[int] = None) -> Contact:
+        now = _now()
+        contact = Contact(
+            id=self.next_id,
+            email=email,
+            phone_number=phone_number,
+            linked_id=linked_id,
+            link_precedence=LinkPrecedence.SECONDARY if linked_id else LinkPrecedence.PRIMARY,
+            created_at=now,
+            updated_at=now
+        )
+        self.next_id += 1
+        self.contacts[contact.id] = contact
+        self._index(contact)
+        return contact
+
+    def replace(self, contact: Contact) -> None:
+        previous = self.contacts.get(contact.id)
+        if previous is not None:
+            self._unindex(previous)
+        self.contacts[contact.id] = contact
+        self._index(contact)
+
+    def remove(self, contact_id: int) -> None:
+        contact = self.contacts.pop(contact_id, None)
+        if contact is not None:
+            self._unindex(contact)
+
+    def cluster(self, emails: Iterable[Optional[str]], phone_numbers: Iterable[Optional[str]]) -> List[Contact]:
+        """Breadth-first walk from the key matches over links in both directions."""
+        seen: Set[int] = set()
+        for email in {normalize_email(e) for e in emails} - {None}:
+            seen.update(self.by_email.get(email, ()))
+        for phone_number in {normalize_phone(p) for p in phone_numbers} - {None}:
+            seen.update(self.by_phone.get(phone_number, ()))
+
+        queue = deque(seen)
+        while queue:
+            contact = self.contacts[queue.popleft()]
+            neighbours = set(self.children.get(contact.id, ()))
+            if contact.linked_id in self.contacts:
+                neighbours.add(contact.linked_id)
+            for neighbour in neighbours - seen:
+                seen.add(neighbour)
+                queue.append(neighbour)
+
+        return sorted((self.contacts[i] for i in seen), key=lambda c: (c.created_at, c.id))
+
+    # ContactStorage
+
+    async def find_contacts_by_email_or_phone(self, email, phone_number) -> List[Contact]:
+        ids = set(self.by_email.get(normalize_email(email), ())) | set(self.by_phone.get(normalize_phone(phone_number), ()))
+        return sorted((self.contacts[i] for i in ids), key=lambda c: (c.created_at, c.id))
+
+    async def create_contact(self, contact: ContactCreate) -> Contact:
+        return self.insert(contact.email, contact.phone_number, getattr(contact, "linked_id", None))
+
+    async def update_contact(self, contact_id: int, update: ContactUpdate) -> Optional[Contact]:
+        current = self.contacts.get(contact_id)
+        if current is None:
+            return None
+        changes = update.model_dump(exclude_unset=True)
+        changes["updated_at"] = _now()
+        updated = current.model_copy(update=changes)
+        self.replace(updated)
+        return updated
+
+    async def get_contact_by_id(self, contact_id: int) -> Optional[Contact]:
+        return self.contacts.get(contact_id)
+
+    async def get_contact_hierarchy(self, primary_id: int) -> Dict[str, Any]:
+        primary = self.contacts.get(primary_id)
+        secondaries = [self.contacts[i] for i in self.children.get(primary_id, ())]
+        return hierarchy_from_cluster(primary, [primary, *secondaries] if primary else [])
+
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncIterator["InMemoryContactStorage"]:
+        yield self
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[InMemoryContactTransaction]:
+        tx = InMemoryContactTransaction(self)
+        try:
+            yield tx
+        except BaseException:
+            tx.rollback()
+            raise
+
+    async def read_cluster(self, emails, phone_numbers) -> List[Contact]:
+        return self.cluster(emails, phone_numbers)
+
+    async def iter_contact_links(self) -> AsyncIterator[ContactLink]:
+        for contact_id in sorted(self.contacts):
+            c = self.contacts[contact_id]
+            yield (c.id, c.email, c.phone_number, c.linked_id, c.link_precedence, c.created_at)
+
+    async def read_events(self, after: int, limit: int) -> List[Dict[str, Any]]:
+        start = max(after, 0)
+        return self.events[start:start + limit]
+
+    async def ping(self) -> None:
+        return None
+
+    async def count_contacts(self) -> Optional[int]:
+        return len(self.contacts)
@@ -0,0 +1,309 @@
+"""Postgres contact storage on top of ``db_manager`` and its asyncpg pool."""
+
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.libs.contact_keys import normalize_email, normalize_phone
+from app.libs.contact_storage import (
+    ContactLink,
+    ContactStorage,
+    ContactTransaction,
+    NewContact,
+    NewEvent,
+    event_record,
+)
+from app.libs.database import db_manager
+from app.libs.db_metrics import record_pool_wait
+from app.libs.identity_locks import ADVISORY_LOCK_NAMESPACE, acquire_advisory_locks
+from app.libs.models import Contact, ContactCreate, ContactUpdate
+from app.libs.read_replica import read_pool
+
+CONTACT_COLUMNS = "id, email, phone_number, linked_id, link_precedence, created_at, updated_at"
+
+# Seed with every contact matching one of the normalized keys, then walk
+# linked_id both up (to primaries) and down (to their secondaries) until
+# nothing new shows up. UNION deduplicates, which also terminates on
+# accidental cycles.
+CLUSTER_QUERY = f"""
+WITH RECURSIVE cluster(id, linked_id) AS (
+    SELECT id, linked_id
+    FROM contacts
+    WHERE deleted_at IS NULL
+      AND (email_normalized = ANY($1::text[]) OR phone_normalized = ANY($2::text[]))
+    UNION
+    SELECT c.id, c.linked_id
+    FROM contacts c
+    JOIN cluster cl ON c.id = cl.linked_id OR c.linked_id = cl.id
+    WHERE c.deleted_at IS NULL
+)
+SELECT {CONTACT_COLUMNS}
+FROM contacts
+WHERE id IN (SELECT id FROM cluster)
+ORDER BY created_at, id
+"""
+
+INSERT_CONTACT_QUERY = f"""
+INSERT INTO contacts (email, phone_number, email_normalized, phone_normalized,
+                      linked_id, link_precedence, created_at, updated_at)
+VALUES ($1, $2, $3, $4, $5, $6, NOW(), NOW())
+RETURNING {CONTACT_COLUMNS}
+"""
+
+# Bulk inserts keep the precedence as a literal so it is coerced to the
+# column type like the single-row insert.
+BULK_INSERT_PRIMARY_QUERY = f"""
+INSERT INTO contacts (email, phone_number, email_normalized, phone_normalized,
+                      linked_id, link_precedence, created_at, updated_at)
+SELECT v.email, v.phone_number, v.email_normalized, v.phone_normalized, NULL, 'primary', NOW(), NOW()
+FROM unnest($1::text[], $2::text[], $3::text[], $4::text[]) WITH ORDINALITY
+     AS v(email, phone_number, email_normalized, phone_normalized, ord)
+ORDER BY v.ord
+RETURNING {CONTACT_COLUMNS}
+"""
+
+BULK_INSERT_SECONDARY_QUERY = f"""
+INSERT INTO contacts (email, phone_number, email_normalized, phone_normalized,
+                      linked_id, link_precedence, created_at, updated_at)
+SELECT v.email, v.phone_number, v.email_normalized, v.phone_normalized, v.linked_id, 'secondary', NOW(), NOW()
+FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::bigint[]) WITH ORDINALITY
+     AS v(email, phone_number, email_normalized, phone_normalized, linked_id, ord)
+ORDER BY v.ord
+RETURNING {CONTACT_COLUMNS}
+"""
+
+# Moves any number of contacts under their primaries in one statement, so a
+# merge either lands completely or not at all. Rows already in place are skipped.
+RELINK_QUERY = """
+UPDATE contacts AS c
+SET linked_id = v.primary_id, link_precedence = 'secondary', updated_at = NOW()
+FROM unnest($1::bigint[], $2::bigint[]) AS v(id, primary_id)
+WHERE c.id = v.id
+  AND (c.linked_id IS DISTINCT FROM v.primary_id OR c.link_precedence <> 'secondary')
+"""
+
+LINKS_QUERY = """
+SELECT id, email, phone_number, linked_id, link_precedence::text AS link_precedence, created_at
+FROM contacts
+WHERE deleted_at IS NULL
+ORDER BY id
+"""
+
+# Event offsets are positions assigned in commit order, not the insert ids:
+# writers insert concurrently without any shared lock, stamping each row
+# with their transaction id. A reader first numbers every event whose
+# transaction is older than the oldest one still running (so it has
+# committed or rolled back, and nothing can commit before it any more), in
+# (txid, id) order, then reads by position. Positions therefore only become
+# visible in increasing order with no gaps. A long-running transaction
+# anywhere in the database holds events back until it ends.
+CREATE_EVENTS_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS identity_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    txid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    position BIGINT UNIQUE
+);
+ALTER TABLE identity_events ADD COLUMN IF NOT EXISTS txid xid8 NOT NULL DEFAULT pg_current_xact_id();
+ALTER TABLE identity_events ADD COLUMN IF NOT EXISTS position BIGINT UNIQUE;
+CREATE INDEX IF NOT EXISTS identity_events_unsequenced ON identity_events (txid, id) WHERE position IS NULL
+"""
+
+# Only one reader numbers events at a time; the others skip the step and
+# read what is already numbered
+EVENT_SEQUENCER_LOCK_QUERY = "SELECT pg_try_advisory_xact_lock($1, 0)"
+EVENT_SEQUENCER_LOCK_NAMESPACE = ADVISORY_LOCK_NAMESPACE + 1
+
+SEQUENCE_EVENTS_QUERY = """
+WITH ready AS (
+    SELECT id, row_number() OVER (ORDER BY txid, id) AS n
+    FROM identity_events
+    WHERE position IS NULL
+      AND txid < pg_snapshot_xmin(pg_current_snapshot())
+)
+UPDATE identity_events e
+SET position = (SELECT COALESCE(max(position), 0) FROM identity_events) + ready.n
+FROM ready
+WHERE e.id = ready.id
+"""
+
+INSERT_EVENTS_QUERY = """
+INSERT INTO identity_events (event_type, payload)
+SELECT v.event_type, v.payload::jsonb
+FROM unnest($1::text[], $2::text[]) WITH ORDINALITY AS v(event_type, payload, ord)
+ORDER BY v.ord
+RETURNING id, created_at
+"""
+
+READ_EVENTS_QUERY = """
+SELECT position, event_type, payload::text AS payload, created_at
+FROM identity_events
+WHERE position > $1
+ORDER BY position
+LIMIT $2
+"""
+
+TABLE_EXISTS_QUERY = "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'contacts'"
+
+
+def _present(values: Iterable[Optional[str]]) -> List[str]:
+    return sorted({v for v in values if v})
+
+
+async def fetch_contact_cluster(conn, emails: Iterable[Optional[str]],
+                                phone_numbers: Iterable[Optional[str]]) -> List[Contact]:
+    """Return every contact connected to the given keys, oldest first, in one round trip."""
+    emails = _present(normalize_email(e) for e in emails)
+    phone_numbers = _present(normalize_phone(p) for p in phone_numbers)
+    if not emails and not phone_numbers:
+        return []
+
+    rows = await conn.fetch(CLUSTER_QUERY, emails, phone_numbers)
+    return [Contact(**dict(row)) for row in rows]
+
+
+@asynccontextmanager
+async def _acquire(source) -> AsyncIterator[Any]:
+    """Check out a pooled connection, charging the wait to the current request."""
+    started = time.perf_counter()
+    async with source.get_connection() as conn:
+        record_pool_wait(time.perf_counter() - started)
+        yield conn
+
+
+class PostgresContactTransaction(ContactTransaction):
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def lock_keys(self, stripes: List[int]) -> None:
+        await acquire_advisory_locks(self.conn, stripes)
+
+    async def fetch_cluster(self, emails, phone_numbers) -> List[Contact]:
+        return await fetch_contact_cluster(self.conn, emails, phone_numbers)
+
+    async def insert_contacts(self, rows: Sequence[NewContact]) -> List[Contact]:
+        if len(rows) == 1:
+            email, phone_number, linked_id = rows[0]
+            row = await self.conn.fetchrow(
+                INSERT_CONTACT_QUERY, email, phone_number, normalize_email(email),
+                normalize_phone(phone_number), linked_id, "secondary" if linked_id else "primary"
+            )
+            return [Contact(**dict(row))]
+
+        inserted: List[Contact] = []
+        primaries = [r for r in rows if not r[2]]
+        secondaries = [r for r in rows if r[2]]
+        for query, batch in ((BULK_INSERT_PRIMARY_QUERY, primaries), (BULK_INSERT_SECONDARY_QUERY, secondaries)):
+            if not batch:
+                continue
+            args = [
+                [email for email, _, _ in batch],
+                [phone for _, phone, _ in batch],
+                [normalize_email(email) for email, _, _ in batch],
+                [normalize_phone(phone) for _, phone, _ in batch],
+            ]
+            if query is BULK_INSERT_SECONDARY_QUERY:
+                args.append([linked_id for _, _, linked_id in batch])
+            inserted.extend(Contact(**dict(row)) for row in await self.conn.fetch(query, *args))
+        return inserted
+
+    async def relink(self, links: Sequence[Tuple[int, int]]) -> int:
+        if not links:
+            return 0
+        result = await self.conn.execute(
+            RELINK_QUERY, [contact_id for contact_id, _ in links], [primary_id for _, primary_id in links]
+        )
+        return int(result.split()[-1])
+
+    async def append_events(self, events: Sequence[NewEvent]) -> List[Dict[str, Any]]:
+        if not events:
+            return []
+        rows = await self.conn.fetch(
+            INSERT_EVENTS_QUERY,
+            [event_type for event_type, _ in events],
+            [json.dumps(payload) for _, payload in events]
+        )
+        # Ids follow insertion order, which follows the input order. Offsets
+        # are assigned by the first read after commit.
+        rows = sorted(rows, key=lambda row: row["id"])
+        return [
+            event_record(None, event_type, payload, row["created_at"])
+            for row, (event_type, payload) in zip(rows, events)
+        ]
+
+
+class PostgresContactStorage(ContactStorage):
+    """Delegates single-row calls to ``db_manager`` and runs set-based SQL on its connections."""
+
+    name = "postgres"
+
+    def __init__(self, db=db_manager, reader=read_pool):
+        self.db = db
+        self.reader = reader
+
+    async def find_contacts_by_email_or_phone(self, email, phone_number) -> List[Contact]:
+        return await self.db.find_contacts_by_email_or_phone(email, phone_number)
+
+    async def create_contact(self, contact: ContactCreate) -> Contact:
+        return await self.db.create_contact(contact)
+
+    async def update_contact(self, contact_id: int, update: ContactUpdate) -> Optional[Contact]:
+        return await self.db.update_contact(contact_id, update)
+
+    async def get_contact_by_id(self, contact_id: int) -> Optional[Contact]:
+        return await self.db.get_contact_by_id(contact_id)
+
+    async def get_contact_hierarchy(self, primary_id: int) -> Dict[str, Any]:
+        return await self.db.get_contact_hierarchy(primary_id)
+
+    def get_connection(self):
+        return self.db.get_connection()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[PostgresContactTransaction]:
+        async with _acquire(self.db) as conn:
+            async with conn.transaction():
+                yield PostgresContactTransaction(conn)
+
+    async def read_cluster(self, emails, phone_numbers) -> List[Contact]:
+        async with _acquire(self.reader) as conn:
+            return await fetch_contact_cluster(conn, emails, phone_numbers)
+
+    async def iter_contact_links(self, prefetch: int = 10000) -> AsyncIterator[ContactLink]:
+        async with self.db.get_connection() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(LINKS_QUERY, prefetch=prefetch):
+                    yield (row["id"], row["email"], row["phone_number"], row["linked_id"],
+                           row["link_precedence"], row["created_at"])
+
+    async def create_event_outbox(self) -> None:
+        async with self.db.get_connection() as conn:
+            await conn.execute(CREATE_EVENTS_TABLE_QUERY)
+
+    async def read_events(self, after: int, limit: int) -> List[Dict[str, Any]]:
+        async with _acquire(self.db) as conn:
+            async with conn.transaction():
+                if await conn.fetchval(EVENT_SEQUENCER_LOCK_QUERY, EVENT_SEQUENCER_LOCK_NAMESPACE):
+                    await conn.execute(SEQUENCE_EVENTS_QUERY)
+            rows = await conn.fetch(READ_EVENTS_QUERY, after, limit)
+        return [
+            event_record(row["position"], row["event_type"], json.loads(row["payload"]), row["created_at"])
+            for row in rows
+        ]
+
+    async def ping(self) -> None:
+        async with _acquire(self.db) as conn:
+            await conn.fetchval("SELECT 1")
+
+    async def count_contacts(self) -> Optional[int]:
+        async with _acquire(self.db) as conn:
+            if not await conn.fetchval(TABLE_EXISTS_QUERY):
+                return None
+            return await conn.fetchval("SELECT COUNT(*) FROM contacts")
+
+    def pool_size(self) -> Optional[int]:
+        pool = getattr(self.db, "pool", None)
+        return pool.get_size() if pool else None
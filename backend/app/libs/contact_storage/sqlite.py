@@ -0,0 +1,272 @@
+"""SQLite contact storage for single-node and edge deployments.
+
+Uses the stdlib ``sqlite3`` driver on a worker thread. One connection is
+shared behind an asyncio lock, so statements never interleave, and writers
+open ``BEGIN IMMEDIATE`` transactions to take SQLite's write lock up front.
+"""
+
+import asyncio
+import json
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.libs.contact_keys import normalize_email, normalize_phone
+from app.libs.contact_storage import (
+    ContactLink,
+    ContactStorage,
+    ContactTransaction,
+    NewContact,
+    NewEvent,
+    event_record,
+    hierarchy_from_cluster,
+)
+from app.libs.models import Contact, ContactCreate, ContactUpdate
+
+CONTACT_COLUMNS = "id, email, phone_number, linked_id, link_precedence, created_at, updated_at"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT,
+    phone_number TEXT,
+    email_normalized TEXT,
+    phone_normalized TEXT,
+    linked_id INTEGER REFERENCES contacts(id),
+    link_precedence TEXT NOT NULL CHECK (link_precedence IN ('primary', 'secondary')),
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    deleted_at TEXT
+);
+CREATE INDEX IF NOT EXISTS contacts_email_normalized_idx ON contacts (email_normalized) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS contacts_phone_normalized_idx ON contacts (phone_normalized) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS contacts_linked_id_idx ON contacts (linked_id) WHERE deleted_at IS NULL;
+CREATE TABLE IF NOT EXISTS identity_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+# Same walk as the Postgres cluster query; key lists arrive as JSON arrays
+CLUSTER_QUERY = f"""
+WITH RECURSIVE cluster(id, linked_id) AS (
+    SELECT id, linked_id
+    FROM contacts
+    WHERE deleted_at IS NULL
+      AND (email_normalized IN (SELECT value FROM json_each(?))
+           OR phone_normalized IN (SELECT value FROM json_each(?)))
+    UNION
+    SELECT c.id, c.linked_id
+    FROM contacts c
+    JOIN cluster cl ON c.id = cl.linked_id OR c.linked_id = cl.id
+    WHERE c.deleted_at IS NULL
+)
+SELECT {CONTACT_COLUMNS}
+FROM contacts
+WHERE id IN (SELECT id FROM cluster)
+ORDER BY created_at, id
+"""
+
+INSERT_CONTACT_QUERY = """
+INSERT INTO contacts (email, phone_number, email_normalized, phone_normalized,
+                      linked_id, link_precedence, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+RELINK_QUERY = """
+UPDATE contacts
+SET linked_id = ?, link_precedence = 'secondary', updated_at = ?
+WHERE id = ? AND (linked_id IS NOT ? OR link_precedence <> 'secondary')
+"""
+
+FIND_QUERY = f"""
+SELECT {CONTACT_COLUMNS}
+FROM contacts
+WHERE deleted_at IS NULL AND (email_normalized = ? OR phone_normalized = ?)
+ORDER BY created_at, id
+"""
+
+INSERT_EVENT_QUERY = "INSERT INTO identity_events (event_type, payload, created_at) VALUES (?, ?, ?)"
+
+READ_EVENTS_QUERY = """
+SELECT id, event_type, payload, created_at
+FROM identity_events
+WHERE id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+LINKS_QUERY = """
+SELECT id, email, phone_number, linked_id, link_precedence, created_at
+FROM contacts
+WHERE deleted_at IS NULL
+ORDER BY id
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _present(values: Iterable[Optional[str]]) -> str:
+    return json.dumps(sorted({v for v in values if v}))
+
+
+def _contact(row: sqlite3.Row) -> Contact:
+    return Contact(**dict(row))
+
+
+class SQLiteContactTransaction(ContactTransaction):
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    async def lock_keys(self, stripes: List[int]) -> None:
+        # BEGIN IMMEDIATE already holds the database-wide write lock
+        return None
+
+    async def fetch_cluster(self, emails, phone_numbers) -> List[Contact]:
+        return _fetch_cluster(self.conn, emails, phone_numbers)
+
+    async def insert_contacts(self, rows: Sequence[NewContact]) -> List[Contact]:
+        now = _now()
+        ids = []
+        for email, phone_number, linked_id in rows:
+            cursor = self.conn.execute(INSERT_CONTACT_QUERY, (
+                email, phone_number, normalize_email(email), normalize_phone(phone_number),
+                linked_id, "secondary" if linked_id else "primary", now, now
+            ))
+            ids.append(cursor.lastrowid)
+        if not ids:
+            return []
+        placeholders = ", ".join("?" * len(ids))
+        rows = self.conn.execute(f"SELECT {CONTACT_COLUMNS} FROM contacts WHERE id IN ({placeholders})", ids)
+        return [_contact(row) for row in rows]
+
+    async def relink(self, links: Sequence[Tuple[int, int]]) -> int:
+        now = _now()
+        changed = 0
+        for contact_id, primary_id in links:
+            changed += self.conn.execute(RELINK_QUERY, (primary_id, now, contact_id, primary_id)).rowcount
+        return changed
+
+    async def append_events(self, events: Sequence[NewEvent]) -> List[Dict[str, Any]]:
+        # SQLite has one writer at a time, so offsets always commit in order
+        now = _now()
+        records = []
+        for event_type, payload in events:
+            cursor = self.conn.execute(INSERT_EVENT_QUERY, (event_type, json.dumps(payload), now))
+            records.append(event_record(cursor.lastrowid, event_type, payload, now))
+        return records
+
+
+def _fetch_cluster(conn: sqlite3.Connection, emails, phone_numbers) -> List[Contact]:
+    emails = _present(normalize_email(e) for e in emails)
+    phone_numbers = _present(normalize_phone(p) for p in phone_numbers)
+    return [_contact(row) for row in conn.execute(CLUSTER_QUERY, (emails, phone_numbers))]
+
+
+class SQLiteContactStorage(ContactStorage):
+    """Contacts in a single SQLite file, created on first use."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        async with self.lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def find_contacts_by_email_or_phone(self, email, phone_number) -> List[Contact]:
+        rows = await self._run(lambda: self.conn.execute(
+            FIND_QUERY, (normalize_email(email), normalize_phone(phone_number))
+        ).fetchall())
+        return [_contact(row) for row in rows]
+
+    async def create_contact(self, contact: ContactCreate) -> Contact:
+        async with self.transaction() as tx:
+            [created] = await tx.insert_contacts([
+                (contact.email, contact.phone_number, getattr(contact, "linked_id", None))
+            ])
+        return created
+
+    async def update_contact(self, contact_id: int, update: ContactUpdate) -> Optional[Contact]:
+        changes = update.model_dump(exclude_unset=True)
+        if "email" in changes:
+            changes["email_normalized"] = normalize_email(changes["email"])
+        if "phone_number" in changes:
+            changes["phone_normalized"] = normalize_phone(changes["phone_number"])
+        changes = {k: getattr(v, "value", v) for k, v in changes.items()}
+        changes["updated_at"] = _now()
+        assignments = ", ".join(f"{column} = ?" for column in changes)
+
+        def update_row():
+            self.conn.execute(f"UPDATE contacts SET {assignments} WHERE id = ?", (*changes.values(), contact_id))
+            return self.conn.execute(f"SELECT {CONTACT_COLUMNS} FROM contacts WHERE id = ?", (contact_id,)).fetchone()
+
+        row = await self._run(update_row)
+        return _contact(row) if row else None
+
+    async def get_contact_by_id(self, contact_id: int) -> Optional[Contact]:
+        row = await self._run(lambda: self.conn.execute(
+            f"SELECT {CONTACT_COLUMNS} FROM contacts WHERE id = ? AND deleted_at IS NULL", (contact_id,)
+        ).fetchone())
+        return _contact(row) if row else None
+
+    async def get_contact_hierarchy(self, primary_id: int) -> Dict[str, Any]:
+        rows = await self._run(lambda: self.conn.execute(
+            f"SELECT {CONTACT_COLUMNS} FROM contacts WHERE deleted_at IS NULL AND (id = ? OR linked_id = ?)",
+            (primary_id, primary_id)
+        ).fetchall())
+        contacts = [_contact(row) for row in rows]
+        primary = next((c for c in contacts if c.id == primary_id), None)
+        return hierarchy_from_cluster(primary, contacts)
+
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncIterator[sqlite3.Connection]:
+        async with self.lock:
+            yield self.conn
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[SQLiteContactTransaction]:
+        # Statements run inline while the lock is held; SQLite calls on an
+        # indexed file are short enough that a thread hop costs more.
+        async with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield SQLiteContactTransaction(self.conn)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+
+    async def read_cluster(self, emails, phone_numbers) -> List[Contact]:
+        return await self._run(_fetch_cluster, self.conn, list(emails), list(phone_numbers))
+
+    async def iter_contact_links(self) -> AsyncIterator[ContactLink]:
+        rows = await self._run(lambda: self.conn.execute(LINKS_QUERY).fetchall())
+        for row in rows:
+            yield tuple(row)
+
+    async def read_events(self, after: int, limit: int) -> List[Dict[str, Any]]:
+        rows = await self._run(lambda: self.conn.execute(READ_EVENTS_QUERY, (after, limit)).fetchall())
+        return [
+            event_record(row["id"], row["event_type"], json.loads(row["payload"]), row["created_at"])
+            for row in rows
+        ]
+
+    async def ping(self) -> None:
+        await self._run(lambda: self.conn.execute("SELECT 1").fetchone())
+
+    async def count_contacts(self) -> Optional[int]:
+        row = await self._run(lambda: self.conn.execute("SELECT COUNT(*) FROM contacts").fetchone())
+        return row[0]
@@ -0,0 +1,256 @@
+"""Per-request database instrumentation: query counts, time per call and pool waits.
+
+Storage calls record into a ``RequestDbStats`` held in a context variable,
+so concurrent requests never mix their numbers. Routers opt in with
+``InstrumentedRoute``, which opens one stats object per request, returns it
+to the client as a ``Server-Timing`` header and feeds per-route histograms.
+
+Usage:
+
+    from app.libs.db_metrics import InstrumentedRoute, route_metrics
+
+    router = APIRouter(prefix="/api/v1", route_class=InstrumentedRoute)
+
+    # Inside a storage backend
+    async with timed_db_call("fetch_cluster"):
+        rows = await conn.fetch(CLUSTER_QUERY, emails, phone_numbers)
+
+    route_metrics.snapshot()  # {"POST /routes/api/v1/identify": {...}}
+"""
+
+import os
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+
+DB_METRICS_ENABLED = os.environ.get("DB_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+DURATION_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class RequestDbStats:
+    """Database work done on behalf of one request."""
+
+    __slots__ = ("queries", "db_seconds", "pool_wait_seconds", "calls")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        # operation -> [count, seconds]
+        self.calls: Dict[str, List[float]] = {}
+
+    def record(self, operation: str, seconds: float) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = self.calls.setdefault(operation, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def server_timing(self, total_seconds: Optional[float] = None) -> str:
+        """Render as a Server-Timing header value, one metric per operation."""
+        metrics = [
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"',
+            f"pool;dur={self.pool_wait_seconds * 1000:.2f}"
+        ]
+        for operation, (count, seconds) in self.calls.items():
+            metrics.append(f'db-{operation.replace("_", "-")};dur={seconds * 1000:.2f};desc="{count}x"')
+        if total_seconds is not None:
+            metrics.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "queries": self.queries,
+            "db_ms": round(self.db_seconds * 1000, 3),
+            "pool_wait_ms": round(self.pool_wait_seconds * 1000, 3),
+            "calls": {op: {"count": int(count), "ms": round(seconds * 1000, 3)}
+                      for op, (count, seconds) in self.calls.items()}
+        }
+
+
+_current_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def current_db_stats() -> Optional[RequestDbStats]:
+    return _current_stats.get()
+
+
+@contextmanager
+def track_db_calls() -> Iterator[RequestDbStats]:
+    """Collect every storage call made in this context into a fresh RequestDbStats."""
+    stats = RequestDbStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@asynccontextmanager
+async def timed_db_call(operation: str):
+    """Time one storage round trip and charge it to the current request, if any."""
+    stats = _current_stats.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.record(operation, time.perf_counter() - started)
+
+
+def record_pool_wait(seconds: float) -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+class Histogram:
+    """Fixed-bucket histogram; cheap enough to update on every request."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None past the last bound)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {f"le_{bound:g}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": buckets
+        }
+
+
+class RouteMetrics:
+    """Per-route histograms of total time, database time, pool waits and query counts."""
+
+    def __init__(self):
+        self.routes: Dict[str, Dict[str, Histogram]] = {}
+
+    def observe(self, route: str, stats: RequestDbStats, total_seconds: float) -> None:
+        histograms = self.routes.get(route)
+        if histograms is None:
+            histograms = self.routes[route] = {
+                "total_ms": Histogram(DURATION_BUCKETS_MS),
+                "db_ms": Histogram(DURATION_BUCKETS_MS),
+                "pool_wait_ms": Histogram(DURATION_BUCKETS_MS),
+                "queries": Histogram(QUERY_COUNT_BUCKETS)
+            }
+        histograms["total_ms"].observe(total_seconds * 1000)
+        histograms["db_ms"].observe(stats.db_seconds * 1000)
+        histograms["pool_wait_ms"].observe(stats.pool_wait_seconds * 1000)
+        histograms["queries"].observe(stats.queries)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            route: {name: histogram.snapshot() for name, histogram in histograms.items()}
+            for route, histograms in sorted(self.routes.items())
+        }
+
+
+route_metrics = RouteMetrics()
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that tracks storage calls per request.
+
+    Adds a Server-Timing header to successful responses and records every
+    request, including failed ones, in ``route_metrics``.
+
+    A StreamingResponse keeps charging calls made while its body is produced
+    (event streams, bulk imports) to the same request, and is recorded in
+    ``route_metrics`` once the body is finished. Its Server-Timing header
+    necessarily goes out before the body, so it only covers the handler.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if not DB_METRICS_ENABLED:
+            return handler
+
+        route = f"{','.join(sorted(self.methods))} {self.path}"
+
+        async def instrumented_handler(request: Request) -> Response:
+            started = time.perf_counter()
+            with track_db_calls() as stats:
+                try:
+                    response = await handler(request)
+                except BaseException:
+                    route_metrics.observe(route, stats, time.perf_counter() - started)
+                    raise
+            total_seconds = time.perf_counter() - started
+            response.headers["Server-Timing"] = stats.server_timing(total_seconds)
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = _tracked_body(response.body_iterator, stats, route, started)
+            else:
+                route_metrics.observe(route, stats, total_seconds)
+            return response
+
+        return instrumented_handler
+
+
+async def _tracked_body(body: AsyncIterable[Any], stats: RequestDbStats, route: str,
+                        started: float) -> AsyncIterator[Any]:
+    """Re-enter the request's stats around every step of a streamed body."""
+    iterator = body.__aiter__()
+    try:
+        while True:
+            token = _current_stats.set(stats)
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_stats.reset(token)
+            yield chunk
+    finally:
+        route_metrics.observe(route, stats, time.perf_counter() - started)
+
+
+__all__ = [
+    "DB_METRICS_ENABLED",
+    "Histogram",
+    "InstrumentedRoute",
+    "RequestDbStats",
+    "RouteMetrics",
+    "current_db_stats",
+    "record_pool_wait",
+    "route_metrics",
+    "timed_db_call",
+    "track_db_calls",
+]
@@ -0,0 +1,60 @@
+"""Union-find over arbitrary hashable items.
+
+Usage:
+
+    from app.libs.disjoint_set import DisjointSet
+
+    ds = DisjointSet()
+    ds.union("a", "b")
+    ds.find("a") == ds.find("b")  # True
+"""
+
+from typing import Dict, Hashable, Iterable, List
+
+
+class DisjointSet:
+    """Union-find with path halving and union by size."""
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.size: Dict[Hashable, int] = {}
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self.parent
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def add(self, item: Hashable) -> Hashable:
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+        return item
+
+    def find(self, item: Hashable) -> Hashable:
+        """Return the root of ``item``'s set, adding it as a singleton if unseen."""
+        parent = self.parent
+        if item not in parent:
+            return self.add(item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: Hashable, b: Hashable) -> Hashable:
+        """Merge the sets holding ``a`` and ``b`` and return the new root."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        return root_a
+
+    def groups(self, items: Iterable[Hashable]) -> List[List[Hashable]]:
+        """Partition ``items`` by set, preserving first-seen order."""
+        grouped: Dict[Hashable, List[Hashable]] = {}
+        for item in items:
+            grouped.setdefault(self.find(item), []).append(item)
+        return list(grouped.values())
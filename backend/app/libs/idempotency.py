@@ -0,0 +1,268 @@
+"""Idempotency-key response cache for retried write requests.
+
+Results are kept in a bounded, TTL-evicting in-process cache. A request that
+arrives while the same key is still being processed waits for that result
+instead of running a second time; if that first request is cancelled, the
+waiters compute the result themselves. Optionally results are also written to
+a Postgres table so every worker can replay them. Before computing, a worker
+claims the key there with a pending row, so a duplicate arriving at another
+worker waits for the result instead of running the write again. A claim
+lapses after CLAIM_SECONDS, so a worker that dies mid-request does not block
+the key for long. Store failures are logged and tolerated: the request then
+runs with in-process de-duplication only.
+
+Usage:
+
+    from app.libs.idempotency import IdempotencyCache
+
+    cache = IdempotencyCache(max_entries=10000, ttl_seconds=86400)
+    response = await cache.run(key, fingerprint, lambda: do_the_work())
+"""
+
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.libs.db_metrics import timed_db_call
+
+# A NULL response marks a key claimed by a worker that is still computing it
+CREATE_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    response JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+ALTER TABLE idempotency_keys ALTER COLUMN response DROP NOT NULL;
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at_idx ON idempotency_keys (expires_at);
+"""
+
+SELECT_QUERY = """
+SELECT fingerprint, response::text AS response
+FROM idempotency_keys
+WHERE key = $1 AND expires_at > NOW()
+"""
+
+# Takes a key that is free or whose entry (or claim) has expired
+CLAIM_QUERY = """
+INSERT INTO idempotency_keys (key, fingerprint, response, expires_at)
+VALUES ($1, $2, NULL, NOW() + make_interval(secs => $3))
+ON CONFLICT (key) DO UPDATE
+SET fingerprint = EXCLUDED.fingerprint,
+    response = NULL,
+    created_at = NOW(),
+    expires_at = EXCLUDED.expires_at
+WHERE idempotency_keys.expires_at <= NOW()
+RETURNING key
+"""
+
+COMPLETE_QUERY = """
+UPDATE idempotency_keys
+SET response = $3::jsonb, expires_at = NOW() + make_interval(secs => $4)
+WHERE key = $1 AND fingerprint = $2 AND response IS NULL
+"""
+
+RELEASE_QUERY = """
+DELETE FROM idempotency_keys
+WHERE key = $1 AND fingerprint = $2 AND response IS NULL
+"""
+
+PURGE_QUERY = """
+DELETE FROM idempotency_keys
+WHERE ctid IN (SELECT ctid FROM idempotency_keys WHERE expires_at <= NOW() LIMIT 1000)
+"""
+
+# Fraction of writes that also purge a slice of expired rows
+PURGE_PROBABILITY = 0.001
+
+# How long a claim holds a key without a result, and how often others check on it
+CLAIM_SECONDS = 30.0
+CLAIM_POLL_SECONDS = 0.05
+CLAIM_POLL_MAX_SECONDS = 1.0
+
+
+class IdempotencyKeyConflict(Exception):
+    """The key was already used for a request with a different payload."""
+
+
+class PostgresIdempotencyStore:
+    """Shares cached results between workers through the idempotency_keys table."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def create_table(self) -> None:
+        async with self.db.get_connection() as conn:
+            await conn.execute(CREATE_TABLE_QUERY)
+
+    async def get(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Return ``(fingerprint, response_json)`` for a live key; the response is None while claimed."""
+        async with self.db.get_connection() as conn:
+            async with timed_db_call("idempotency_get"):
+                row = await conn.fetchrow(SELECT_QUERY, key)
+        return (row["fingerprint"], row["response"]) if row else None
+
+    async def claim(self, key: str, fingerprint: str, claim_seconds: float) -> Optional[Tuple[str, Optional[str]]]:
+        """Claim ``key`` for computing; returns None when claimed, else the live entry holding it."""
+        async with self.db.get_connection() as conn:
+            while True:
+                async with timed_db_call("idempotency_claim"):
+                    claimed = await conn.fetchval(CLAIM_QUERY, key, fingerprint, float(claim_seconds))
+                if claimed:
+                    return None
+                async with timed_db_call("idempotency_get"):
+                    row = await conn.fetchrow(SELECT_QUERY, key)
+                # A row gone between the two statements was released or expired; try again
+                if row:
+                    return row["fingerprint"], row["response"]
+
+    async def complete(self, key: str, fingerprint: str, response_json: str, ttl_seconds: float) -> None:
+        async with self.db.get_connection() as conn:
+            async with timed_db_call("idempotency_complete"):
+                await conn.execute(COMPLETE_QUERY, key, fingerprint, response_json, float(ttl_seconds))
+            if random.random() < PURGE_PROBABILITY:
+                async with timed_db_call("idempotency_purge"):
+                    await conn.execute(PURGE_QUERY)
+
+    async def release(self, key: str, fingerprint: str) -> None:
+        """Drop an unfinished claim so the next attempt can compute the key."""
+        async with self.db.get_connection() as conn:
+            async with timed_db_call("idempotency_release"):
+                await conn.execute(RELEASE_QUERY, key, fingerprint)
+
+
+class IdempotencyCache:
+    """Bounded LRU of results keyed by idempotency key, with in-flight de-duplication.
+
+    ``encode``/``decode`` convert results to and from JSON text and are only
+    needed when a persistent ``store`` is configured.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400,
+                 store: Optional[PostgresIdempotencyStore] = None,
+                 encode: Optional[Callable[[Any], str]] = None,
+                 decode: Optional[Callable[[str], Any]] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self.encode = encode
+        self.decode = decode
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    def _get_local(self, key: str) -> Optional[Tuple[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, fingerprint, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return fingerprint, value
+
+    def _put_local(self, key: str, fingerprint: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, fingerprint, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _check(key: str, expected: str, fingerprint: str) -> None:
+        if expected != fingerprint:
+            raise IdempotencyKeyConflict(f"Idempotency key '{key}' was used with a different request")
+
+    async def run(self, key: str, fingerprint: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the stored result for ``key`` or compute it exactly once.
+
+        Raises IdempotencyKeyConflict when ``key`` was seen with another fingerprint.
+        Failed or cancelled computations are not cached, so they can be retried.
+        """
+        while True:
+            cached = self._get_local(key)
+            if cached:
+                self._check(key, cached[0], fingerprint)
+                return cached[1]
+
+            in_flight = self._in_flight.get(key)
+            if not in_flight:
+                break
+            self._check(key, in_flight[0], fingerprint)
+            try:
+                return await asyncio.shield(in_flight[1])
+            except asyncio.CancelledError:
+                # Re-raise our own cancellation; if only the first request
+                # was cancelled, go round and compute the result here
+                if not in_flight[1].cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            value = await self._load_or_compute(key, fingerprint, compute)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so unawaited failures are not reported as lost
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            self._put_local(key, fingerprint, value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _load_or_compute(self, key: str, fingerprint: str,
+                               compute: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.store:
+            return await compute()
+
+        # Wait while another worker holds the key; its claim lapses if it dies
+        delay = CLAIM_POLL_SECONDS
+        while True:
+            try:
+                stored = await self.store.claim(key, fingerprint, CLAIM_SECONDS)
+            except Exception as e:
+                # An unreachable store must not take the write path down with
+                # it: fall back to this worker's de-duplication alone
+                print(f"Idempotency claim failed for {key}, deduplicating in process only: {str(e)}")
+                return await compute()
+            if stored is None:
+                break
+            self._check(key, stored[0], fingerprint)
+            if stored[1] is not None:
+                return self.decode(stored[1])
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CLAIM_POLL_MAX_SECONDS)
+
+        try:
+            value = await compute()
+        except BaseException:
+            try:
+                await self.store.release(key, fingerprint)
+            except Exception as e:
+                print(f"Idempotency claim release failed for {key}: {str(e)}")
+            raise
+
+        # The write has already happened, so a failed record must not fail the
+        # request; at worst a later retry of this key runs again
+        try:
+            await self.store.complete(key, fingerprint, self.encode(value), self.ttl_seconds)
+        except Exception as e:
+            print(f"Idempotency store write failed for {key}: {str(e)}")
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self.store is not None
+        }
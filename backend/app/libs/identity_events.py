@@ -0,0 +1,168 @@
+"""Identity cluster change events: derivation, in-process fan-out and streaming.
+
+Reconciliation, the bulk import and compaction write one event per change
+into the storage outbox, inside the same transaction as the contact writes,
+so an event exists exactly when its change committed:
+
+- ``contact_created``: a new contact, primary or secondary
+- ``secondary_linked``: an existing secondary moved under another primary
+- ``primaries_merged``: a primary was demoted into an older primary
+- ``contact_promoted``: compaction made a contact whose link was broken a
+  primary again
+
+After commit the events are also published to an ``EventBroker``. Each
+streaming consumer holds a bounded queue there, which only serves to wake it
+up; the outbox stays the source of truth, so consumers resume from any
+offset and also see events written by other workers (picked up by polling).
+
+Usage:
+
+    from app.libs.identity_events import event_broker, stream_events
+
+    async for event in stream_events(contact_storage, after=last_offset):
+        if event is not None:  # None is an idle heartbeat
+            handle(event)
+"""
+
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set
+
+from app.libs.contact_cluster import needs_relink
+from app.libs.contact_storage import ContactStorage, NewEvent
+from app.libs.models import Contact, LinkPrecedence
+
+IDENTITY_EVENT_QUEUE_SIZE = int(os.environ.get("IDENTITY_EVENT_QUEUE_SIZE", "1000"))
+# How often an idle stream re-reads the outbox for events from other workers
+IDENTITY_EVENT_POLL_SECONDS = float(os.environ.get("IDENTITY_EVENT_POLL_SECONDS", "1.0"))
+IDENTITY_EVENT_BATCH_SIZE = int(os.environ.get("IDENTITY_EVENT_BATCH_SIZE", "500"))
+
+CONTACT_CREATED = "contact_created"
+SECONDARY_LINKED = "secondary_linked"
+PRIMARIES_MERGED = "primaries_merged"
+CONTACT_PROMOTED = "contact_promoted"
+
+
+def reconciliation_events(primary: Contact, existing: List[Contact], inserted: List[Contact]) -> List[NewEvent]:
+    """Events for one reconciled cluster, given the contacts before and the rows just inserted."""
+    events: List[NewEvent] = []
+    for contact in inserted:
+        events.append((CONTACT_CREATED, {
+            "contact_id": contact.id,
+            "primary_contact_id": primary.id,
+            "email": contact.email,
+            "phone_number": contact.phone_number,
+            "link_precedence": "primary" if contact.id == primary.id else "secondary"
+        }))
+
+    for contact in existing:
+        if not needs_relink(contact, primary.id):
+            continue
+        if contact.link_precedence == LinkPrecedence.PRIMARY:
+            events.append((PRIMARIES_MERGED, {
+                "primary_contact_id": primary.id,
+                "merged_primary_id": contact.id
+            }))
+        else:
+            events.append((SECONDARY_LINKED, {
+                "contact_id": contact.id,
+                "primary_contact_id": primary.id,
+                "previous_linked_id": contact.linked_id
+            }))
+    return events
+
+
+class EventBroker:
+    """Fans committed events out to per-consumer bounded queues."""
+
+    def __init__(self, queue_size: int = IDENTITY_EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.dropped = 0
+
+    def publish(self, events: Iterable[Dict[str, Any]]) -> None:
+        for queue in self.subscribers:
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # The consumer is behind; it re-reads the outbox anyway
+                    self.dropped += 1
+                    break
+
+    @contextmanager
+    def subscribe(self) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers.discard(queue)
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscribers": len(self.subscribers), "dropped": self.dropped}
+
+
+event_broker = EventBroker()
+
+
+async def stream_events(storage: ContactStorage, after: int = 0, follow: bool = True,
+                        broker: EventBroker = event_broker,
+                        batch_size: int = IDENTITY_EVENT_BATCH_SIZE,
+                        poll_seconds: float = IDENTITY_EVENT_POLL_SECONDS) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Yield outbox events with offsets greater than ``after``, in order.
+
+    Without ``follow`` the stream ends once it has caught up. Otherwise it
+    waits for new events and yields None after ``poll_seconds`` of silence so
+    callers can send heartbeats.
+    """
+    offset = after
+    with broker.subscribe() as wakeups:
+        while True:
+            events = await storage.read_events(offset, batch_size)
+            for event in events:
+                offset = event["offset"]
+                yield event
+            if len(events) == batch_size:
+                continue
+            if not follow:
+                return
+
+            try:
+                await asyncio.wait_for(wakeups.get(), timeout=poll_seconds)
+            except asyncio.TimeoutError:
+                yield None
+            # Everything queued so far is covered by the next outbox read
+            while not wakeups.empty():
+                wakeups.get_nowait()
+
+
+def format_ndjson(event: Optional[Dict[str, Any]]) -> str:
+    """One JSON object per line; heartbeats are empty lines."""
+    return json.dumps(event) + "\n" if event is not None else "\n"
+
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    """Server-sent event whose id is the offset, so EventSource resumes via Last-Event-ID."""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"id: {event['offset']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+__all__ = [
+    "CONTACT_CREATED",
+    "CONTACT_PROMOTED",
+    "EventBroker",
+    "IDENTITY_EVENT_BATCH_SIZE",
+    "IDENTITY_EVENT_POLL_SECONDS",
+    "IDENTITY_EVENT_QUEUE_SIZE",
+    "PRIMARIES_MERGED",
+    "SECONDARY_LINKED",
+    "event_broker",
+    "format_ndjson",
+    "format_sse",
+    "reconciliation_events",
+    "stream_events",
+]
@@ -0,0 +1,258 @@
+"""Optional in-process index of contact clusters for zero-query identify lookups.
+
+The index keeps a union-find over contact ids, hash maps from normalized email
+and phone number to a contact in the owning cluster, and a compact member list per
+cluster root. When a request's email/phone pair already exists in a single,
+well-formed cluster, the response can be built without touching the database.
+
+The index is loaded from contact storage at startup, updated after every
+committed reconciliation and invalidated by compaction. It only sees writes
+made by this process, so enable it for single-writer deployments (or pair it
+with cross-worker invalidation).
+
+Usage:
+
+    from app.libs.identity_index import identity_index, IDENTITY_INDEX_ENABLED
+
+    if IDENTITY_INDEX_ENABLED:
+        await identity_index.load(contact_storage)
+
+        response = identity_index.lookup(email, phone_number)  # None on a miss
+"""
+
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.libs.contact_keys import contact_keys, normalize_email, normalize_phone
+from app.libs.disjoint_set import DisjointSet
+from app.libs.models import Contact, ContactIdentifyResponse, LinkPrecedence
+
+IDENTITY_INDEX_ENABLED = os.environ.get("IDENTITY_INDEX_ENABLED", "").lower() in ("1", "true", "yes")
+
+# (created_at, id, email, phone_number); plain tuples keep the per-contact cost low
+Member = Tuple[object, int, Optional[str], Optional[str]]
+
+
+class ClusterEntry:
+    """Members of one cluster plus whether it is safe to answer from memory."""
+
+    __slots__ = ("primary_id", "members", "clean")
+
+    def __init__(self, primary_id: int, members: List[Member], clean: bool):
+        self.primary_id = primary_id
+        self.members = members
+        self.clean = clean
+
+
+class IdentityIndex:
+    """Union-find identity index keyed by email and phone number."""
+
+    def __init__(self):
+        self.ready = False
+        self.build_seconds: Optional[float] = None
+        self.build_bytes: Optional[int] = None
+        self._ids = DisjointSet()
+        self._by_email: Dict[str, int] = {}
+        self._by_phone: Dict[str, int] = {}
+        self._clusters: Dict[int, ClusterEntry] = {}
+        # contact id -> (member, linked_id, is_primary), only while building
+        self._links: Dict[int, Tuple[Member, Optional[int], bool]] = {}
+
+    def _reset(self):
+        self._ids = DisjointSet()
+        self._by_email = {}
+        self._by_phone = {}
+        self._clusters = {}
+        self._links = {}
+
+    async def load(self, storage) -> None:
+        """Rebuild the index from every contact streamed out of a ContactStorage.
+
+        Rows are folded in as they arrive, so the table is never held as a
+        list of rows on top of the index itself.
+        """
+        started = time.perf_counter()
+        self.ready = False
+
+        self._reset()
+        async for row in storage.iter_contact_links():
+            self._add_link(*row)
+        self._finish_build()
+
+        self.build_seconds = time.perf_counter() - started
+        self.ready = True
+
+    def build(self, rows: Iterable[Tuple[int, Optional[str], Optional[str], Optional[int], str, object]]) -> None:
+        """Rebuild from ``(id, email, phone, linked_id, link_precedence, created_at)`` rows."""
+        self._reset()
+        for row in rows:
+            self._add_link(*row)
+        self._finish_build()
+
+    def _add_link(self, contact_id: int, email: Optional[str], phone_number: Optional[str],
+                  linked_id: Optional[int], link_precedence: str, created_at: object) -> None:
+        self._ids.add(contact_id)
+        if linked_id:
+            self._ids.union(contact_id, linked_id)
+        self._links[contact_id] = (
+            (created_at, contact_id, email, phone_number),
+            linked_id,
+            link_precedence == LinkPrecedence.PRIMARY
+        )
+
+    def _finish_build(self) -> None:
+        """Index the keys of every added contact and group the contacts into cluster entries."""
+        ids = self._ids
+        links, self._links = self._links, {}
+
+        # Keys shared by contacts that are not linked mean the database holds
+        # an unreconciled merge; join them here and let the next request fix it
+        dirty = set()
+        for contact_id, ((_, _, email, phone_number), _, _) in links.items():
+            email, phone_number = normalize_email(email), normalize_phone(phone_number)
+            for key, index in ((email, self._by_email), (phone_number, self._by_phone)):
+                if not key:
+                    continue
+                owner = index.setdefault(key, contact_id)
+                if ids.find(owner) != ids.find(contact_id):
+                    dirty.add(ids.union(owner, contact_id))
+        dirty = {ids.find(root) for root in dirty}
+
+        grouped: Dict[int, List[Tuple[Member, Optional[int], bool]]] = {}
+        for contact_id, link in links.items():
+            grouped.setdefault(ids.find(contact_id), []).append(link)
+
+        for root, entries in grouped.items():
+            entries.sort(key=lambda e: e[0][:2])
+            primaries = [member[1] for member, _, is_primary in entries if is_primary]
+            primary_id = primaries[0] if primaries else entries[0][0][1]
+            clean = (
+                len(primaries) == 1
+                and root not in dirty
+                and all(is_primary or linked_id == primary_id for _, linked_id, is_primary in entries)
+            )
+            self._clusters[root] = ClusterEntry(primary_id, [member for member, _, _ in entries], clean)
+
+        self.build_bytes = self._estimate_bytes()
+
+    def _root_for(self, email: Optional[str], phone_number: Optional[str]) -> Optional[int]:
+        """Return the single cluster root owning every given normalized key, or None."""
+        roots = set()
+        for key, index in ((email, self._by_email), (phone_number, self._by_phone)):
+            if key:
+                owner = index.get(key)
+                if owner is None:
+                    return None
+                roots.add(self._ids.find(owner))
+        return roots.pop() if len(roots) == 1 else None
+
+    def lookup(self, email: Optional[str], phone_number: Optional[str]) -> Optional[ContactIdentifyResponse]:
+        """Answer an identify request from memory when it would cause no writes.
+
+        That is the case when both keys live in one clean cluster that already
+        holds a contact with exactly this email/phone pair.
+        """
+        if not self.ready:
+            return None
+
+        email, phone_number = normalize_email(email), normalize_phone(phone_number)
+        root = self._root_for(email, phone_number)
+        if root is None:
+            return None
+
+        entry = self._clusters.get(root)
+        if entry is None or not entry.clean:
+            return None
+        if not any(
+            normalize_email(m[2]) == email and normalize_phone(m[3]) == phone_number
+            for m in entry.members
+        ):
+            return None
+
+        return self._response(entry)
+
+    @staticmethod
+    def _response(entry: ClusterEntry) -> ContactIdentifyResponse:
+        primary = next(m for m in entry.members if m[1] == entry.primary_id)
+        ordered = [primary, *(m for m in entry.members if m[1] != entry.primary_id)]
+        return ContactIdentifyResponse(
+            primary_contact_id=entry.primary_id,
+            emails=list(dict.fromkeys(m[2] for m in ordered if m[2])),
+            phone_numbers=list(dict.fromkeys(m[3] for m in ordered if m[3])),
+            secondary_contact_ids=[m[1] for m in ordered[1:]]
+        )
+
+    def apply_cluster(self, primary: Contact, contacts: List[Contact]) -> None:
+        """Record the committed state of a reconciled cluster.
+
+        ``contacts`` must be the full cluster as read and written by the
+        reconciliation, so the entry is authoritative and marked clean.
+        """
+        if not self.ready:
+            return
+
+        ids = self._ids
+        old_roots = {ids.find(c.id) for c in contacts if c.id in ids}
+        root = ids.find(primary.id)
+        for contact in contacts:
+            root = ids.union(root, contact.id)
+            email, phone_number = contact_keys(contact)
+            if email:
+                self._by_email.setdefault(email, contact.id)
+            if phone_number:
+                self._by_phone.setdefault(phone_number, contact.id)
+
+        for old_root in old_roots:
+            self._clusters.pop(old_root, None)
+        self._clusters[root] = ClusterEntry(
+            primary.id,
+            sorted((c.created_at, c.id, c.email, c.phone_number) for c in contacts),
+            True
+        )
+
+    def invalidate(self, contact_ids: Iterable[int]) -> None:
+        """Stop answering for the clusters holding any of ``contact_ids``.
+
+        For writes made outside reconciliation, such as compaction, which can
+        split clusters the union-find cannot take apart. The clusters are
+        served from the database until a reconciliation rewrites them.
+        """
+        for contact_id in contact_ids:
+            if contact_id is None or contact_id not in self._ids:
+                continue
+            entry = self._clusters.get(self._ids.find(contact_id))
+            if entry is not None:
+                entry.clean = False
+
+    def _estimate_bytes(self) -> int:
+        """Shallow size of the index containers, member tuples and cluster entries."""
+        containers = [self._ids.parent, self._ids.size, self._by_email, self._by_phone, self._clusters]
+        total = sum(sys.getsizeof(c) for c in containers)
+        for entry in self._clusters.values():
+            total += sys.getsizeof(entry) + sys.getsizeof(entry.members)
+            total += sum(sys.getsizeof(m) for m in entry.members)
+        return total
+
+    def stats(self) -> Dict[str, object]:
+        """Sizes plus the duration and estimated footprint of the last rebuild."""
+        return {
+            "enabled": IDENTITY_INDEX_ENABLED,
+            "ready": self.ready,
+            "contacts": len(self._ids),
+            "clusters": len(self._clusters),
+            "emails": len(self._by_email),
+            "phone_numbers": len(self._by_phone),
+            "build_seconds": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+            "build_memory_mb": round(self.build_bytes / 1024 / 1024, 2) if self.build_bytes is not None else None
+        }
+
+
+identity_index = IdentityIndex()
+
+__all__ = [
+    "IDENTITY_INDEX_ENABLED",
+    "IdentityIndex",
+    "identity_index",
+]
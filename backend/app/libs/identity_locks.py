@@ -0,0 +1,137 @@
+"""Striped locks that serialize reconciliation per email/phone key.
+
+Every key hashes to one of a fixed number of stripes. Within a worker the
+stripe is an ``asyncio.Lock``; across workers the same stripe number is a
+Postgres transaction-level advisory lock. Requests whose keys land on
+different stripes run fully in parallel, while two requests sharing an email
+or phone can no longer both see an empty cluster and create two primaries.
+
+Keys on the request alone are not enough: two requests can reach one
+cluster through different keys. Reconciliation therefore also needs the
+stripes of every key in the cluster it read, and starts over holding them
+when some were missing.
+
+Stripes are always taken in ascending order, so requests locking several
+stripes cannot deadlock each other. Batches are split into lock groups of at
+most IDENTITY_BATCH_MAX_STRIPES stripes each, so a large batch never holds
+most of the pool (and blocks unrelated single requests) at once.
+
+Usage:
+
+    from app.libs.identity_locks import identity_locks, acquire_advisory_locks
+
+    stripes = identity_locks.stripes_for([email], [phone_number])
+    async with identity_locks.acquire(stripes):
+        async with db_manager.get_connection() as conn:
+            async with conn.transaction():
+                await acquire_advisory_locks(conn, stripes)
+                ...
+"""
+
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from app.libs.disjoint_set import DisjointSet
+
+IDENTITY_LOCK_STRIPES = int(os.environ.get("IDENTITY_LOCK_STRIPES", "1024"))
+# Most stripes one batch transaction may hold; larger batches are split
+IDENTITY_BATCH_MAX_STRIPES = int(os.environ.get("IDENTITY_BATCH_MAX_STRIPES", "32"))
+
+# First half of the two-int advisory lock key, reserved for identify stripes
+ADVISORY_LOCK_NAMESPACE = 0x1D3A
+
+ADVISORY_LOCK_QUERY = """
+SELECT pg_advisory_xact_lock($1::int, s.stripe)
+FROM (SELECT stripe FROM unnest($2::int[]) AS stripe ORDER BY stripe) AS s
+"""
+
+
+def _stable_hash(value: str) -> int:
+    # hash() is salted per process; workers must agree on stripe numbers
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class StripedLock:
+    """A fixed pool of asyncio locks addressed by contact key."""
+
+    def __init__(self, stripes: int = IDENTITY_LOCK_STRIPES):
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+
+    def stripes_for(self, emails: Iterable[Optional[str]],
+                    phone_numbers: Iterable[Optional[str]]) -> List[int]:
+        """Sorted, de-duplicated stripes covering every given email and phone."""
+        keys = {f"email:{e}" for e in emails if e} | {f"phone:{p}" for p in phone_numbers if p}
+        return sorted({_stable_hash(key) % len(self._locks) for key in keys})
+
+    def partition(self, keys: Sequence[Tuple[Optional[str], Optional[str]]],
+                  max_stripes: int = IDENTITY_BATCH_MAX_STRIPES,
+                  together: Optional[Sequence[Optional[Hashable]]] = None) -> List[Tuple[List[int], List[int]]]:
+        """Split ``(email, phone)`` items into ``(indexes, stripes)`` lock groups.
+
+        Items sharing an email or phone always land in the same group, as do
+        items with the same non-None ``together`` tag (one per item). Sets
+        of connected items are packed in input order until the next one
+        would push the group past ``max_stripes``; a single set needing more
+        stripes than that gets a group of its own. Indexes are ascending
+        within each group.
+        """
+        ds = DisjointSet()
+        for index, (email, phone_number) in enumerate(keys):
+            ds.add(("item", index))
+            if email:
+                ds.union(("item", index), ("email", email))
+            if phone_number:
+                ds.union(("item", index), ("phone", phone_number))
+            if together is not None and together[index] is not None:
+                ds.union(("item", index), ("tag", together[index]))
+
+        groups: List[Tuple[List[int], List[int]]] = []
+        indexes: List[int] = []
+        stripes: set = set()
+        for members in ds.groups(("item", index) for index in range(len(keys))):
+            member_indexes = [index for _, index in members]
+            member_stripes = set(self.stripes_for(
+                [keys[i][0] for i in member_indexes], [keys[i][1] for i in member_indexes]
+            ))
+            if indexes and len(stripes | member_stripes) > max_stripes:
+                groups.append((sorted(indexes), sorted(stripes)))
+                indexes, stripes = [], set()
+            indexes.extend(member_indexes)
+            stripes |= member_stripes
+        if indexes:
+            groups.append((sorted(indexes), sorted(stripes)))
+        return groups
+
+    @asynccontextmanager
+    async def acquire(self, stripes: List[int]) -> AsyncIterator[None]:
+        """Hold the locks for ``stripes``, which must be sorted as returned by stripes_for."""
+        acquired = []
+        try:
+            for stripe in stripes:
+                lock = self._locks[stripe]
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+async def acquire_advisory_locks(conn, stripes: List[int]) -> None:
+    """Take the cross-worker advisory locks for ``stripes`` until the transaction ends."""
+    if stripes:
+        await conn.execute(ADVISORY_LOCK_QUERY, ADVISORY_LOCK_NAMESPACE, stripes)
+
+
+identity_locks = StripedLock()
+
+__all__ = [
+    "IDENTITY_BATCH_MAX_STRIPES",
+    "IDENTITY_LOCK_STRIPES",
+    "StripedLock",
+    "acquire_advisory_locks",
+    "identity_locks",
+]
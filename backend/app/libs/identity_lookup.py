@@ -0,0 +1,104 @@
+"""Cluster-keyed LRU of consolidated identities for read-only lookups.
+
+Entries are stored once per cluster, under the primary contact id, and every
+email and phone number of the cluster points at that entry. Reconciliation
+invalidates entries by contact id after it commits, which covers merges
+(the demoted primary's entry) as well as new secondaries. Entries also
+expire after a TTL, which bounds staleness from writes made by other workers.
+
+Usage:
+
+    from app.libs.identity_lookup import lookup_cache
+
+    response = lookup_cache.get(email, phone_number)
+    if response is None:
+        response = ...  # read from the database
+        lookup_cache.put(response)
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.libs.contact_keys import normalize_email, normalize_phone
+from app.libs.models import ContactIdentifyResponse
+
+LOOKUP_CACHE_SIZE = int(os.environ.get("LOOKUP_CACHE_SIZE", "50000"))
+LOOKUP_CACHE_TTL_SECONDS = float(os.environ.get("LOOKUP_CACHE_TTL_SECONDS", "30"))
+
+
+class ClusterLookupCache:
+    """LRU of ContactIdentifyResponse keyed by primary id, addressable by email or phone."""
+
+    def __init__(self, max_clusters: int = LOOKUP_CACHE_SIZE, ttl_seconds: float = LOOKUP_CACHE_TTL_SECONDS):
+        self.max_clusters = max_clusters
+        self.ttl_seconds = ttl_seconds
+        self._clusters: "OrderedDict[int, Tuple[float, ContactIdentifyResponse]]" = OrderedDict()
+        self._keys: Dict[Tuple[str, str], int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cluster_keys(response: ContactIdentifyResponse):
+        yield from (("email", normalize_email(e)) for e in response.emails)
+        yield from (("phone", normalize_phone(p)) for p in response.phone_numbers)
+
+    def get(self, email: Optional[str], phone_number: Optional[str]) -> Optional[ContactIdentifyResponse]:
+        """Return the cached cluster owning every given key, or None."""
+        keys = [k for k in (("email", normalize_email(email)), ("phone", normalize_phone(phone_number))) if k[1]]
+        primary_ids = {self._keys.get(k) for k in keys}
+        if len(primary_ids) != 1 or None in primary_ids:
+            self.misses += 1
+            return None
+
+        primary_id = primary_ids.pop()
+        expires_at, response = self._clusters[primary_id]
+        if expires_at <= time.monotonic():
+            self._drop(primary_id)
+            self.misses += 1
+            return None
+
+        self._clusters.move_to_end(primary_id)
+        self.hits += 1
+        return response
+
+    def put(self, response: ContactIdentifyResponse) -> None:
+        primary_id = response.primary_contact_id
+        self._drop(primary_id)
+        self._clusters[primary_id] = (time.monotonic() + self.ttl_seconds, response)
+        for key in self._cluster_keys(response):
+            self._keys[key] = primary_id
+
+        while len(self._clusters) > self.max_clusters:
+            self._drop(next(iter(self._clusters)))
+
+    def invalidate(self, contact_ids: Iterable[int]) -> None:
+        """Drop every cached cluster whose primary is among ``contact_ids``."""
+        for contact_id in contact_ids:
+            self._drop(contact_id)
+
+    def _drop(self, primary_id: int) -> None:
+        entry = self._clusters.pop(primary_id, None)
+        if entry is None:
+            return
+        for key in self._cluster_keys(entry[1]):
+            if self._keys.get(key) == primary_id:
+                del self._keys[key]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "clusters": len(self._clusters),
+            "keys": len(self._keys),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+lookup_cache = ClusterLookupCache()
+
+__all__ = [
+    "ClusterLookupCache",
+    "LOOKUP_CACHE_TTL_SECONDS",
+    "lookup_cache",
+]
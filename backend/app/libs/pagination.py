@@ -0,0 +1,68 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor records where the previous page ended as a sort key, e.g.
+``(price, id)`` of its last item, plus the sort order and a fingerprint of
+the query it belongs to. The next page starts strictly after that key, so
+it costs the same at any depth and items written meanwhile neither repeat
+nor get skipped. Clients treat the string as opaque.
+
+Usage:
+
+    from app.libs.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+    fingerprint = query_fingerprint(sort="price", category="books", max_price=50.0)
+    next_cursor = encode_cursor("price", (last.price, last.id), fingerprint, page=2)
+    cursor = decode_cursor(next_cursor, fingerprint)  # raises InvalidCursor on tampering or mismatch
+"""
+
+import base64
+import hashlib
+import json
+from typing import Any, NamedTuple, Tuple
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that are malformed or belong to a different query."""
+
+
+class Cursor(NamedTuple):
+    order: str
+    after: Tuple[Any, int]
+    page: int
+
+
+def query_fingerprint(**params: Any) -> str:
+    """Short digest of the query parameters a cursor is only valid for."""
+    canonical = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:12]
+
+
+def encode_cursor(order: str, after: Tuple[Any, int], fingerprint: str, page: int) -> str:
+    payload = {"o": order, "k": list(after), "q": fingerprint, "p": page}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, fingerprint: str) -> Cursor:
+    """Decode a cursor, checking it was issued for the query with this fingerprint."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        key, product_id = payload["k"]
+        decoded = Cursor(order=str(payload["o"]), after=(key, int(product_id)), page=int(payload["p"]))
+        issued_for = payload["q"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+    if issued_for != fingerprint:
+        raise InvalidCursor("Cursor does not match this query")
+    return decoded
+
+
+__all__ = [
+    "Cursor",
+    "InvalidCursor",
+    "decode_cursor",
+    "encode_cursor",
+    "query_fingerprint",
+]
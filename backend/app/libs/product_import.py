@@ -0,0 +1,169 @@
+"""Streaming bulk upsert of products from NDJSON.
+
+ERP syncs send 100k+ rows at a time. The body is consumed as it arrives:
+lines are parsed and validated one chunk at a time, each chunk is applied
+in one step (a single upsert statement, so one transaction, when the
+catalog is backed by Postgres) and a progress report is emitted after
+every chunk. Memory is bounded by the chunk size, however large the
+upload.
+
+A row that does not parse or validate is rejected on its own and reported
+with its line number in the progress report of its chunk; the rest of the
+chunk is still applied. A failure to apply a chunk stops the import, and
+every earlier chunk stays applied.
+
+Usage:
+
+    python -m app.libs.product_import products.ndjson
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple, TypeVar
+
+PRODUCT_IMPORT_CHUNK_SIZE = int(os.environ.get("PRODUCT_IMPORT_CHUNK_SIZE", "1000"))
+
+T = TypeVar("T")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines without buffering more than one line."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8", errors="replace").rstrip("\r")
+
+
+async def iter_chunks(lines: AsyncIterator[str], chunk_size: int) -> AsyncIterator[List[Tuple[int, str]]]:
+    """Group non-blank lines into chunks of ``(line_number, line)``."""
+    chunk: List[Tuple[int, str]] = []
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        chunk.append((line_number, line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ImportProgress:
+    """Running counts of one import, reported after each chunk."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.upserted = 0
+        self.rejected = 0
+        self.chunks = 0
+
+    def report(self, kind: str, **extra: Any) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "type": kind,
+            "read": self.read,
+            "upserted": self.upserted,
+            "rejected": self.rejected,
+            "chunks": self.chunks,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.read / elapsed, 1) if elapsed > 0 else None,
+            **extra
+        }
+
+
+async def bulk_upsert(
+    body: AsyncIterator[bytes],
+    validate: Callable[[Dict[str, Any]], T],
+    apply: Callable[[List[T]], Awaitable[Any]],
+    chunk_size: int = PRODUCT_IMPORT_CHUNK_SIZE
+) -> AsyncIterator[Dict[str, Any]]:
+    """Validate and apply an NDJSON body chunk by chunk.
+
+    ``validate`` turns one decoded object into a row, raising ValueError
+    (pydantic's ValidationError is one) to reject it; ``apply`` writes one
+    chunk of rows. Yields a ``progress`` report per chunk, then ``done``, or
+    ``error`` if a chunk could not be applied.
+    """
+    progress = ImportProgress()
+    async for chunk in iter_chunks(iter_lines(body), chunk_size):
+        rows: List[T] = []
+        errors: List[Dict[str, Any]] = []
+        for line_number, line in chunk:
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+                rows.append(validate(record))
+            except ValueError as e:
+                errors.append({"line": line_number, "error": str(e)})
+
+        try:
+            if rows:
+                await apply(rows)
+        except Exception as e:
+            print(f"Product import stopped at line {chunk[0][0]}: {str(e)}")
+            yield progress.report("error", line=chunk[0][0], detail="Failed to apply chunk; earlier chunks were kept")
+            return
+
+        progress.read += len(chunk)
+        progress.upserted += len(rows)
+        progress.rejected += len(errors)
+        progress.chunks += 1
+        yield progress.report("progress", errors=errors)
+
+    yield progress.report("done")
+
+
+async def _read_file(path: str, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+
+async def _import_file(path: str, chunk_size: int) -> None:
+    # Deferred: the CLI validates with the API's product model and writes
+    # straight to Postgres, where serving processes pick the rows up
+    # through their change feed
+    from app.apis.products import ProductService
+    from app.libs.product_repository import PostgresProductRepository
+
+    repository = PostgresProductRepository()
+    await repository.create_schema()
+
+    async def apply(products) -> None:
+        await repository.upsert_products([p.model_dump(mode="json") for p in products])
+
+    async for report in bulk_upsert(_read_file(path), ProductService.import_row, apply, chunk_size):
+        print(json.dumps(report))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk upsert products from NDJSON into Postgres.")
+    parser.add_argument("path", help="NDJSON file with one product object per line")
+    parser.add_argument("--chunk-size", type=int, default=PRODUCT_IMPORT_CHUNK_SIZE, help="Rows per upsert")
+    args = parser.parse_args()
+
+    asyncio.run(_import_file(args.path, args.chunk_size))
+
+
+__all__ = [
+    "ImportProgress",
+    "PRODUCT_IMPORT_CHUNK_SIZE",
+    "bulk_upsert",
+    "iter_chunks",
+    "iter_lines",
+]
+
+
+if __name__ == "__main__":
+    main()
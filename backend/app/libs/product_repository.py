@@ -0,0 +1,260 @@
+"""Postgres product repository on top of ``db_manager`` and its asyncpg pool.
+
+The in-process catalog (``ProductService``) stays the read path; this module
+is what it loads from, writes through, and reads through while it is not
+yet warm:
+
+- every filter combination has its own fixed query text, so asyncpg's
+  per-connection statement cache keeps each one prepared, and each plan is
+  specific to its filters instead of a generic ``$1 IS NULL OR ...`` plan
+- list and search queries return ``COUNT(*) OVER()`` with each row, so the
+  total needs no second query (except for a page past the end)
+- a trigger publishes every insert, update and delete on the
+  ``product_changes`` channel; ``listen`` hands the changed ids to the
+  caller, which refreshes just those products
+
+Rows are returned as plain dicts, so callers build their own models.
+
+Usage:
+
+    from app.libs.product_repository import PostgresProductRepository
+
+    repository = PostgresProductRepository()
+    await repository.create_schema()
+    rows, total = await repository.list_products(limit=10, offset=0, category="books")
+    async with repository.listen() as changes:
+        changed_ids = await changes.get()
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.libs.database import db_manager
+
+PRODUCT_CHANGES_CHANNEL = "product_changes"
+
+CREATE_SCHEMA_QUERY = f"""
+CREATE TABLE IF NOT EXISTS products (
+    id BIGINT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    price NUMERIC(12, 2) NOT NULL CHECK (price >= 0),
+    category TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'active',
+    stock_quantity INTEGER NOT NULL CHECK (stock_quantity >= 0),
+    sku TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS products_category_id_idx ON products (category, id);
+CREATE INDEX IF NOT EXISTS products_status_id_idx ON products (status, id);
+CREATE INDEX IF NOT EXISTS products_category_status_id_idx ON products (category, status, id);
+CREATE INDEX IF NOT EXISTS products_price_id_idx ON products (price, id);
+
+CREATE OR REPLACE FUNCTION notify_product_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{PRODUCT_CHANGES_CHANNEL}', COALESCE(NEW.id, OLD.id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_notify_change ON products;
+CREATE TRIGGER products_notify_change
+AFTER INSERT OR UPDATE OR DELETE ON products
+FOR EACH ROW EXECUTE FUNCTION notify_product_change();
+"""
+
+PRODUCT_COLUMNS = """id, name, description, price::float8 AS price, category, status, stock_quantity, sku,
+       to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"') AS created_at,
+       to_char(updated_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"') AS updated_at"""
+
+GET_PRODUCT_QUERY = f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id = $1"
+
+GET_PRODUCTS_QUERY = f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id = ANY($1::bigint[])"
+
+UPSERT_PRODUCTS_QUERY = """
+INSERT INTO products (id, name, description, price, category, status, stock_quantity, sku, created_at, updated_at)
+SELECT v.id, v.name, v.description, v.price::numeric(12, 2), v.category, v.status, v.stock_quantity, v.sku,
+       COALESCE(NULLIF(v.created_at, '')::timestamptz, NOW()), NOW()
+FROM unnest($1::bigint[], $2::text[], $3::text[], $4::float8[], $5::text[], $6::text[], $7::int[], $8::text[],
+            $9::text[])
+     AS v(id, name, description, price, category, status, stock_quantity, sku, created_at)
+ON CONFLICT (id) DO UPDATE
+SET name = EXCLUDED.name,
+    description = EXCLUDED.description,
+    price = EXCLUDED.price,
+    category = EXCLUDED.category,
+    status = EXCLUDED.status,
+    stock_quantity = EXCLUDED.stock_quantity,
+    sku = EXCLUDED.sku,
+    updated_at = NOW()
+"""
+
+DELETE_PRODUCTS_QUERY = "DELETE FROM products WHERE id = ANY($1::bigint[])"
+
+# Filter name -> SQL condition; the placeholder index is filled in per query
+FILTER_CONDITIONS = {
+    "search": "(name ILIKE ${} OR description ILIKE ${} OR sku ILIKE ${})",
+    "category": "category = ${}",
+    "status": "status = ${}",
+    "min_price": "price >= ${}",
+    "max_price": "price <= ${}",
+}
+
+
+def _filtered_query(filters: Tuple[str, ...], count_only: bool = False) -> str:
+    """Fixed query text for one combination of filters; the last two parameters are LIMIT and OFFSET."""
+    conditions = [FILTER_CONDITIONS[name].replace("{}", str(i)) for i, name in enumerate(filters, start=1)]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    if count_only:
+        return f"SELECT COUNT(*) FROM products {where}"
+    limit, offset = len(filters) + 1, len(filters) + 2
+    return f"""
+SELECT {PRODUCT_COLUMNS}, COUNT(*) OVER() AS total_count
+FROM products
+{where}
+ORDER BY id
+LIMIT ${limit} OFFSET ${offset}
+"""
+
+
+def _keyset_query(filters: Tuple[str, ...]) -> str:
+    """Fixed query text for one batch in id order; the last two parameters are the last id seen and LIMIT."""
+    conditions = [FILTER_CONDITIONS[name].replace("{}", str(i)) for i, name in enumerate(filters, start=1)]
+    last_id, limit = len(filters) + 1, len(filters) + 2
+    return f"""
+SELECT {PRODUCT_COLUMNS}
+FROM products
+WHERE {' AND '.join([*conditions, f"id > ${last_id}"])}
+ORDER BY id
+LIMIT ${limit}
+"""
+
+
+class PostgresProductRepository:
+    """Product rows in Postgres, read with per-filter query texts and watched via LISTEN/NOTIFY."""
+
+    def __init__(self, db=db_manager, channel: str = PRODUCT_CHANGES_CHANNEL):
+        self.db = db
+        self.channel = channel
+
+    async def create_schema(self) -> None:
+        async with self.db.get_connection() as conn:
+            await conn.execute(CREATE_SCHEMA_QUERY)
+
+    async def _page(self, filters: Dict[str, Any], limit: int, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of rows matching the non-None filters, plus the total match count."""
+        active = tuple(name for name, value in filters.items() if value is not None)
+        args = [filters[name] for name in active]
+        async with self.db.get_connection() as conn:
+            rows = await conn.fetch(_filtered_query(active), *args, limit, offset)
+            if rows:
+                total = rows[0]["total_count"]
+            elif offset == 0:
+                total = 0
+            else:
+                # Past the last page there is no row to carry the window count
+                total = await conn.fetchval(_filtered_query(active, count_only=True), *args)
+        products = []
+        for row in rows:
+            product = dict(row)
+            del product["total_count"]
+            products.append(product)
+        return products, total
+
+    async def list_products(self, limit: int, offset: int = 0, category: Optional[str] = None,
+                            status: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        return await self._page({"category": category, "status": status}, limit, offset)
+
+    async def search_products(self, query: str, limit: int, offset: int = 0, category: Optional[str] = None,
+                              min_price: Optional[float] = None,
+                              max_price: Optional[float] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Substring match on name, description or SKU, in id order."""
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return await self._page(
+            {"search": pattern, "category": category, "min_price": min_price, "max_price": max_price},
+            limit, offset
+        )
+
+    async def get_product(self, product_id: int) -> Optional[Dict[str, Any]]:
+        async with self.db.get_connection() as conn:
+            row = await conn.fetchrow(GET_PRODUCT_QUERY, product_id)
+        return dict(row) if row else None
+
+    async def get_products(self, product_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        async with self.db.get_connection() as conn:
+            rows = await conn.fetch(GET_PRODUCTS_QUERY, list(product_ids))
+        return [dict(row) for row in rows]
+
+    async def iter_products(self, batch_size: int = 5000, category: Optional[str] = None,
+                            status: Optional[str] = None, min_price: Optional[float] = None,
+                            max_price: Optional[float] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Products matching the non-None filters in id order, in batches.
+
+        Each batch is its own keyset query, so no connection is held while
+        the caller works through a batch (or waits on a slow client).
+        """
+        filters = {"category": category, "status": status, "min_price": min_price, "max_price": max_price}
+        active = tuple(name for name, value in filters.items() if value is not None)
+        query = _keyset_query(active)
+        args = [filters[name] for name in active]
+        last_id = 0
+        while True:
+            async with self.db.get_connection() as conn:
+                rows = await conn.fetch(query, *args, last_id, batch_size)
+            if not rows:
+                return
+            yield [dict(row) for row in rows]
+            last_id = rows[-1]["id"]
+
+    async def upsert_products(self, products: Sequence[Dict[str, Any]], conn=None) -> int:
+        """Insert or update products in one statement; ``created_at`` is kept for existing rows."""
+        if not products:
+            return 0
+        columns = ("id", "name", "description", "price", "category", "status", "stock_quantity", "sku", "created_at")
+        args = [[product.get(column) for product in products] for column in columns]
+        if conn is not None:
+            await conn.execute(UPSERT_PRODUCTS_QUERY, *args)
+        else:
+            async with self.db.get_connection() as conn:
+                await conn.execute(UPSERT_PRODUCTS_QUERY, *args)
+        return len(products)
+
+    async def delete_products(self, product_ids: Sequence[int]) -> int:
+        async with self.db.get_connection() as conn:
+            result = await conn.execute(DELETE_PRODUCTS_QUERY, list(product_ids))
+        return int(result.split()[-1])
+
+    @asynccontextmanager
+    async def listen(self) -> AsyncIterator[asyncio.Queue]:
+        """Subscribe to product changes on a dedicated pooled connection.
+
+        The queue receives the id of every changed product, and None once the
+        connection is lost, after which the caller should reload and
+        subscribe again. Notifications sent while the caller is busy stay
+        queued, so subscribing before a full load misses nothing.
+        """
+        changes: asyncio.Queue = asyncio.Queue()
+
+        def on_notification(_conn, _pid, _channel, payload: str) -> None:
+            changes.put_nowait(int(payload))
+
+        def on_termination(_conn) -> None:
+            changes.put_nowait(None)
+
+        async with self.db.get_connection() as conn:
+            conn.add_termination_listener(on_termination)
+            await conn.add_listener(self.channel, on_notification)
+            try:
+                yield changes
+            finally:
+                conn.remove_termination_listener(on_termination)
+                if not conn.is_closed():
+                    await conn.remove_listener(self.channel, on_notification)
+
+
+__all__ = [
+    "PRODUCT_CHANGES_CHANNEL",
+    "PostgresProductRepository",
+]
@@ -0,0 +1,454 @@
+"""Columnar in-memory product store with vectorized filtering and secondary indexes.
+
+Filterable attributes live in NumPy columns, one slot per row: ids, prices,
+stock, and category/status as small integer codes. The stored product
+objects are only touched for the rows that end up on the returned page.
+
+Secondary indexes are kept next to the columns and updated on every write:
+
+- one row bitmap per category and per status, plus their cardinalities, so
+  a single-value filter counts in O(1) and combined filters are bitmap ANDs
+- sorted indexes of rows by ``(price, id)`` and by ``id``, searched with
+  ``searchsorted`` for price ranges and keyset (cursor) pagination
+
+Rows are assigned in insertion order and keep their slot when a product is
+updated. Deleted rows become tombstones (``alive`` is False) until
+``compact`` reclaims them.
+
+Usage:
+
+    from app.libs.product_store import ColumnarProductStore
+
+    store = ColumnarProductStore(categories=list(ProductCategory), statuses=list(ProductStatus))
+    store.upsert(product)
+    rows = store.select(category=ProductCategory.BOOKS, max_price=50.0)
+    total = store.count(category=ProductCategory.BOOKS)
+    page = store.products_at(rows[:10])
+    next_rows = store.seek("price", 10, after=(last.price, last.id))
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+COLUMNS = ("ids", "prices", "stock", "category", "status", "alive")
+
+# Re-sort a sorted index instead of merging once this many writes per
+# indexed entry are queued
+REBUILD_FRACTION = 0.25
+
+# Sort orders for keyset pagination
+ORDERS = ("id", "price")
+
+
+class SortedIndex:
+    """Rows ordered by ``(key, id)``, kept as three parallel arrays.
+
+    Writes are queued and merged into the arrays by position on the next
+    read (``sync``), so bursts of writes share one pass; large bursts
+    re-sort instead.
+    """
+
+    def __init__(self, dtype: Any):
+        self.keys = np.zeros(0, dtype=dtype)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.removed: List[Tuple[Any, int]] = []
+        self.added: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, row: int) -> None:
+        self.added.add(row)
+
+    def remove(self, row: int, key: Any, product_id: int) -> None:
+        if row in self.added:
+            # Never merged, nothing to remove
+            self.added.discard(row)
+        else:
+            self.removed.append((key, product_id))
+
+    def positions(self, keys: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Insertion positions of ``(key, id)`` pairs."""
+        positions = np.searchsorted(self.keys, keys, "left")
+        ends = np.searchsorted(self.keys, keys, "right")
+        # Only pairs whose key is already present need the id tie-break
+        for i in np.flatnonzero(ends > positions):
+            lo, hi = positions[i], ends[i]
+            positions[i] = lo + np.searchsorted(self.ids[lo:hi], ids[i])
+        return positions
+
+    def after(self, key: Any, product_id: int) -> int:
+        """Position of the first entry strictly after ``(key, product_id)``."""
+        lo = int(np.searchsorted(self.keys, key, "left"))
+        hi = int(np.searchsorted(self.keys, key, "right"))
+        return lo + int(np.searchsorted(self.ids[lo:hi], product_id, "right"))
+
+    def bounds(self, low: Optional[Any] = None, high: Optional[Any] = None) -> Tuple[int, int]:
+        """Positions ``[start, end)`` of the entries with ``low <= key <= high``."""
+        start = int(np.searchsorted(self.keys, low, "left")) if low is not None else 0
+        end = int(np.searchsorted(self.keys, high, "right")) if high is not None else len(self.keys)
+        return start, end
+
+    def rebuild(self, rows: np.ndarray, key_column: np.ndarray, id_column: np.ndarray) -> None:
+        order = np.lexsort((id_column[rows], key_column[rows]))
+        self.rows = rows[order]
+        self.keys = key_column[self.rows]
+        self.ids = id_column[self.rows]
+        self.removed = []
+        self.added = set()
+
+    def sync(self, live_rows: Callable[[], np.ndarray], key_column: np.ndarray, id_column: np.ndarray) -> None:
+        """Merge queued writes; ``live_rows`` supplies every row for a full re-sort."""
+        pending = len(self.removed) + len(self.added)
+        if not pending:
+            return
+        if pending > REBUILD_FRACTION * len(self.rows):
+            # Bulk loads are cheaper to sort once than to merge entry by entry
+            self.rebuild(live_rows(), key_column, id_column)
+            return
+
+        if self.removed:
+            keys, ids = (np.array(column) for column in zip(*self.removed))
+            positions = self.positions(keys, ids)
+            self.keys = np.delete(self.keys, positions)
+            self.ids = np.delete(self.ids, positions)
+            self.rows = np.delete(self.rows, positions)
+            self.removed = []
+
+        if self.added:
+            rows = np.fromiter(self.added, dtype=np.int64)
+            keys, ids = key_column[rows], id_column[rows]
+            order = np.lexsort((ids, keys))
+            rows, keys, ids = rows[order], keys[order], ids[order]
+            # Positions are relative to the current arrays; equal positions
+            # keep the (key, id) order established above
+            positions = self.positions(keys, ids)
+            self.keys = np.insert(self.keys, positions, keys)
+            self.ids = np.insert(self.ids, positions, ids)
+            self.rows = np.insert(self.rows, positions, rows)
+            self.added = set()
+
+
+class ColumnarProductStore:
+    """NumPy columns for price/stock/category/status plus id, bitmap and sorted indexes."""
+
+    def __init__(self, categories: Sequence[Any], statuses: Sequence[Any], capacity: int = INITIAL_CAPACITY):
+        self.categories = list(categories)
+        self.statuses = list(statuses)
+        self.category_codes = {value: code for code, value in enumerate(self.categories)}
+        self.status_codes = {value: code for code, value in enumerate(self.statuses)}
+
+        self.size = 0
+        self.live = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.stock = np.zeros(capacity, dtype=np.int64)
+        self.category = np.zeros(capacity, dtype=np.int16)
+        self.status = np.zeros(capacity, dtype=np.int16)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.products: List[Optional[Any]] = []
+        self.row_of: Dict[int, int] = {}
+
+        self.category_bitmaps = np.zeros((len(self.categories), capacity), dtype=bool)
+        self.status_bitmaps = np.zeros((len(self.statuses), capacity), dtype=bool)
+        self.category_counts = np.zeros(len(self.categories), dtype=np.int64)
+        self.status_counts = np.zeros(len(self.statuses), dtype=np.int64)
+
+        # Rows sorted by (price, id) and by id, for range filters and keyset pages
+        self.price_index = SortedIndex(np.float64)
+        self.id_index = SortedIndex(np.int64)
+
+    def __len__(self) -> int:
+        return self.live
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self.row_of
+
+    def _grow(self) -> None:
+        capacity = max(INITIAL_CAPACITY, len(self.ids) * 2)
+        for name in COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+        for name in ("category_bitmaps", "status_bitmaps"):
+            bitmaps = getattr(self, name)
+            grown = np.zeros((bitmaps.shape[0], capacity), dtype=bool)
+            grown[:, :bitmaps.shape[1]] = bitmaps
+            setattr(self, name, grown)
+
+    # Writes
+
+    def _unindex(self, row: int) -> None:
+        """Drop a live row from the bitmaps and queue its price entry for removal."""
+        category, status = self.category[row], self.status[row]
+        self.category_bitmaps[category, row] = False
+        self.status_bitmaps[status, row] = False
+        self.category_counts[category] -= 1
+        self.status_counts[status] -= 1
+        self.price_index.remove(row, float(self.prices[row]), int(self.ids[row]))
+
+    def upsert(self, product: Any) -> int:
+        """Insert or replace a product in place; returns its row."""
+        row = self.row_of.get(product.id)
+        if row is None:
+            if self.size == len(self.ids):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.live += 1
+            self.products.append(product)
+            self.row_of[product.id] = row
+            self.id_index.add(row)
+        else:
+            self._unindex(row)
+            self.products[row] = product
+
+        category = self.category_codes[product.category]
+        status = self.status_codes[product.status]
+        self.ids[row] = product.id
+        self.prices[row] = product.price
+        self.stock[row] = product.stock_quantity
+        self.category[row] = category
+        self.status[row] = status
+        self.alive[row] = True
+
+        self.category_bitmaps[category, row] = True
+        self.status_bitmaps[status, row] = True
+        self.category_counts[category] += 1
+        self.status_counts[status] += 1
+        self.price_index.add(row)
+        return row
+
+    def remove(self, product_id: int) -> Optional[int]:
+        """Tombstone a product; returns the freed row, or None when it did not exist."""
+        row = self.row_of.pop(product_id, None)
+        if row is None:
+            return None
+        self._unindex(row)
+        self.id_index.remove(row, product_id, product_id)
+        self.alive[row] = False
+        self.products[row] = None
+        self.live -= 1
+        return row
+
+    # Price index
+
+    def _live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive[:self.size])
+
+    def sorted_index(self, order: str) -> SortedIndex:
+        """The ``"id"`` or ``"price"`` index, with queued writes merged."""
+        if order == "price":
+            self.price_index.sync(self._live_rows, self.prices, self.ids)
+            return self.price_index
+        if order == "id":
+            self.id_index.sync(self._live_rows, self.ids, self.ids)
+            return self.id_index
+        raise ValueError(f"Unknown order {order!r}, expected one of {ORDERS}")
+
+    def price_range(self, min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """Rows with a price in ``[min_price, max_price]``, ordered by ``(price, id)``."""
+        index = self.sorted_index("price")
+        start, end = index.bounds(min_price, max_price)
+        return index.rows[start:end]
+
+    def seek(self, order: str, limit: int, after: Optional[Tuple[Any, int]] = None,
+             category: Optional[Any] = None, status: Optional[Any] = None,
+             min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """Up to ``limit`` matching rows in ``order``, strictly after the ``(key, id)`` in ``after``.
+
+        Walks the sorted index from the cursor position and stops once the
+        page is full, so the cost follows the page size (divided by the
+        filters' selectivity) rather than the catalog size.
+        """
+        index = self.sorted_index(order)
+        if order == "price":
+            start, end = index.bounds(min_price, max_price)
+            # The window already applies the price range
+            min_price = max_price = None
+        else:
+            start, end = 0, len(index)
+        if after is not None:
+            start = max(start, index.after(*after))
+
+        found: List[np.ndarray] = []
+        remaining = limit
+        step = max(2 * limit, 64)
+        while remaining > 0 and start < end:
+            chunk = index.rows[start:min(start + step, end)]
+            rows = self.restrict(chunk, category=category, status=status,
+                                 min_price=min_price, max_price=max_price)[:remaining]
+            found.append(rows)
+            remaining -= len(rows)
+            start += len(chunk)
+            step *= 2
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    # Reads
+
+    def _bitmap(self, category: Optional[Any], status: Optional[Any]) -> Optional[np.ndarray]:
+        """AND of the requested category/status bitmaps over ``[0, size)``, or None without filters."""
+        bitmap = None
+        if category is not None:
+            bitmap = self.category_bitmaps[self.category_codes[category], :self.size]
+        if status is not None:
+            status_bitmap = self.status_bitmaps[self.status_codes[status], :self.size]
+            bitmap = status_bitmap if bitmap is None else bitmap & status_bitmap
+        return bitmap
+
+    def mask(self, category: Optional[Any] = None, status: Optional[Any] = None,
+             min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """Boolean mask over rows ``[0, size)`` of live products matching every filter."""
+        bitmap = self._bitmap(category, status)
+        mask = self.alive[:self.size].copy() if bitmap is None else bitmap.copy()
+        if min_price is not None:
+            mask &= self.prices[:self.size] >= min_price
+        if max_price is not None:
+            mask &= self.prices[:self.size] <= max_price
+        return mask
+
+    def select(self, category: Optional[Any] = None, status: Optional[Any] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """Matching rows in insertion order, resolved by index intersection."""
+        if min_price is None and max_price is None:
+            bitmap = self._bitmap(category, status)
+            return np.flatnonzero(self.alive[:self.size] if bitmap is None else bitmap)
+
+        rows = self.price_range(min_price, max_price)
+        bitmap = self._bitmap(category, status)
+        if bitmap is not None:
+            rows = rows[bitmap[rows]]
+        return np.sort(rows)
+
+    def matches(self, rows: np.ndarray, category: Optional[Any] = None, status: Optional[Any] = None,
+                min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """Boolean mask over the given rows, true where the row matches every filter."""
+        keep = np.ones(len(rows), dtype=bool)
+        if category is not None:
+            keep &= self.category_bitmaps[self.category_codes[category], rows]
+        if status is not None:
+            keep &= self.status_bitmaps[self.status_codes[status], rows]
+        if min_price is not None:
+            keep &= self.prices[rows] >= min_price
+        if max_price is not None:
+            keep &= self.prices[rows] <= max_price
+        return keep
+
+    def restrict(self, rows: np.ndarray, category: Optional[Any] = None, status: Optional[Any] = None,
+                 min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """The given rows that match every filter, in their given order; cost scales with ``len(rows)``."""
+        if category is None and status is None and min_price is None and max_price is None:
+            return rows
+        return rows[self.matches(rows, category=category, status=status, min_price=min_price, max_price=max_price)]
+
+    def head(self, limit: int, category: Optional[Any] = None, status: Optional[Any] = None,
+             offset: int = 0, chunk_size: int = 4096) -> np.ndarray:
+        """First ``limit`` matching rows in insertion order after skipping ``offset`` matches.
+
+        Scans only as far as needed: chunks lying wholly inside the offset
+        are only counted, and the scan stops once the page is full.
+        """
+        found: List[np.ndarray] = []
+        remaining = limit
+        skip = offset
+        for start in range(0, self.size, chunk_size):
+            end = min(start + chunk_size, self.size)
+            window = self.alive[start:end]
+            if category is not None:
+                window = window & self.category_bitmaps[self.category_codes[category], start:end]
+            if status is not None:
+                window = window & self.status_bitmaps[self.status_codes[status], start:end]
+            if skip:
+                matched = int(np.count_nonzero(window))
+                if matched <= skip:
+                    skip -= matched
+                    continue
+                rows = np.flatnonzero(window)[skip:skip + remaining] + start
+                skip = 0
+            else:
+                rows = np.flatnonzero(window)[:remaining] + start
+            found.append(rows)
+            remaining -= len(rows)
+            if remaining <= 0:
+                break
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def facets(self, rows: np.ndarray, price_edges: Sequence[float] = ()) -> Dict[str, Any]:
+        """Counts per category, per status and per price bucket over the given rows.
+
+        Bucket ``i`` holds prices in ``[edges[i - 1], edges[i])``, with open
+        first and last buckets, so there are ``len(price_edges) + 1`` counts.
+        """
+        categories = np.bincount(self.category[rows], minlength=len(self.categories))
+        statuses = np.bincount(self.status[rows], minlength=len(self.statuses))
+        buckets = np.bincount(np.digitize(self.prices[rows], price_edges), minlength=len(price_edges) + 1)
+        return {
+            "category": {value: int(n) for value, n in zip(self.categories, categories)},
+            "status": {value: int(n) for value, n in zip(self.statuses, statuses)},
+            "price": [int(n) for n in buckets],
+        }
+
+    def count(self, category: Optional[Any] = None, status: Optional[Any] = None,
+              min_price: Optional[float] = None, max_price: Optional[float] = None) -> int:
+        """Number of matching products, from index cardinalities where possible."""
+        if min_price is None and max_price is None:
+            if category is None and status is None:
+                return self.live
+            if status is None:
+                return int(self.category_counts[self.category_codes[category]])
+            if category is None:
+                return int(self.status_counts[self.status_codes[status]])
+            return int(np.count_nonzero(self._bitmap(category, status)))
+
+        rows = self.price_range(min_price, max_price)
+        bitmap = self._bitmap(category, status)
+        return int(np.count_nonzero(bitmap[rows])) if bitmap is not None else len(rows)
+
+    def rows_for(self, product_ids: Sequence[int]) -> np.ndarray:
+        """Rows of the given products, in the given order; unknown ids are skipped."""
+        row_of = self.row_of
+        return np.fromiter((row_of[i] for i in product_ids if i in row_of), dtype=np.int64)
+
+    def get(self, product_id: int) -> Optional[Any]:
+        row = self.row_of.get(product_id)
+        return self.products[row] if row is not None else None
+
+    def products_at(self, rows: Sequence[int]) -> List[Any]:
+        products = self.products
+        return [products[row] for row in rows]
+
+    def __iter__(self) -> Iterator[Any]:
+        return (product for product in self.products if product is not None)
+
+    def compact(self) -> None:
+        """Drop tombstones, keeping insertion order; row numbers change and indexes are rebuilt."""
+        keep = np.flatnonzero(self.alive[:self.size])
+        capacity = max(INITIAL_CAPACITY, len(keep) * 2)
+        for name in COLUMNS:
+            column = getattr(self, name)
+            compacted = np.zeros(capacity, dtype=column.dtype)
+            compacted[:len(keep)] = column[keep]
+            setattr(self, name, compacted)
+        self.products = [self.products[row] for row in keep]
+        self.row_of = {product.id: row for row, product in enumerate(self.products)}
+        self.size = self.live = len(keep)
+
+        rows = np.arange(self.size)
+        self.category_bitmaps = np.zeros((len(self.categories), capacity), dtype=bool)
+        self.status_bitmaps = np.zeros((len(self.statuses), capacity), dtype=bool)
+        self.category_bitmaps[self.category[:self.size], rows] = True
+        self.status_bitmaps[self.status[:self.size], rows] = True
+        self.price_index.rebuild(rows, self.prices, self.ids)
+        self.id_index.rebuild(rows, self.ids, self.ids)
+
+
+__all__ = [
+    "ColumnarProductStore",
+    "ORDERS",
+    "SortedIndex",
+]
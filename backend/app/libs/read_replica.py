@@ -0,0 +1,84 @@
+"""Connections for read-only queries, optionally served by a read replica.
+
+When READ_REPLICA_DATABASE_URL is set, read-only endpoints get connections
+from a separate asyncpg pool pointed at the replica. Otherwise they fall back
+to the primary pool behind ``db_manager``.
+
+The driver and the primary pool are imported on first use, so importing
+this module needs neither asyncpg nor a configured primary database.
+
+Usage:
+
+    from app.libs.read_replica import read_pool
+
+    async with read_pool.get_connection() as conn:
+        await conn.fetch("SELECT ...")
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+READ_REPLICA_DATABASE_URL = os.environ.get("READ_REPLICA_DATABASE_URL")
+READ_REPLICA_POOL_MIN_SIZE = int(os.environ.get("READ_REPLICA_POOL_MIN_SIZE", "1"))
+READ_REPLICA_POOL_MAX_SIZE = int(os.environ.get("READ_REPLICA_POOL_MAX_SIZE", "10"))
+
+
+class ReadPool:
+    """Lazily created replica pool with a primary fallback."""
+
+    def __init__(self, dsn: Optional[str] = READ_REPLICA_DATABASE_URL, fallback: Any = None):
+        self.dsn = dsn
+        self._fallback = fallback
+        self.pool: Optional[Any] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def fallback(self) -> Any:
+        """The primary pool manager, ``db_manager`` unless one was given."""
+        if self._fallback is None:
+            from app.libs.database import db_manager
+            self._fallback = db_manager
+        return self._fallback
+
+    @property
+    def uses_replica(self) -> bool:
+        return bool(self.dsn)
+
+    async def _get_pool(self) -> Any:
+        if self.pool is None:
+            async with self._lock:
+                if self.pool is None:
+                    import asyncpg
+
+                    self.pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=READ_REPLICA_POOL_MIN_SIZE,
+                        max_size=READ_REPLICA_POOL_MAX_SIZE
+                    )
+        return self.pool
+
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncIterator[Any]:
+        if not self.dsn:
+            async with self.fallback.get_connection() as conn:
+                yield conn
+            return
+
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            yield conn
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+
+read_pool = ReadPool()
+
+__all__ = [
+    "ReadPool",
+    "read_pool",
+]
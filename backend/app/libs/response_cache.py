@@ -0,0 +1,102 @@
+"""Conditional GET for read endpoints: version-based ETags and a cache of encoded bodies.
+
+An ETag is derived from a data version plus the endpoint and its query
+parameters, so it can be computed before any work is done. A request whose
+``If-None-Match`` already names it gets ``304 Not Modified``; otherwise the
+encoded body is served from an LRU keyed by the same ETag, and only a miss
+builds the response models and encodes them. Bumping the version on every
+write makes all earlier ETags (and cache entries) unreachable.
+
+Usage:
+
+    from app.libs.response_cache import ResponseCache, conditional_json_response
+
+    cache = ResponseCache(max_entries=1024)
+    etag = cache.etag(catalog_version, "v1.products", {"page": 1, "category": None})
+    return conditional_json_response(if_none_match, etag, cache, lambda: build().model_dump_json().encode())
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from fastapi import Response, status
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag, as RFC 9110 requires."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+class ResponseCache:
+    """LRU of encoded response bodies keyed by ETag."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def etag(version: str, view: str, params: Mapping[str, Any]) -> str:
+        canonical = json.dumps({"view": view, "params": params}, sort_keys=True, default=str, separators=(",", ":"))
+        digest = hashlib.sha256(canonical.encode()).hexdigest()[:16]
+        return f'"{version}-{digest}"'
+
+    def get(self, etag: str) -> Optional[bytes]:
+        body = self._bodies.get(etag)
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._bodies.move_to_end(etag)
+        return body
+
+    def put(self, etag: str, body: bytes) -> None:
+        self._bodies[etag] = body
+        self._bodies.move_to_end(etag)
+        while len(self._bodies) > self.max_entries:
+            self._bodies.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._bodies),
+            "bytes": sum(len(body) for body in self._bodies.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
+
+
+def conditional_json_response(if_none_match: Optional[str], etag: str, cache: ResponseCache,
+                              render: Callable[[], bytes]) -> Response:
+    """304 when the client's copy is current, else the cached or freshly rendered JSON body."""
+    # no-cache: clients may store the body but must revalidate it each time
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        cache.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = cache.get(etag)
+    if body is None:
+        body = render()
+        cache.put(etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+__all__ = [
+    "RESPONSE_CACHE_SIZE",
+    "ResponseCache",
+    "conditional_json_response",
+    "etag_matches",
+]
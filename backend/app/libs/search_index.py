@@ -0,0 +1,355 @@
+"""In-memory inverted index with BM25 ranking and AND/OR queries.
+
+Documents are integer ids with a few weighted text fields. Each token keeps
+a posting list of ``{doc_id: weighted term frequency}``, so a query only
+touches the documents containing its terms instead of scanning every
+document's text. Adding, replacing or removing a document updates only its
+own postings.
+
+Query syntax: whitespace-separated terms are ANDed; ``OR`` (or ``|``)
+separates alternatives, so ``wireless headphones OR webcam`` means
+``(wireless AND headphones) OR webcam``.
+
+Matching is per token, which differs from the substring scan this replaced:
+
+- Text is split into lower-cased alphanumeric tokens, so a query term never
+  spans punctuation or whitespace (``usb-c`` is the two terms ``usb`` and
+  ``c``), and multi-word queries match the words in any order.
+- A term matches every token containing it: ``head`` and ``phones`` both
+  find ``headphones``. Terms shorter than three characters only match
+  tokens they start, so ``c`` finds ``cable`` but not ``mic``.
+- Exact token matches score higher than partial ones. Expansion is never
+  truncated: every containing token in the vocabulary is matched.
+
+Usage:
+
+    from app.libs.search_index import InvertedIndex
+
+    index = InvertedIndex(field_weights={"name": 2.0, "description": 1.0})
+    index.add(1, {"name": "Running Shoes", "description": "Lightweight ..."})
+    index.search("running OR yoga")  # [(doc_id, score), ...] best first
+"""
+
+import math
+import re
+from bisect import bisect_left
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# BM25 defaults from the literature
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Terms at least this long also match tokens containing them, via trigrams
+MIN_INFIX_LENGTH = 3
+
+# Query terms matching more tokens than this are never expanded into a
+# token list when other terms of the query narrow the candidates first
+MAX_LISTED_EXPANSIONS = 256
+
+# Above this many vocabulary changes since the last lookup, the sorted
+# vocabulary is rebuilt in one sort instead of patched token by token
+VOCABULARY_REBUILD_THRESHOLD = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric runs; punctuation and whitespace separate tokens."""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def trigrams(token: str) -> Set[str]:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def parse_query(query: str) -> List[List[str]]:
+    """Split a query into OR-groups of AND-ed tokens."""
+    groups: List[List[str]] = [[]]
+    for word in query.split():
+        if word in ("OR", "|"):
+            if groups[-1]:
+                groups.append([])
+        elif word in ("AND", "&"):
+            continue
+        else:
+            groups[-1].extend(tokenize(word))
+    return [group for group in groups if group]
+
+
+class InvertedIndex:
+    """Token -> postings index over weighted document fields, ranked with BM25."""
+
+    def __init__(self, field_weights: Optional[Mapping[str, float]] = None,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.field_weights = dict(field_weights or {})
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.doc_terms: Dict[int, Dict[str, float]] = {}
+        self.doc_lengths: Dict[int, float] = {}
+        self.total_length = 0.0
+        # Sorted vocabulary for prefix lookups. Tokens added or removed since
+        # the last lookup are queued and merged in lazily, so building the
+        # index is not quadratic in the vocabulary size.
+        self.vocabulary: List[str] = []
+        self._added_tokens: List[str] = []
+        self._removed_tokens: List[str] = []
+        # Trigram -> vocabulary tokens containing it, for infix lookups
+        self.trigram_tokens: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self.doc_terms
+
+    def add(self, doc_id: int, fields: Mapping[str, str]) -> None:
+        """Index a document, replacing any previous version with the same id."""
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+
+        terms: Dict[str, float] = {}
+        for name, text in fields.items():
+            weight = self.field_weights.get(name, 1.0)
+            for token in tokenize(text):
+                terms[token] = terms.get(token, 0.0) + weight
+
+        length = sum(terms.values())
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for token, frequency in terms.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                self._added_tokens.append(token)
+                for trigram in trigrams(token):
+                    self.trigram_tokens.setdefault(trigram, set()).add(token)
+            postings[doc_id] = frequency
+
+    def remove(self, doc_id: int) -> None:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for token in terms:
+            postings = self.postings[token]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[token]
+                self._removed_tokens.append(token)
+                for trigram in trigrams(token):
+                    tokens = self.trigram_tokens[trigram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.trigram_tokens[trigram]
+
+    def _sorted_vocabulary(self) -> List[str]:
+        """The vocabulary in sorted order, with queued additions and removals applied."""
+        if not self._added_tokens and not self._removed_tokens:
+            return self.vocabulary
+        vocabulary = self.vocabulary
+        if len(self._added_tokens) + len(self._removed_tokens) > VOCABULARY_REBUILD_THRESHOLD:
+            vocabulary[:] = sorted(self.postings)
+        else:
+            # A token may have been removed and added again while queued, so
+            # check each against the postings
+            for token in self._removed_tokens:
+                i = bisect_left(vocabulary, token)
+                if i < len(vocabulary) and vocabulary[i] == token and token not in self.postings:
+                    del vocabulary[i]
+            for token in self._added_tokens:
+                i = bisect_left(vocabulary, token)
+                if (i == len(vocabulary) or vocabulary[i] != token) and token in self.postings:
+                    vocabulary.insert(i, token)
+        self._added_tokens.clear()
+        self._removed_tokens.clear()
+        return vocabulary
+
+    def _prefix_range(self, term: str) -> Tuple[List[str], int, int]:
+        """The sorted vocabulary and the slice of it holding the tokens ``term`` starts."""
+        vocabulary = self._sorted_vocabulary()
+        # Tokens are [a-z0-9], so every token starting with ``term`` sorts below term + DEL
+        return vocabulary, bisect_left(vocabulary, term), bisect_left(vocabulary, term + "\x7f")
+
+    def _breadth(self, term: str) -> int:
+        """Upper bound on the number of tokens ``term`` matches, without listing them."""
+        _, start, end = self._prefix_range(term)
+        breadth = end - start
+        if len(term) >= MIN_INFIX_LENGTH:
+            breadth += min(len(self.trigram_tokens.get(trigram, ())) for trigram in trigrams(term))
+        return breadth
+
+    @staticmethod
+    def _matches(term: str, token: str) -> bool:
+        return token.startswith(term) or (len(term) >= MIN_INFIX_LENGTH and term in token)
+
+    def expand(self, term: str) -> List[str]:
+        """Every indexed token the term matches: itself, tokens it starts and tokens containing it."""
+        vocabulary, start, end = self._prefix_range(term)
+        expansions = vocabulary[start:end]
+        if len(term) < MIN_INFIX_LENGTH:
+            return expansions
+
+        # Tokens holding every trigram of the term, rarest trigram first, then
+        # checked for the term itself
+        candidate_sets = []
+        for trigram in trigrams(term):
+            tokens = self.trigram_tokens.get(trigram)
+            if not tokens:
+                return expansions
+            candidate_sets.append(tokens)
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0]).intersection(*candidate_sets[1:])
+        prefixed = set(expansions)
+        expansions.extend(sorted(t for t in candidates if term in t and t not in prefixed))
+        return expansions
+
+    def _score(self, term: str, tokens: Optional[List[str]], candidates: Set[int],
+               scores: Dict[int, float]) -> None:
+        """Add the BM25 contribution of one query term for each candidate to ``scores``.
+
+        ``tokens`` are the term's expansions; None means the term is broad and
+        its matches are found in the candidates' own terms instead.
+        """
+        doc_count = len(self.doc_terms)
+        average_length = self.total_length / doc_count if doc_count else 1.0
+        k1, b = self.k1, self.b
+        idfs: Dict[str, float] = {}
+        best: Dict[int, float] = {}
+
+        def idf(token: str) -> float:
+            if token not in idfs:
+                postings = self.postings[token]
+                value = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                # Partial matches count for less than the exact token
+                idfs[token] = value if token == term else value * 0.5
+            return idfs[token]
+
+        # Walk whichever side is smaller: the expansions' postings, or the
+        # candidates' own terms
+        if tokens is not None and len(tokens) <= len(candidates):
+            matched = []
+            for token in tokens:
+                postings = self.postings[token]
+                if len(postings) <= len(candidates):
+                    matched.extend((doc_id, token, f) for doc_id, f in postings.items() if doc_id in candidates)
+                else:
+                    matched.extend((doc_id, token, postings[doc_id]) for doc_id in candidates if doc_id in postings)
+        else:
+            token_set = set(tokens) if tokens is not None else None
+            matched = [
+                (doc_id, token, f)
+                for doc_id in candidates
+                for token, f in self.doc_terms[doc_id].items()
+                if (token in token_set if token_set is not None else self._matches(term, token))
+            ]
+        for doc_id, token, frequency in matched:
+            norm = 1 - b + b * self.doc_lengths[doc_id] / average_length
+            score = idf(token) * frequency * (k1 + 1) / (frequency + k1 * norm)
+            if score > best.get(doc_id, 0.0):
+                best[doc_id] = score
+        for doc_id, score in best.items():
+            scores[doc_id] = scores.get(doc_id, 0.0) + score
+
+    def _resolve_and(self, terms: List[str]) -> Tuple[Set[int], Dict[str, Optional[List[str]]]]:
+        """Documents matching every term, and each term's expansions (None if never listed).
+
+        Terms matching at most MAX_LISTED_EXPANSIONS tokens are expanded and
+        costed by their total postings; broader ones (a short prefix can
+        match thousands of tokens) are only listed when that is cheaper than
+        the postings of every listed term. The cheapest term seeds the
+        candidates. Each later term intersects them through its postings
+        while those are few, and otherwise is checked against the surviving
+        candidates' own terms, so a broad term's postings are never unioned.
+        """
+        costed = []
+        for term in terms:
+            breadth = self._breadth(term)
+            tokens = self.expand(term) if breadth <= MAX_LISTED_EXPANSIONS else None
+            if tokens is not None and not tokens:
+                return set(), {}
+            cost = sum(len(self.postings[t]) for t in tokens) if tokens is not None else math.inf
+            costed.append((cost, breadth, term, tokens))
+        # Listing a broad term costs about its breadth; worth it when that is
+        # still below the postings of the cheapest listed term. With no listed
+        # term the narrowest one has to be listed to seed the candidates
+        costed.sort(key=lambda item: item[:2])
+        seed_cost = costed[0][0]
+        for index, (cost, breadth, term, tokens) in enumerate(costed):
+            if tokens is None and (breadth < seed_cost or index == 0):
+                tokens = self.expand(term)
+                if not tokens:
+                    return set(), {}
+                cost = sum(len(self.postings[t]) for t in tokens)
+                costed[index] = (cost, breadth, term, tokens)
+                seed_cost = min(seed_cost, cost)
+        costed.sort(key=lambda item: item[:2])
+
+        expanded: Dict[str, Optional[List[str]]] = {}
+        candidates: Optional[Set[int]] = None
+        for cost, _, term, tokens in costed:
+            expanded[term] = tokens
+            if candidates is None:
+                candidates = set().union(*(self.postings[t].keys() for t in tokens))
+            # Checking a candidate costs one lookup per distinct term in it,
+            # which is a handful to a few dozen for product text
+            elif tokens is not None and cost <= len(candidates) * 8:
+                matched = set().union(*(self.postings[t].keys() for t in tokens)) if len(tokens) > 1 else self.postings[tokens[0]]
+                candidates = {doc_id for doc_id in candidates if doc_id in matched}
+            elif tokens is not None:
+                token_set = set(tokens)
+                candidates = {doc_id for doc_id in candidates if not token_set.isdisjoint(self.doc_terms[doc_id])}
+            else:
+                candidates = {
+                    doc_id for doc_id in candidates
+                    if any(self._matches(term, token) for token in self.doc_terms[doc_id])
+                }
+            if not candidates:
+                return set(), expanded
+        return candidates or set(), expanded
+
+    def match(self, query: str) -> Dict[int, float]:
+        """Score every document matching the query; unmatched documents are absent."""
+        results: Dict[int, float] = {}
+        for group in parse_query(query):
+            # Resolve the AND first, so only the surviving documents are scored
+            candidates, expanded = self._resolve_and(list(dict.fromkeys(group)))
+            if not candidates:
+                continue
+
+            scores: Dict[int, float] = {}
+            for term, tokens in expanded.items():
+                self._score(term, tokens, candidates, scores)
+            for doc_id, score in scores.items():
+                if score > results.get(doc_id, 0.0):
+                    results[doc_id] = score
+        return results
+
+    def search(self, query: str, limit: Optional[int] = None,
+               allowed: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Matching ``(doc_id, score)`` pairs, best first, ties broken by id."""
+        hits = self.match(query).items()
+        if allowed is not None:
+            hits = [(doc_id, score) for doc_id, score in hits if doc_id in allowed]
+        ranked = sorted(hits, key=lambda hit: (-hit[1], hit[0]))
+        return ranked[:limit] if limit is not None else ranked
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "documents": len(self.doc_terms),
+            "terms": len(self.postings),
+            "postings": sum(len(p) for p in self.postings.values()),
+            "average_length": round(self.total_length / len(self.doc_terms), 2) if self.doc_terms else 0.0
+        }
+
+
+__all__ = [
+    "InvertedIndex",
+    "MAX_LISTED_EXPANSIONS",
+    "MIN_INFIX_LENGTH",
+    "VOCABULARY_REBUILD_THRESHOLD",
+    "parse_query",
+    "tokenize",
+    "trigrams",
+]
@@ -0,0 +1,4 @@
+"""Benchmarks for the backend services.
+
+Run from the backend directory, e.g. ``python -m benchmarks.identify --help``.
+"""
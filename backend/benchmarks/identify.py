@@ -0,0 +1,297 @@
+"""Benchmark ContactReconciliationService.reconcile_contact_identity on synthetic graphs.
+
+Seeds an in-memory contact store with a power-law identity graph, then
+drives a mixed request stream through the service at a fixed concurrency
+and reports throughput, latency percentiles and storage round trips per
+request, overall and broken down by request kind and cluster size.
+
+Each storage call a Postgres backend would send to the server counts as a
+round trip (including BEGIN and COMMIT). ``--latency-ms`` adds that much
+simulated network delay per round trip, so lock contention and round-trip
+reductions show up in the numbers the way they would against a real
+database.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.identify --clusters 2000 --requests 20000 --concurrency 32 \\
+        --output bench/identify.json --compare bench/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+# Everything runs against the in-memory backend, so the shared storage the
+# app modules create on import must not reach for the Postgres driver
+os.environ.setdefault("CONTACT_STORAGE_BACKEND", "memory")
+
+from app.libs.contact_reconciliation import ContactReconciliationService
+from app.libs.contact_storage import ContactStorage, ContactTransaction
+from app.libs.contact_storage.memory import InMemoryContactStorage
+from app.libs.identity_events import EventBroker
+from app.libs.identity_index import IdentityIndex
+from app.libs.identity_locks import StripedLock
+from app.libs.identity_lookup import ClusterLookupCache
+from app.libs.models import ContactIdentifyRequest
+from benchmarks.synthetic_graphs import GraphConfig, IdentityGraph, StreamConfig
+
+# Round trips made by the request currently running in this task
+_round_trips: ContextVar[Optional[List[int]]] = ContextVar("benchmark_round_trips", default=None)
+
+
+class CountingTransaction(ContactTransaction):
+    def __init__(self, storage: "CountingStorage", tx: ContactTransaction):
+        self.storage = storage
+        self.tx = tx
+
+    async def lock_keys(self, stripes):
+        await self.storage.round_trip()
+        return await self.tx.lock_keys(stripes)
+
+    async def fetch_cluster(self, emails, phone_numbers):
+        await self.storage.round_trip()
+        return await self.tx.fetch_cluster(emails, phone_numbers)
+
+    async def insert_contacts(self, rows):
+        await self.storage.round_trip()
+        return await self.tx.insert_contacts(rows)
+
+    async def relink(self, links):
+        if not links:
+            return 0
+        await self.storage.round_trip()
+        return await self.tx.relink(links)
+
+    async def append_events(self, events):
+        if not events:
+            return []
+        await self.storage.round_trip()
+        return await self.tx.append_events(events)
+
+
+class CountingStorage:
+    """Wraps a ContactStorage, counting round trips and adding simulated latency."""
+
+    def __init__(self, inner: ContactStorage, latency_seconds: float = 0.0):
+        self.inner = inner
+        self.name = inner.name
+        self.latency_seconds = latency_seconds
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    async def round_trip(self) -> None:
+        counter = _round_trips.get()
+        if counter is not None:
+            counter[0] += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+    @asynccontextmanager
+    async def transaction(self):
+        await self.round_trip()  # BEGIN
+        async with self.inner.transaction() as tx:
+            yield CountingTransaction(self, tx)
+        await self.round_trip()  # COMMIT
+
+    async def read_cluster(self, emails, phone_numbers):
+        await self.round_trip()
+        return await self.inner.read_cluster(emails, phone_numbers)
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def size_bucket(size: int) -> str:
+    """Power-of-two bucket label such as ``1``, ``2-3`` or ``64-127``."""
+    if size <= 1:
+        return str(size)
+    low = 1 << (size.bit_length() - 1)
+    return f"{low}-{2 * low - 1}"
+
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = sorted(s["latency_ms"] for s in samples)
+    trips = sorted(s["round_trips"] for s in samples)
+    return {
+        "requests": len(samples),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0
+        },
+        "round_trips": {
+            "mean": round(sum(trips) / len(trips), 3) if trips else 0.0,
+            "p95": percentile(trips, 95),
+            "max": trips[-1] if trips else 0
+        }
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(graph_config: GraphConfig, stream_config: StreamConfig, concurrency: int = 16,
+                        latency_ms: float = 0.0, identity_index: bool = False) -> Dict[str, Any]:
+    """Seed a fresh store, replay the request stream and return the JSON-ready report."""
+    started = time.perf_counter()
+    graph = IdentityGraph(graph_config)
+    storage = CountingStorage(InMemoryContactStorage(), latency_ms / 1000)
+    await graph.seed(storage.inner)
+    seed_seconds = time.perf_counter() - started
+
+    index = None
+    if identity_index:
+        index = IdentityIndex()
+        await index.load(storage.inner)
+    service = ContactReconciliationService(
+        db=storage, locks=StripedLock(), lookup_cache=ClusterLookupCache(), events=EventBroker()
+    )
+    # Only --identity-index turns the index on, whatever IDENTITY_INDEX_ENABLED says
+    service.index = index
+
+    calls = iter(graph.stream(stream_config))
+    samples: List[Dict[str, Any]] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for call in calls:
+            counter = [0]
+            _round_trips.set(counter)
+            request = ContactIdentifyRequest(email=call.email, phone_number=call.phone_number)
+            begin = time.perf_counter()
+            try:
+                await service.reconcile_contact_identity(request)
+            except Exception:
+                errors += 1
+                continue
+            samples.append({
+                "kind": call.kind,
+                "cluster_size": call.cluster_size,
+                "latency_ms": (time.perf_counter() - begin) * 1000,
+                "round_trips": counter[0]
+            })
+
+    run_started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    run_seconds = time.perf_counter() - run_started
+
+    by_kind: Dict[str, List[Dict[str, Any]]] = {}
+    by_size: Dict[str, List[Dict[str, Any]]] = {}
+    for sample in samples:
+        by_kind.setdefault(sample["kind"], []).append(sample)
+        by_size.setdefault(size_bucket(sample["cluster_size"]), []).append(sample)
+
+    return {
+        "benchmark": "identify",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            "graph": asdict(graph_config),
+            "stream": asdict(stream_config),
+            "concurrency": concurrency,
+            "latency_ms": latency_ms,
+            "identity_index": identity_index,
+            "storage": storage.name
+        },
+        "graph": {
+            "clusters": len(graph.clusters),
+            "contacts": graph.contacts,
+            "largest_cluster": max((len(c.pairs) for c in graph.clusters), default=0),
+            "seed_seconds": round(seed_seconds, 3)
+        },
+        "results": {
+            **summarize(samples),
+            "errors": errors,
+            "seconds": round(run_seconds, 3),
+            "throughput_rps": round(len(samples) / run_seconds, 1) if run_seconds else 0.0,
+            "by_kind": {kind: summarize(group) for kind, group in sorted(by_kind.items())},
+            "by_cluster_size": {
+                bucket: summarize(group)
+                for bucket, group in sorted(by_size.items(), key=lambda item: int(item[0].split("-")[0]))
+            }
+        }
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Human-readable deltas of the headline metrics against a baseline report."""
+    def delta(new: float, old: float) -> str:
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    new, old = report["results"], baseline["results"]
+    lines = [f"Compared with {baseline.get('commit') or 'baseline'}:"]
+    lines.append(f"  throughput_rps  {old['throughput_rps']:>10} -> {new['throughput_rps']:>10}  "
+                 f"{delta(new['throughput_rps'], old['throughput_rps'])}")
+    for key in ("p50", "p95", "p99"):
+        lines.append(f"  latency {key:<7} {old['latency_ms'][key]:>10} -> {new['latency_ms'][key]:>10}  "
+                     f"{delta(new['latency_ms'][key], old['latency_ms'][key])}")
+    lines.append(f"  round_trips     {old['round_trips']['mean']:>10} -> {new['round_trips']['mean']:>10}  "
+                 f"{delta(new['round_trips']['mean'], old['round_trips']['mean'])}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark identify reconciliation on synthetic identity graphs.")
+    parser.add_argument("--clusters", type=int, default=GraphConfig.clusters, help="Identities to seed")
+    parser.add_argument("--alpha", type=float, default=GraphConfig.alpha,
+                        help="Power-law exponent of cluster sizes; lower means more large clusters")
+    parser.add_argument("--max-cluster-size", type=int, default=GraphConfig.max_cluster_size)
+    parser.add_argument("--overlap", type=float, default=GraphConfig.overlap,
+                        help="Chance a new contact reuses an existing key instead of adding one")
+    parser.add_argument("--requests", type=int, default=StreamConfig.requests)
+    parser.add_argument("--merge-rate", type=float, default=StreamConfig.merge_rate)
+    parser.add_argument("--extend-rate", type=float, default=StreamConfig.extend_rate)
+    parser.add_argument("--new-rate", type=float, default=StreamConfig.new_rate)
+    parser.add_argument("--seed", type=int, default=GraphConfig.seed)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated delay per round trip")
+    parser.add_argument("--identity-index", action="store_true", help="Serve repeats from the identity index")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    args = parser.parse_args()
+
+    graph_config = GraphConfig(clusters=args.clusters, alpha=args.alpha, max_cluster_size=args.max_cluster_size,
+                               overlap=args.overlap, seed=args.seed)
+    stream_config = StreamConfig(requests=args.requests, merge_rate=args.merge_rate, extend_rate=args.extend_rate,
+                                 new_rate=args.new_rate, seed=args.seed + 1)
+    report = asyncio.run(run_benchmark(graph_config, stream_config, args.concurrency,
+                                       args.latency_ms, args.identity_index))
+
+    print(json.dumps(report["results"], indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(report, json.load(f))))
+
+
+if __name__ == "__main__":
+    main()
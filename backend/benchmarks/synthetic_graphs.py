@@ -0,0 +1,137 @@
+"""Synthetic identity graphs and request streams for reconciliation benchmarks.
+
+A graph is a set of clusters whose sizes follow a power law, so most
+identities have one or two contacts and a few have hundreds. Inside a
+cluster, ``overlap`` is the chance that a new contact reuses one of the
+cluster's existing keys instead of introducing a new one; higher overlap
+means denser clusters with fewer distinct emails and phones.
+
+The request stream mixes four kinds of /identify calls:
+
+- ``repeat``: an email/phone pair already stored (read only)
+- ``extend``: a new pair inside one cluster (one insert)
+- ``merge``: the email of one cluster with the phone of another (relinks)
+- ``new``: a brand-new identity (one insert)
+"""
+
+import random
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from app.libs.contact_storage import ContactStorage, NewContact
+
+ContactPair = Tuple[Optional[str], Optional[str]]
+
+
+@dataclass
+class GraphConfig:
+    clusters: int = 1000
+    alpha: float = 1.5
+    max_cluster_size: int = 500
+    overlap: float = 0.5
+    seed: int = 42
+
+
+@dataclass
+class StreamConfig:
+    requests: int = 5000
+    merge_rate: float = 0.05
+    extend_rate: float = 0.2
+    new_rate: float = 0.05
+    seed: int = 7
+
+
+@dataclass
+class SyntheticCluster:
+    emails: List[str] = field(default_factory=list)
+    phones: List[str] = field(default_factory=list)
+    pairs: List[ContactPair] = field(default_factory=list)
+
+
+@dataclass
+class IdentifyCall:
+    kind: str
+    email: Optional[str]
+    phone_number: Optional[str]
+    cluster_size: int
+
+
+def power_law_size(rng: random.Random, alpha: float, max_size: int) -> int:
+    """Pareto-distributed cluster size in ``[1, max_size]``."""
+    return min(int(rng.paretovariate(alpha)), max_size)
+
+
+class IdentityGraph:
+    """Deterministic synthetic contacts grouped into clusters."""
+
+    def __init__(self, config: GraphConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.clusters: List[SyntheticCluster] = []
+        self._keys = 0
+        for _ in range(config.clusters):
+            self.clusters.append(self._cluster(power_law_size(self.rng, config.alpha, config.max_cluster_size)))
+
+    def _email(self) -> str:
+        self._keys += 1
+        return f"user{self._keys}@bench.example"
+
+    def _phone(self) -> str:
+        self._keys += 1
+        return f"+1{5550000000 + self._keys}"
+
+    def _cluster(self, size: int) -> SyntheticCluster:
+        cluster = SyntheticCluster(emails=[self._email()], phones=[self._phone()])
+        cluster.pairs.append((cluster.emails[0], cluster.phones[0]))
+        seen = set(cluster.pairs)
+        while len(cluster.pairs) < size:
+            # Every contact shares at least one key with the cluster so it stays connected
+            if self.rng.random() < 0.5:
+                email = self.rng.choice(cluster.emails)
+                phone = self.rng.choice(cluster.phones) if self.rng.random() < self.config.overlap else self._phone()
+            else:
+                phone = self.rng.choice(cluster.phones)
+                email = self.rng.choice(cluster.emails) if self.rng.random() < self.config.overlap else self._email()
+            if (email, phone) in seen:
+                continue
+            if email not in cluster.emails:
+                cluster.emails.append(email)
+            if phone not in cluster.phones:
+                cluster.phones.append(phone)
+            seen.add((email, phone))
+            cluster.pairs.append((email, phone))
+        return cluster
+
+    @property
+    def contacts(self) -> int:
+        return sum(len(c.pairs) for c in self.clusters)
+
+    async def seed(self, storage: ContactStorage) -> None:
+        """Write every cluster as one primary plus direct secondaries."""
+        for cluster in self.clusters:
+            async with storage.transaction() as tx:
+                [primary] = await tx.insert_contacts([(*cluster.pairs[0], None)])
+                secondaries: List[NewContact] = [(*pair, primary.id) for pair in cluster.pairs[1:]]
+                if secondaries:
+                    await tx.insert_contacts(secondaries)
+
+    def stream(self, config: StreamConfig) -> Iterator[IdentifyCall]:
+        """Yield a reproducible mix of repeat, extend, merge and new identify calls."""
+        rng = random.Random(config.seed)
+        for _ in range(config.requests):
+            roll = rng.random()
+            if roll < config.new_rate:
+                yield IdentifyCall("new", self._email(), self._phone(), 0)
+                continue
+
+            cluster = rng.choice(self.clusters)
+            size = len(cluster.pairs)
+            if roll < config.new_rate + config.merge_rate and len(self.clusters) > 1:
+                other = rng.choice(self.clusters)
+                yield IdentifyCall("merge", rng.choice(cluster.emails), rng.choice(other.phones),
+                                   size + len(other.pairs))
+            elif roll < config.new_rate + config.merge_rate + config.extend_rate:
+                yield IdentifyCall("extend", rng.choice(cluster.emails), self._phone(), size)
+            else:
+                email, phone = rng.choice(cluster.pairs)
+                yield IdentifyCall("repeat", email, phone, size)
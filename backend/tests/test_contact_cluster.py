@@ -0,0 +1,169 @@
+import asyncio
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from app.libs.contact_cluster import group_components, plan_component, select_primary
+from app.libs.contact_reconciliation import ContactReconciliationService
+from app.libs.contact_storage.memory import InMemoryContactStorage
+from app.libs.disjoint_set import DisjointSet
+from app.libs.identity_events import EventBroker
+from app.libs.identity_locks import StripedLock
+from app.libs.identity_lookup import ClusterLookupCache
+from app.libs.models import Contact, ContactIdentifyRequest, LinkPrecedence
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _contact(contact_id, email=None, phone_number=None, linked_id=None, minutes=0):
+    return Contact(
+        id=contact_id, email=email, phone_number=phone_number, linked_id=linked_id,
+        link_precedence=LinkPrecedence.SECONDARY if linked_id else LinkPrecedence.PRIMARY,
+        created_at=T0 + timedelta(minutes=minutes), updated_at=T0
+    )
+
+
+def _service():
+    return ContactReconciliationService(
+        db=InMemoryContactStorage(), locks=StripedLock(64), lookup_cache=ClusterLookupCache(), events=EventBroker()
+    )
+
+
+class SelectPrimaryTest(unittest.TestCase):
+    def test_select_primary_prefers_the_oldest_primary(self):
+        older_secondary = _contact(1, "a@x.com", linked_id=3, minutes=0)
+        primary = _contact(2, "b@x.com", minutes=1)
+        newer_primary = _contact(3, "c@x.com", minutes=2)
+        self.assertEqual(select_primary([newer_primary, older_secondary, primary]).id, 2)
+
+    def test_primaries_tie_break_on_id(self):
+        first = _contact(4, "a@x.com")
+        second = _contact(5, "b@x.com")
+        self.assertEqual(select_primary([second, first]).id, 4)
+
+
+class DisjointSetTest(unittest.TestCase):
+    def test_union_find_and_groups(self):
+        ds = DisjointSet()
+        ds.union("a", "b")
+        ds.union("c", "d")
+        ds.union("b", "d")
+        ds.add("e")
+        self.assertEqual(len({ds.find(x) for x in "abcd"}), 1)
+        self.assertNotEqual(ds.find("a"), ds.find("e"))
+        self.assertEqual(ds.groups(["e", "a", "c", "e"]), [["e", "e"], ["a", "c"]])
+        self.assertEqual(len(ds), 5)
+
+    def test_find_adds_unseen_items_and_union_is_idempotent(self):
+        ds = DisjointSet()
+        self.assertEqual(ds.find("x"), "x")
+        self.assertIn("x", ds)
+        root = ds.union("x", "y")
+        self.assertEqual(ds.union("y", "x"), root)
+        self.assertEqual(ds.size[root], 2)
+
+
+class PlanComponentTest(unittest.TestCase):
+    def test_components_join_through_keys_and_links(self):
+        requests = [
+            ContactIdentifyRequest(email="a@x.com"),
+            ContactIdentifyRequest(phone_number="2"),
+            ContactIdentifyRequest(email="z@x.com"),
+            ContactIdentifyRequest(email="a@x.com", phone_number="9"),
+        ]
+        # a@x.com and phone 2 only meet through the link 2 -> 1
+        contacts = [_contact(1, "a@x.com", "1"), _contact(2, "b@x.com", "2", linked_id=1, minutes=1)]
+        components = group_components(requests, contacts)
+        self.assertEqual([indexes for indexes, _ in components], [[0, 1, 3], [2]])
+        self.assertEqual(sorted(c.id for c in components[0][1]), [1, 2])
+        self.assertEqual(components[1][1], [])
+
+    def test_plan_adds_unseen_pairs_once_and_relinks_to_the_oldest_primary(self):
+        existing = [
+            _contact(1, "a@x.com", "1"),
+            _contact(2, "b@x.com", "2", minutes=1),
+            _contact(3, "c@x.com", "3", linked_id=2, minutes=2),
+        ]
+        requests = [
+            ContactIdentifyRequest(email="a@x.com", phone_number="2"),
+            ContactIdentifyRequest(email="a@x.com", phone_number="1"),
+            ContactIdentifyRequest(email="a@x.com", phone_number="2"),
+        ]
+        plan = plan_component(requests, [0, 1, 2], existing)
+        self.assertEqual(plan.primary.id, 1)
+        self.assertEqual(plan.new_contacts, [("a@x.com", "2")])
+        self.assertEqual(plan.relink_ids, [2, 3])
+
+    def test_new_component_has_no_primary_yet(self):
+        requests = [ContactIdentifyRequest(email="n@x.com"), ContactIdentifyRequest(email="n@x.com", phone_number="5")]
+        plan = plan_component(requests, [0, 1], [])
+        self.assertIsNone(plan.primary)
+        self.assertEqual(plan.new_contacts, [("n@x.com", None), ("n@x.com", "5")])
+        self.assertEqual(plan.relink_ids, [])
+
+
+class BatchEquivalenceTest(unittest.TestCase):
+    """A batch leaves the same clusters, and answers each request the same, as sending them one by one."""
+
+    @staticmethod
+    def _state(storage):
+        contacts = storage.contacts
+        keys = {c.id: (c.email, c.phone_number) for c in contacts.values()}
+        rows = [(keys[c.id], c.link_precedence.value, keys.get(c.linked_id)) for c in contacts.values()]
+        return sorted(rows, key=repr)
+
+    @staticmethod
+    def _described(storage, response):
+        """A response with contact ids replaced by their keys, which both runs share."""
+        key = lambda contact_id: (storage.contacts[contact_id].email, storage.contacts[contact_id].phone_number)
+        return (
+            key(response.primary_contact_id),
+            sorted(response.emails),
+            sorted(response.phone_numbers),
+            sorted((key(i) for i in response.secondary_contact_ids), key=repr)
+        )
+
+    def test_each_request_sees_the_cluster_as_of_its_own_turn(self):
+        requests = [
+            ContactIdentifyRequest(email="a@x.com", phone_number="1"),
+            ContactIdentifyRequest(email="b@x.com", phone_number="2"),
+            ContactIdentifyRequest(email="a@x.com", phone_number="2"),
+        ]
+        first, second, merged = asyncio.run(_service().reconcile_batch(requests))
+        self.assertEqual((first.emails, first.secondary_contact_ids), (["a@x.com"], []))
+        self.assertEqual((second.emails, second.secondary_contact_ids), (["b@x.com"], []))
+        self.assertNotEqual(second.primary_contact_id, first.primary_contact_id)
+        self.assertEqual(merged.primary_contact_id, first.primary_contact_id)
+        self.assertEqual(merged.emails, ["a@x.com", "b@x.com"])
+        self.assertEqual(len(merged.secondary_contact_ids), 2)
+
+    def test_random_batches_match_sequential_calls(self):
+        rng = random.Random(11)
+
+        async def run():
+            for _ in range(30):
+                requests = [
+                    ContactIdentifyRequest(
+                        email=rng.choice([None, *(f"u{i}@x.com" for i in range(6))]),
+                        phone_number=rng.choice([None, *(str(i) for i in range(6))])
+                    )
+                    for _ in range(rng.randint(1, 12))
+                ]
+                requests = [r for r in requests if r.email or r.phone_number]
+                if not requests:
+                    continue
+                batched, sequential = _service(), _service()
+                responses = await batched.reconcile_batch(requests)
+                expected = [await sequential.reconcile_contact_identity(request) for request in requests]
+                self.assertEqual(self._state(batched.db), self._state(sequential.db), requests)
+                self.assertEqual(
+                    [self._described(batched.db, r) for r in responses],
+                    [self._described(sequential.db, r) for r in expected],
+                    requests
+                )
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
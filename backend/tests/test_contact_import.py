@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+
+from app.libs.contact_import import ImportFormatError, import_contacts, iter_lines, iter_records
+
+
+async def _body(*parts):
+    for part in parts:
+        yield part
+
+
+class UnreachableDb:
+    """Parse errors must surface before the import opens a connection."""
+
+    def get_connection(self):
+        raise AssertionError("the database should not be touched")
+
+
+def _records(data, fmt="ndjson"):
+    async def collect():
+        return [record async for record in iter_records(iter_lines(_body(data)), fmt)]
+    return asyncio.run(collect())
+
+
+class ImportFormatTest(unittest.TestCase):
+    def test_valid_records(self):
+        records = _records(b'{"email": "a@x.com", "created_at": "2020-01-01T00:00:00Z"}\n\n{"phone_number": 123}')
+        self.assertEqual(records[0][0], "a@x.com")
+        self.assertEqual(records[0][2].isoformat(), "2020-01-01T00:00:00+00:00")
+        self.assertEqual(records[1], (None, "123", None))
+
+    def test_lines_split_across_chunks(self):
+        async def collect():
+            body = _body(b'{"email": "a@', b'x.com"}\n{"ema', b'il": "b@x.com"}')
+            return [r async for r in iter_records(iter_lines(body), "ndjson")]
+        self.assertEqual([r[0] for r in asyncio.run(collect())], ["a@x.com", "b@x.com"])
+
+    def test_malformed_records_name_their_line(self):
+        cases = [
+            (b'{"email": "a@x.com"}\nnot json', "Line 2:"),
+            (b'{"email": "a@x.com"}\n[1]', "Line 2: expected a JSON object"),
+            (b'"text"', "Line 1: expected a JSON object"),
+            (b'{"email": "a@x.com", "created_at": "yesterday"}', "Line 1:"),
+            (b'{"email": ["a@x.com"]}', "Line 1: email must be a string"),
+            (b'{"phone_number": true}', "Line 1: phone_number must be a string"),
+            (b'{"email": "a@x.com"}\n\xff\xfe', "Line 2: not valid UTF-8"),
+        ]
+        for data, message in cases:
+            with self.subTest(data=data):
+                with self.assertRaisesRegex(ImportFormatError, message):
+                    _records(data)
+
+    def test_csv_rows_are_checked_too(self):
+        records = _records(b"email,phone_number,created_at\na@x.com,1,2021-05-01\n", "csv")
+        self.assertEqual(records[0][:2], ("a@x.com", "1"))
+        with self.assertRaisesRegex(ImportFormatError, "Line 3:"):
+            _records(b"email,phone_number,created_at\na@x.com,1,\nb@x.com,2,not-a-date\n", "csv")
+
+    def test_import_rejects_bad_input_before_touching_the_database(self):
+        with self.assertRaisesRegex(ImportFormatError, "Line 2"):
+            asyncio.run(import_contacts(_body(b'{"email": "a@x.com"}\n[1]\n'), "ndjson", db=UnreachableDb()))
+        with self.assertRaisesRegex(ImportFormatError, "Unsupported format"):
+            asyncio.run(import_contacts(_body(b""), "xml", db=UnreachableDb()))
+
+
+if __name__ == "__main__":
+    unittest.main()
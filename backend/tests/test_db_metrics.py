@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.libs.db_metrics import InstrumentedRoute, route_metrics, timed_db_call
+
+
+async def _query():
+    async with timed_db_call("fetch"):
+        await asyncio.sleep(0)
+
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+@router.get("/plain")
+async def plain():
+    await _query()
+    return {"ok": True}
+
+
+@router.get("/stream")
+async def stream():
+    await _query()
+
+    async def body():
+        for _ in range(3):
+            await _query()
+            yield b"x\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+app = FastAPI()
+app.include_router(router)
+
+
+class InstrumentedRouteTest(unittest.TestCase):
+    def setUp(self):
+        route_metrics.routes.clear()
+        self.client = TestClient(app)
+
+    def test_plain_response_is_recorded_with_server_timing(self):
+        response = self.client.get("/plain")
+        self.assertIn('desc="1 queries"', response.headers["Server-Timing"])
+        self.assertEqual(route_metrics.routes["GET /plain"]["queries"].sum, 1)
+
+    def test_streamed_body_queries_count_toward_the_request(self):
+        response = self.client.get("/stream")
+        self.assertEqual(response.text, "x\nx\nx\n")
+        # The header leaves before the body, so it only sees the handler's query
+        self.assertIn('desc="1 queries"', response.headers["Server-Timing"])
+        histograms = route_metrics.routes["GET /stream"]
+        self.assertEqual(histograms["queries"].count, 1)
+        self.assertEqual(histograms["queries"].sum, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import unittest
+
+from app.libs.idempotency import IdempotencyCache, IdempotencyKeyConflict
+
+
+class FakeStore:
+    """In-memory stand-in for PostgresIdempotencyStore's claim protocol (no expiry)."""
+
+    def __init__(self, fail_complete: bool = False, fail_claim: bool = False):
+        self.rows = {}
+        self.fail_complete = fail_complete
+        self.fail_claim = fail_claim
+
+    async def claim(self, key, fingerprint, claim_seconds):
+        if self.fail_claim:
+            raise ConnectionError("store unavailable")
+        if key not in self.rows:
+            self.rows[key] = (fingerprint, None)
+            return None
+        return self.rows[key]
+
+    async def complete(self, key, fingerprint, response_json, ttl_seconds):
+        if self.fail_complete:
+            raise ConnectionError("store unavailable")
+        self.rows[key] = (fingerprint, response_json)
+
+    async def release(self, key, fingerprint):
+        if self.rows.get(key) == (fingerprint, None):
+            del self.rows[key]
+
+
+def make_cache(store=None):
+    return IdempotencyCache(store=store, encode=json.dumps, decode=json.loads)
+
+
+class IdempotencyCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def test_store_write_failure_still_returns_the_result(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"primary_contact_id": 1}
+
+        cache = make_cache(FakeStore(fail_complete=True))
+        self.assertEqual(await cache.run("k", "f", compute), {"primary_contact_id": 1})
+        self.assertEqual(await cache.run("k", "f", compute), {"primary_contact_id": 1})
+        self.assertEqual(len(calls), 1)
+
+    async def test_store_claim_failure_falls_back_to_in_process_dedup(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"primary_contact_id": 4}
+
+        store = FakeStore(fail_claim=True)
+        cache = make_cache(store)
+        self.assertEqual(await cache.run("k", "f", compute), {"primary_contact_id": 4})
+        self.assertEqual(await cache.run("k", "f", compute), {"primary_contact_id": 4})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(store.rows, {})
+
+    async def test_workers_sharing_a_store_compute_once(self):
+        store = FakeStore()
+        started, release = asyncio.Event(), asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            started.set()
+            await release.wait()
+            return {"primary_contact_id": 7}
+
+        # Two caches stand for two workers
+        first = asyncio.create_task(make_cache(store).run("k", "f", compute))
+        await started.wait()
+        second = asyncio.create_task(make_cache(store).run("k", "f", compute))
+        await asyncio.sleep(0.1)
+        self.assertFalse(second.done())
+
+        release.set()
+        self.assertEqual(await first, {"primary_contact_id": 7})
+        self.assertEqual(await asyncio.wait_for(second, timeout=5), {"primary_contact_id": 7})
+        self.assertEqual(len(calls), 1)
+
+    async def test_failed_computation_releases_the_claim(self):
+        store = FakeStore()
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def succeed():
+            return {"primary_contact_id": 3}
+
+        with self.assertRaises(RuntimeError):
+            await make_cache(store).run("k", "f", fail)
+        self.assertEqual(await make_cache(store).run("k", "f", succeed), {"primary_contact_id": 3})
+
+    async def test_waiter_recomputes_when_first_request_is_cancelled(self):
+        cache = make_cache()
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.Event().wait()
+
+        async def compute():
+            return {"primary_contact_id": 2}
+
+        first = asyncio.create_task(cache.run("k", "f", hang))
+        await started.wait()
+        waiter = asyncio.create_task(cache.run("k", "f", compute))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        self.assertEqual(await asyncio.wait_for(waiter, timeout=5), {"primary_contact_id": 2})
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+
+    async def test_reused_key_with_other_payload_conflicts(self):
+        cache = make_cache()
+
+        async def compute():
+            return {"primary_contact_id": 1}
+
+        await cache.run("k", "f", compute)
+        with self.assertRaises(IdempotencyKeyConflict):
+            await cache.run("k", "other", compute)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+
+from app.libs.contact_reconciliation import ContactReconciliationService
+from app.libs.contact_storage.memory import InMemoryContactStorage
+from app.libs.identity_locks import StripedLock
+from app.libs.models import ContactIdentifyRequest
+
+
+class GatedStorage(InMemoryContactStorage):
+    """Memory storage whose first transaction waits until the test opens the gate."""
+
+    def __init__(self):
+        super().__init__()
+        self.held = asyncio.Event()
+        self.gate = asyncio.Event()
+        self.gated = True
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with super().transaction() as tx:
+            if self.gated:
+                self.gated = False
+                self.held.set()
+                await self.gate.wait()
+            yield tx
+
+
+class PartitionTest(unittest.TestCase):
+    def test_groups_respect_cap_and_keep_shared_keys_together(self):
+        locks = StripedLock(stripes=1024)
+        keys = [(f"user{i}@example.com", f"+1555{i:06d}") for i in range(500)]
+        # Chain a few items through shared keys so they must stay together
+        keys += [("user1@example.com", "+1999000001"), ("other@example.com", "+1999000001")]
+
+        groups = locks.partition(keys, max_stripes=16)
+
+        self.assertEqual(sorted(i for indexes, _ in groups for i in indexes), list(range(len(keys))))
+        for indexes, stripes in groups:
+            self.assertEqual(indexes, sorted(indexes))
+            self.assertLessEqual(len(stripes), 16)
+            self.assertEqual(stripes, locks.stripes_for([keys[i][0] for i in indexes], [keys[i][1] for i in indexes]))
+        owner = {i: n for n, (indexes, _) in enumerate(groups) for i in indexes}
+        self.assertEqual(owner[1], owner[500])
+        self.assertEqual(owner[500], owner[501])
+
+    def test_oversized_connected_set_gets_its_own_group(self):
+        locks = StripedLock(stripes=1024)
+        keys = [("shared@example.com", f"+1555{i:06d}") for i in range(40)] + [("solo@example.com", None)]
+
+        groups = locks.partition(keys, max_stripes=8)
+
+        self.assertEqual([indexes for indexes, _ in groups], [list(range(40)), [40]])
+
+    def test_items_with_the_same_tag_stay_together(self):
+        locks = StripedLock(stripes=1024)
+        keys = [(f"user{i}@example.com", None) for i in range(30)]
+        tags = [None] * 30
+        tags[2] = tags[27] = "orphans-of-9"
+
+        groups = locks.partition(keys, max_stripes=4, together=tags)
+
+        owner = {i: n for n, (indexes, _) in enumerate(groups) for i in indexes}
+        self.assertEqual(owner[2], owner[27])
+        self.assertGreater(len(groups), 1)
+
+
+class BatchLockingTest(unittest.IsolatedAsyncioTestCase):
+    async def test_unrelated_single_request_is_not_blocked_by_a_large_batch(self):
+        service = ContactReconciliationService()
+        service.db = GatedStorage()
+        service.index = None
+        service.locks = StripedLock(stripes=1024)
+
+        batch = [ContactIdentifyRequest(email=f"batch{i}@example.com", phone_number=f"+1555{i:06d}")
+                 for i in range(2000)]
+        held_stripes = set(service.locks.partition([(r.email, r.phone_number) for r in batch])[0][1])
+        solo = next(
+            ContactIdentifyRequest(email=f"solo{i}@example.com")
+            for i in range(10000)
+            if not held_stripes & set(service.locks.stripes_for([f"solo{i}@example.com"], []))
+        )
+
+        batch_task = asyncio.create_task(service.reconcile_batch(batch))
+        await asyncio.wait_for(service.db.held.wait(), timeout=5)
+
+        # The batch is parked inside its first lock group's transaction
+        response = await asyncio.wait_for(service.reconcile_contact_identity(solo), timeout=5)
+        self.assertEqual(response.emails, [solo.email])
+        self.assertFalse(batch_task.done())
+
+        service.db.gate.set()
+        responses = await asyncio.wait_for(batch_task, timeout=30)
+        self.assertEqual([r.emails for r in responses], [[r.email] for r in batch])
+        self.assertEqual(len(service.db.contacts), len(batch) + 1)
+
+
+class ClusterStripeTest(unittest.IsolatedAsyncioTestCase):
+    async def test_requests_through_other_keys_wait_for_the_whole_cluster(self):
+        service = ContactReconciliationService(db=InMemoryContactStorage(), locks=StripedLock(stripes=1024))
+        service.index = None
+        locks = service.locks
+        email, phone = "a@example.com", next(
+            f"+1555{i:06d}" for i in range(10000)
+            if not set(locks.stripes_for([], [f"+1555{i:06d}"])) & set(locks.stripes_for(["a@example.com"], []))
+        )
+        await service.reconcile_contact_identity(ContactIdentifyRequest(email=email, phone_number=phone))
+
+        # Another request holds the phone's stripe; one arriving by email alone must wait for it
+        async with locks.acquire(locks.stripes_for([], [phone])):
+            task = asyncio.create_task(service.reconcile_contact_identity(
+                ContactIdentifyRequest(email=email, phone_number="+19990000000")
+            ))
+            await asyncio.sleep(0.05)
+            self.assertFalse(task.done())
+        response = await asyncio.wait_for(task, timeout=5)
+        self.assertEqual(response.phone_numbers, [phone, "+19990000000"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from app.libs.pagination import InvalidCursor, decode_cursor, encode_cursor, query_fingerprint
+
+
+class CursorTest(unittest.TestCase):
+    def test_round_trip(self):
+        fingerprint = query_fingerprint(sort="price", category="books")
+        cursor = encode_cursor("price", (19.99, 42), fingerprint, page=3)
+        decoded = decode_cursor(cursor, fingerprint)
+        self.assertEqual((decoded.order, decoded.after, decoded.page), ("price", (19.99, 42), 3))
+
+    def test_fingerprint_ignores_parameter_order(self):
+        self.assertEqual(query_fingerprint(a=1, b=None), query_fingerprint(b=None, a=1))
+        self.assertNotEqual(query_fingerprint(a=1), query_fingerprint(a=2))
+
+    def test_cursor_from_another_query_is_rejected(self):
+        cursor = encode_cursor("id", (5, 5), query_fingerprint(category="books"), page=2)
+        with self.assertRaisesRegex(InvalidCursor, "does not match"):
+            decode_cursor(cursor, query_fingerprint(category="toys"))
+
+    def test_malformed_cursors_are_rejected(self):
+        fingerprint = query_fingerprint()
+        for cursor in ("", "not-base64!", encode_cursor("id", (1, 1), fingerprint, 1)[:-4], "e30"):
+            with self.assertRaises(InvalidCursor, msg=cursor):
+                decode_cursor(cursor, fingerprint)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.apis.products as products_api
+from app.apis.products import ProductService
+from app.libs.response_cache import ResponseCache, conditional_json_response, etag_matches
+
+
+class EtagMatchTest(unittest.TestCase):
+    def test_weak_comparison_lists_and_wildcard(self):
+        self.assertTrue(etag_matches('"v1-abc"', '"v1-abc"'))
+        self.assertTrue(etag_matches('W/"v1-abc"', '"v1-abc"'))
+        self.assertTrue(etag_matches('"other", W/"v1-abc"', '"v1-abc"'))
+        self.assertTrue(etag_matches("*", '"v1-abc"'))
+        self.assertFalse(etag_matches('"v2-abc"', '"v1-abc"'))
+        self.assertFalse(etag_matches(None, '"v1-abc"'))
+
+
+class ConditionalResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(max_entries=2)
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        return b'{"ok":true}'
+
+    def test_current_etag_gets_304_without_rendering(self):
+        response = conditional_json_response('"e1"', '"e1"', self.cache, self.render)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], '"e1"')
+        self.assertEqual(self.renders, 0)
+
+    def test_bodies_are_rendered_once_per_etag(self):
+        for _ in range(3):
+            response = conditional_json_response(None, '"e1"', self.cache, self.render)
+            self.assertEqual(response.body, b'{"ok":true}')
+        self.assertEqual(self.renders, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_lru_evicts_the_least_recently_used_body(self):
+        for etag in ('"a"', '"b"', '"a"', '"c"'):
+            conditional_json_response(None, etag, self.cache, self.render)
+        self.assertIsNotNone(self.cache.get('"a"'))
+        self.assertIsNone(self.cache.get('"b"'))
+
+
+class ProductEndpointEtagTest(unittest.TestCase):
+    def setUp(self):
+        self.service = ProductService()
+        patches = [
+            mock.patch.object(products_api, "product_service", self.service),
+            mock.patch.object(products_api, "product_response_cache", ResponseCache()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        app = FastAPI()
+        app.include_router(products_api.router)
+        self.client = TestClient(app)
+
+    def assert_revalidates(self, path, params):
+        first = self.client.get(path, params=params)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+
+        again = self.client.get(path, params=params, headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+
+        # Any write bumps the catalog version and with it every ETag
+        product = self.service.get_product_by_id(1)
+        self.service.upsert_product(product.model_copy(update={"name": product.name + " (new)"}))
+        changed = self.client.get(path, params=params, headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+        return first.json(), changed.json()
+
+    def test_list_endpoints_revalidate(self):
+        for path, params in (
+            ("/api/v1/products", {"page_size": 3}),
+            ("/api/v1.1/products", {"sort": "price", "page_size": 3}),
+            ("/api/v2/products", {"page_size": 3}),
+        ):
+            with self.subTest(path=path):
+                before, after = self.assert_revalidates(path, params)
+                self.assertEqual(before["products"][0]["id"], after["products"][0]["id"])
+
+    def test_search_endpoints_revalidate(self):
+        for path, params in (
+            ("/api/v1.1/products/search", {"q": "a"}),
+            ("/api/v2/products/search", {"q": "a", "sort": "price"}),
+        ):
+            with self.subTest(path=path):
+                self.assert_revalidates(path, params)
+
+    def test_different_queries_get_different_etags(self):
+        a = self.client.get("/api/v1/products", params={"page": 1}).headers["ETag"]
+        b = self.client.get("/api/v1/products", params={"page": 2}).headers["ETag"]
+        self.assertNotEqual(a, b)
+
+    def test_cursor_pages_cover_the_catalog_once(self):
+        seen, params = [], {"page_size": 4, "sort": "price"}
+        while True:
+            page = self.client.get("/api/v2/products", params=params).json()
+            seen.extend((p["price"], p["id"]) for p in page["products"])
+            if not page["has_next"]:
+                break
+            params["cursor"] = page["next_cursor"]
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), len(self.service.store))
+
+    def test_foreign_cursor_is_400(self):
+        cursor = self.client.get("/api/v2/products", params={"page_size": 2}).json()["next_cursor"]
+        response = self.client.get("/api/v2/products", params={"page_size": 2, "category": "books", "cursor": cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_reads_are_refused_while_the_catalog_is_cold(self):
+        self.service.warm = False
+        for path, params in (
+            ("/api/v1.1/products", {"sort": "id"}),
+            ("/api/v1.1/products/search", {"q": "pro", "sort": "price"}),
+            ("/api/v2/products", {}),
+            ("/api/v2/products/search", {"q": "pro"}),
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(path, params=params)
+                self.assertEqual(response.status_code, 503)
+                self.assertIn("Retry-After", response.headers)
+                self.assertNotIn("ETag", response.headers)
+        self.assertEqual(products_api.product_response_cache.stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+
+from app.apis.products import ProductService
+from app.libs.product_import import bulk_upsert
+
+
+async def _body(*parts):
+    for part in parts:
+        yield part
+
+
+def _validate(record):
+    if not isinstance(record.get("id"), int):
+        raise ValueError("id must be an integer")
+    return record["id"]
+
+
+def _run(body, apply, chunk_size=2):
+    async def collect():
+        return [report async for report in bulk_upsert(body, _validate, apply, chunk_size)]
+    return asyncio.run(collect())
+
+
+class BulkUpsertTest(unittest.TestCase):
+    def test_invalid_rows_are_reported_and_the_rest_applied(self):
+        applied = []
+
+        async def apply(rows):
+            applied.append(rows)
+
+        reports = _run(_body(b'{"id": 1}\nnope\n[2]\n{"id": "x"}\n{"id": 5}\n'), apply)
+        self.assertEqual(applied, [[1], [5]])
+        self.assertEqual([r["type"] for r in reports], ["progress", "progress", "progress", "done"])
+        errors = [error for r in reports for error in r.get("errors", [])]
+        self.assertEqual([e["line"] for e in errors], [2, 3, 4])
+        self.assertEqual(errors[1]["error"], "expected a JSON object")
+        self.assertEqual((reports[-1]["read"], reports[-1]["upserted"], reports[-1]["rejected"]), (5, 2, 3))
+
+    def test_failed_chunk_stops_the_import_and_keeps_earlier_chunks(self):
+        applied = []
+
+        async def apply(rows):
+            if 3 in rows:
+                raise RuntimeError("connection lost")
+            applied.append(rows)
+
+        reports = _run(_body(b'{"id": 1}\n{"id": 2}\n{"id": 3}\n{"id": 4}\n{"id": 5}\n'), apply)
+        self.assertEqual(applied, [[1, 2]])
+        self.assertEqual(reports[-1]["type"], "error")
+        self.assertEqual(reports[-1]["line"], 3)
+        self.assertEqual(reports[-1]["upserted"], 2)
+
+    def test_empty_body(self):
+        async def apply(rows):
+            raise AssertionError("nothing to apply")
+
+        self.assertEqual([r["type"] for r in _run(_body(b"\n\n"), apply)], ["done"])
+
+
+class FakeRepository:
+    """Stores upserted rows the way the products table would echo them back."""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def upsert_products(self, products):
+        for product in products:
+            self.rows[product["id"]] = {**product, "updated_at": "2030-01-01T00:00:00.000000Z"}
+        return len(products)
+
+    async def get_products(self, product_ids):
+        return [self.rows[i] for i in product_ids if i in self.rows]
+
+    async def delete_products(self, product_ids):
+        return sum(self.rows.pop(i, None) is not None for i in product_ids)
+
+
+class SaveProductsTest(unittest.TestCase):
+    def row(self, **changes):
+        record = {"id": 500, "name": "Desk lamp", "description": "Warm light", "price": 2.675,
+                  "category": "home", "stock_quantity": 3, "sku": "LAMP-500"}
+        return ProductService.import_row({**record, **changes})
+
+    def test_prices_are_rounded_like_numeric_12_2(self):
+        self.assertEqual(self.row().price, 2.68)
+        self.assertEqual(self.row(price=1.005).price, 1.01)
+        self.assertEqual(self.row(price=19.999).price, 20.0)
+
+    def test_rows_reach_a_repository_backed_catalog_once_through_the_feed(self):
+        service = ProductService(seed_mock_products=False)
+        service.repository = FakeRepository()
+        asyncio.run(service.save_products([self.row()]))
+        self.assertIsNone(service.get_product_by_id(500))
+
+        asyncio.run(service._refresh({500}))
+        self.assertEqual(service.get_product_by_id(500).updated_at, "2030-01-01T00:00:00.000000Z")
+        version = service.version
+        # A notification for a row the catalog already holds changes nothing
+        asyncio.run(service._refresh({500}))
+        self.assertEqual(service.version, version)
+
+    def test_deletes_reach_a_repository_backed_catalog_through_the_feed(self):
+        service = ProductService(seed_mock_products=False)
+        service.repository = FakeRepository()
+        asyncio.run(service.save_products([self.row()]))
+        asyncio.run(service._refresh({500}))
+
+        asyncio.run(service.delete_products([500]))
+        self.assertIsNotNone(service.get_product_by_id(500))
+        asyncio.run(service._refresh({500}))
+        self.assertIsNone(service.get_product_by_id(500))
+
+    def test_without_a_repository_rows_apply_directly(self):
+        service = ProductService(seed_mock_products=False)
+        asyncio.run(service.save_products([self.row()]))
+        created_at = service.get_product_by_id(500).created_at
+        asyncio.run(service.save_products([self.row(created_at="2031-01-01T00:00:00Z", name="Lamp")]))
+        self.assertEqual(service.get_product_by_id(500).name, "Lamp")
+        self.assertEqual(service.get_product_by_id(500).created_at, created_at)
+
+
+if __name__ == "__main__":
+    unittest.main()
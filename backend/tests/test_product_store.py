@@ -0,0 +1,143 @@
+import random
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.libs.product_store import ColumnarProductStore, SortedIndex
+
+CATEGORIES = ["books", "toys", "tools"]
+STATUSES = ["active", "inactive"]
+
+
+def _product(product_id, rng):
+    return SimpleNamespace(
+        id=product_id,
+        category=rng.choice(CATEGORIES),
+        status=rng.choice(STATUSES),
+        # Few distinct prices, so (price, id) ties are common
+        price=float(rng.choice([5, 10, 10, 20, 99.99])),
+        stock_quantity=rng.randint(0, 5)
+    )
+
+
+class ColumnarStoreTest(unittest.TestCase):
+    """Indexes against a brute-force scan of the live products after random writes."""
+
+    def setUp(self):
+        self.rng = random.Random(7)
+        self.store = ColumnarProductStore(CATEGORIES, STATUSES, capacity=4)
+        self.products = {}
+
+    def write(self, count):
+        for _ in range(count):
+            action = self.rng.random()
+            if action < 0.2 and self.products:
+                product_id = self.rng.choice(sorted(self.products))
+                self.store.remove(product_id)
+                del self.products[product_id]
+            else:
+                product = _product(self.rng.randint(1, 400), self.rng)
+                self.store.upsert(product)
+                self.products[product.id] = product
+
+    def expected(self, category=None, status=None, min_price=None, max_price=None):
+        return [
+            p for p in self.products.values()
+            if (category is None or p.category == category)
+            and (status is None or p.status == status)
+            and (min_price is None or p.price >= min_price)
+            and (max_price is None or p.price <= max_price)
+        ]
+
+    def check(self):
+        for category in (None, *CATEGORIES):
+            for status in (None, *STATUSES):
+                for min_price, max_price in ((None, None), (10, None), (None, 10), (6, 20)):
+                    filters = dict(category=category, status=status, min_price=min_price, max_price=max_price)
+                    expected = self.expected(**filters)
+                    selected = self.store.products_at(self.store.select(**filters))
+                    self.assertEqual({p.id for p in selected}, {p.id for p in expected}, filters)
+                    self.assertEqual(self.store.count(**filters), len(expected), filters)
+
+    def test_indexes_follow_inserts_updates_and_deletes(self):
+        # Small bursts merge into the sorted indexes, large ones re-sort
+        for burst in (300, 3, 1, 40, 2, 200, 5):
+            self.write(burst)
+            self.check()
+        self.assertEqual(len(self.store), len(self.products))
+
+    def test_compact_keeps_results_and_order(self):
+        self.write(500)
+        before = [p.id for p in self.store.products_at(self.store.select())]
+        self.store.compact()
+        self.assertEqual(self.store.size, len(self.products))
+        self.assertEqual([p.id for p in self.store.products_at(self.store.select())], before)
+        self.check()
+        self.write(50)
+        self.check()
+
+    def test_head_pages_match_select_slices(self):
+        self.write(400)
+        for filters in ({}, {"category": "toys"}, {"category": "toys", "status": "active"}):
+            rows = self.store.select(**filters)
+            for offset in (0, 5, 37, len(rows) - 3, len(rows) + 10):
+                page = self.store.head(7, offset=offset, chunk_size=16, **filters)
+                self.assertEqual(page.tolist(), rows[offset:offset + 7].tolist(), (filters, offset))
+
+    def test_sorted_index_entries_stay_ordered_by_key_then_id(self):
+        self.write(400)
+        for order in ("id", "price"):
+            index = self.store.sorted_index(order)
+            pairs = list(zip(index.keys.tolist(), index.ids.tolist()))
+            self.assertEqual(pairs, sorted(pairs))
+            self.assertEqual(sorted(index.ids.tolist()), sorted(self.products))
+            self.assertTrue(np.array_equal(self.store.ids[index.rows], index.ids))
+
+    def test_seek_pages_through_every_match_once(self):
+        self.write(400)
+        for order in ("id", "price"):
+            for filters in ({}, {"category": "toys"}, {"status": "active", "min_price": 10, "max_price": 20}):
+                expected = sorted(self.expected(**filters), key=lambda p: (p.price if order == "price" else p.id, p.id))
+                seen, after = [], None
+                while True:
+                    rows = self.store.seek(order, 7, after=after, **filters)
+                    if not len(rows):
+                        break
+                    page = self.store.products_at(rows)
+                    seen.extend(page)
+                    last = page[-1]
+                    after = (last.price if order == "price" else last.id, last.id)
+                self.assertEqual([p.id for p in seen], [p.id for p in expected], (order, filters))
+
+    def test_seek_neither_repeats_nor_skips_across_writes(self):
+        for product_id in range(1, 21):
+            self.store.upsert(SimpleNamespace(id=product_id, category="books", status="active",
+                                              price=10.0, stock_quantity=1))
+        first = self.store.products_at(self.store.seek("id", 5))
+        # Writes before the cursor position do not shift the next page
+        self.store.remove(2)
+        self.store.upsert(SimpleNamespace(id=0, category="books", status="active", price=10.0, stock_quantity=1))
+        second = self.store.products_at(self.store.seek("id", 5, after=(first[-1].id, first[-1].id)))
+        self.assertEqual([p.id for p in second], [6, 7, 8, 9, 10])
+
+
+class SortedIndexTest(unittest.TestCase):
+    def test_positions_break_key_ties_by_id(self):
+        index = SortedIndex(np.float64)
+        index.keys = np.array([1.0, 2.0, 2.0, 2.0, 3.0])
+        index.ids = np.array([9, 1, 5, 8, 2])
+        positions = index.positions(np.array([2.0, 2.0, 0.5, 4.0]), np.array([6, 0, 1, 1]))
+        self.assertEqual(positions.tolist(), [3, 1, 0, 5])
+        self.assertEqual(index.after(2.0, 5), 3)
+        self.assertEqual(index.bounds(2.0, 2.0), (1, 4))
+
+    def test_adding_and_removing_an_unmerged_row_is_a_no_op(self):
+        index = SortedIndex(np.int64)
+        index.add(0)
+        index.remove(0, 10, 10)
+        self.assertEqual((index.added, index.removed), (set(), []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import random
+import unittest
+
+from app.libs.search_index import InvertedIndex, parse_query, tokenize
+
+
+def _index():
+    index = InvertedIndex(field_weights={"name": 2.0, "description": 1.0})
+    index.add(1, {"name": "Wireless Headphones", "description": "Over-ear, noise cancelling"})
+    index.add(2, {"name": "Wired Earbuds", "description": "Compact headphones for running"})
+    index.add(3, {"name": "HD Webcam", "description": "1080p USB-C camera"})
+    index.add(4, {"name": "Running Shoes", "description": "Lightweight trainers"})
+    return index
+
+
+class ParseQueryTest(unittest.TestCase):
+    def test_terms_are_anded_and_or_separates_groups(self):
+        self.assertEqual(parse_query("wireless headphones OR webcam"), [["wireless", "headphones"], ["webcam"]])
+        self.assertEqual(parse_query("a | b AND c & d"), [["a"], ["b", "c", "d"]])
+
+    def test_dangling_operators_and_punctuation(self):
+        self.assertEqual(parse_query("OR usb-c OR"), [["usb", "c"]])
+        self.assertEqual(parse_query("OR |"), [])
+        self.assertEqual(tokenize("Over-ear, 1080p!"), ["over", "ear", "1080p"])
+
+
+class MatchTest(unittest.TestCase):
+    def setUp(self):
+        self.index = _index()
+
+    def ids(self, query):
+        return [doc_id for doc_id, _ in self.index.search(query)]
+
+    def test_and_requires_every_term(self):
+        self.assertEqual(self.ids("running shoes"), [4])
+        self.assertEqual(self.ids("running webcam"), [])
+
+    def test_or_unions_groups(self):
+        self.assertEqual(sorted(self.ids("webcam OR shoes")), [3, 4])
+        self.assertEqual(sorted(self.ids("missing OR webcam")), [3])
+
+    def test_terms_match_prefixes_and_infixes(self):
+        self.assertEqual(sorted(self.ids("head")), [1, 2])
+        self.assertEqual(sorted(self.ids("phones")), [1, 2])
+        self.assertEqual(self.ids("bcam"), [3])
+        # Short terms only match as prefixes
+        self.assertEqual(self.ids("hd"), [3])
+        self.assertEqual(self.ids("cam"), [3])
+
+    def test_expansion_is_not_truncated(self):
+        index = InvertedIndex()
+        for doc_id in range(200):
+            index.add(doc_id, {"name": f"part{doc_id:03d}"})
+        self.assertEqual(len(index.search("part")), 200)
+        self.assertEqual(len(index.search("art")), 200)
+
+    def test_remove_drops_postings_vocabulary_and_trigrams(self):
+        self.index.remove(3)
+        self.assertEqual(self.ids("webcam"), [])
+        self.assertNotIn("webcam", self.index.vocabulary)
+        self.assertNotIn("bca", self.index.trigram_tokens)
+        self.index.add(3, {"name": "4K Webcam"})
+        self.assertEqual(self.ids("webcam"), [3])
+
+    def test_vocabulary_stays_sorted_through_queued_changes(self):
+        rng = random.Random(5)
+        index = InvertedIndex()
+        words = [f"w{n:02d}" for n in range(80)]
+        for step in range(400):
+            doc_id = rng.randrange(60)
+            if rng.random() < 0.3:
+                index.remove(doc_id)
+            else:
+                index.add(doc_id, {"name": " ".join(rng.sample(words, rng.randint(1, 3)))})
+            if step % rng.choice([1, 7, 150]) == 0:
+                index.expand("w")
+                self.assertEqual(index.vocabulary, sorted(index.postings))
+
+    def test_broad_prefixes_match_like_a_scan(self):
+        rng = random.Random(9)
+        index = InvertedIndex()
+        docs = {}
+        for doc_id in range(300):
+            text = " ".join(rng.choice(["alpha", "alps", "beta", "bet", "abc", "cab", "cabin"]) + str(rng.randrange(40))
+                            for _ in range(3))
+            docs[doc_id] = tokenize(text)
+            index.add(doc_id, {"name": text})
+
+        def matches(term, token):
+            return token.startswith(term) or (len(term) >= 3 and term in token)
+
+        for query in ("a", "a b", "al be", "cab1 a", "bet a c", "abc3 cabin", "b alps2"):
+            expected = {
+                doc_id for doc_id, tokens in docs.items()
+                if any(all(any(matches(term, t) for t in tokens) for term in group) for group in parse_query(query))
+            }
+            with self.subTest(query=query):
+                self.assertEqual(set(index.match(query)), expected)
+
+
+class RankingTest(unittest.TestCase):
+    def test_name_matches_outrank_description_matches(self):
+        self.assertEqual([doc_id for doc_id, _ in _index().search("headphones")], [1, 2])
+
+    def test_exact_tokens_outrank_partial_matches(self):
+        index = InvertedIndex()
+        index.add(1, {"name": "headphones"})
+        index.add(2, {"name": "head"})
+        self.assertEqual([doc_id for doc_id, _ in index.search("head")], [2, 1])
+
+    def test_rarer_terms_weigh_more(self):
+        index = InvertedIndex()
+        index.add(1, {"name": "common rare"})
+        index.add(2, {"name": "common common"})
+        index.add(3, {"name": "common"})
+        scores = dict(index.search("common OR rare"))
+        self.assertGreater(scores[1], scores[2])
+
+    def test_ties_break_by_id_and_limit_applies_after_ranking(self):
+        index = InvertedIndex()
+        for doc_id in (3, 1, 2):
+            index.add(doc_id, {"name": "same text"})
+        self.assertEqual([doc_id for doc_id, _ in index.search("same", limit=2)], [1, 2])
+        self.assertEqual(index.search("same", allowed={3}), [(3, index.search("same")[2][1])])
+
+
+if __name__ == "__main__":
+    unittest.main()